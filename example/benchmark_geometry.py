@@ -0,0 +1,432 @@
+"""Timing of the geometric reconstruction steps of Adel
+
+Run with python benchmark_geometry.py
+"""
+
+import pickle
+import time
+from copy import deepcopy
+
+import numpy
+import pandas
+
+import openalea.plantgl.all as pgl
+import openalea.adel.fitting as fitting
+from openalea.adel.geometric_elements import Leaves, incline_leaf
+
+
+def _timeit(f, *args, **kwds):
+    t = time.perf_counter()
+    res = f(*args, **kwds)
+    return time.perf_counter() - t, res
+
+
+def _legacy_mesh4(leaf, length_max, length, s_base, s_top, radius_max, min_area=1e-6):
+    """mesh4 as it was before the numpy pipeline (lists of tuples + Vector3 filter)"""
+    xf, yf, s_val, rf = fitting.leaf_element(
+        leaf, length_max, length, s_base, s_top, radius_max
+    )
+    n = len(xf)
+    theta = numpy.zeros(n)
+    points = list(zip(xf, -rf / 2.0 * abs(numpy.cos(theta)), yf))
+    points.extend(list(zip(xf, rf / 2.0 * abs(numpy.cos(theta)), yf)))
+    ind = numpy.array(range(n - 2))
+    indices = list(zip(ind, ind + n, ind + (n + 1)))
+    indices.extend(list(zip(ind, ind + (n + 1), ind + 1)))
+    indices.append((n - 2, 2 * n - 2, 2 * n - 1))
+
+    def _surf(ind, pts):
+        A, B, C = [pgl.Vector3(pts[i]) for i in ind]
+        return pgl.norm(pgl.cross(B - A, C - A)) / 2.0
+
+    indices = [id for id in indices if _surf(id, points) > min_area]
+    indices = [list(map(int, index)) for index in indices]
+    return pgl.TriangleSet(points, indices, normalPerVertex=False)
+
+
+def _numpy_mesh4(leaf, length_max, length, s_base, s_top, radius_max, min_area=1e-6):
+    pts, ind = fitting.mesh4(leaf, length_max, length, s_base, s_top, radius_max, min_area=min_area)
+    return fitting.plantgl_shape(pts, ind)
+
+
+def leaf_elements(n=10000, nsect=5, seed=0):
+    """n random leaf element descriptions (shape, L_shape, Lw_shape, length, srb, srt)"""
+    rng = numpy.random.default_rng(seed)
+    leaves = Leaves(mesh_cache_size=0)
+    keys = [
+        (k, i, None) for k in leaves.leaves for i in range(len(leaves.leaves[k]))
+    ]
+    elements = []
+    for _ in range(n // nsect):
+        key = keys[rng.integers(len(keys))]
+        L = rng.uniform(5, 25)
+        shape = incline_leaf(leaves.get_leaf(key), 1)
+        for isect in range(nsect):
+            elements.append(
+                (shape, L, 0.1 * L, L, isect / nsect, (isect + 1) / nsect)
+            )
+    return elements
+
+
+def bench_mesh4(n=10000):
+    """compare the legacy and the numpy leaf meshing pipeline on n leaf elements"""
+    elements = leaf_elements(n)
+    t_legacy, _ = _timeit(
+        lambda: [
+            _legacy_mesh4(deepcopy(shape), L, l, sb, st, w)
+            for shape, L, w, l, sb, st in elements
+        ]
+    )
+    t_numpy, _ = _timeit(
+        lambda: [
+            _numpy_mesh4(deepcopy(shape), L, l, sb, st, w)
+            for shape, L, w, l, sb, st in elements
+        ]
+    )
+    print(
+        "mesh4 per %d leaf elements: legacy %.2fs, numpy %.2fs (x%.1f)"
+        % (len(elements), t_legacy, t_numpy, t_legacy / t_numpy)
+    )
+    return t_legacy, t_numpy
+
+
+def bench_packed_geometry(nplants=100):
+    """compare pickling of per element plantgl geometries and of a CanopyMesh store"""
+    from openalea.adel.astk_interface import AdelWheat
+    from openalea.adel.canopy_mesh import CanopyMesh
+
+    adel = AdelWheat(nplants=nplants, seed=1)
+    g = adel.setup_canopy(age=1200)
+    geometry = dict(g.property("geometry"))
+    t_pack, store = _timeit(CanopyMesh.from_geometry, geometry)
+    scene = adel.scene(g)
+    t_bgeom, _ = _timeit(scene.save, "bench_scene.bgeom", "BGEOM")
+    t_store, data = _timeit(pickle.dumps, store)
+    print(
+        "%d plants, %d elements, %d triangles: packing %.2fs, bgeom save %.2fs, "
+        "store pickling %.2fs (%.1f Mo)"
+        % (
+            nplants,
+            len(store),
+            len(store.indices),
+            t_pack,
+            t_bgeom,
+            t_store,
+            len(data) / 1e6,
+        )
+    )
+    return t_bgeom, t_store
+
+
+def bench_turtle_engines(nplants=500):
+    """compare frame computation by the PlantGL turtle visitor and by the numpy engine"""
+    from openalea.adel.astk_interface import AdelWheat
+    from openalea.adel.mtg_interpreter import mtg_interpreter, turtle_frames
+
+    adel = AdelWheat(nplants=nplants, seed=1)
+    g = adel.setup_canopy(age=1200)
+    # meshes are cached by leaves after the first run: time positioning only
+    mtg_interpreter(g, adel.leaves, min_length=adel.min_length)
+    t_visitor, _ = _timeit(mtg_interpreter, g, adel.leaves, min_length=adel.min_length)
+    t_numpy, _ = _timeit(
+        mtg_interpreter, g, adel.leaves, min_length=adel.min_length, engine="numpy"
+    )
+    t_frames, _ = _timeit(turtle_frames, g)
+    print(
+        "%d plants: visitor %.2fs, numpy engine %.2fs (frames only %.2fs)"
+        % (nplants, t_visitor, t_numpy, t_frames)
+    )
+    return t_visitor, t_numpy
+
+
+def bench_workers(nplants=200, workers=(1, 2, 4, 8)):
+    """scaling of mtg_interpreter with the number of worker processes"""
+    from openalea.adel.astk_interface import AdelWheat
+    from openalea.adel.mtg_interpreter import mtg_interpreter
+
+    adel = AdelWheat(nplants=nplants, seed=1)
+    g = adel.setup_canopy(age=1200)
+    timings = {}
+    for n in workers:
+        adel.leaves[0].clear_mesh_cache()
+        t, _ = _timeit(
+            mtg_interpreter,
+            g,
+            adel.leaves,
+            min_length=adel.min_length,
+            engine="numpy",
+            workers=n,
+        )
+        timings[n] = t
+        print(
+            "%d plants, %d worker(s): %.2fs (speedup x%.1f)"
+            % (nplants, n, t, timings[workers[0]] / t)
+        )
+    return timings
+
+
+def _simpson_blade_elt(leaves, leaf_key, Lshape, Lwshape, sr_base, sr_top):
+    """area and width of a blade element as computed before the lookup tables (filter + simpson per call)"""
+    from scipy.integrate import simpson
+
+    if leaf_key is None:
+        return 0, 0
+    sr_base = min([1, max([0, sr_base])])
+    sr_top = min([1, max([sr_base, sr_top])])
+    s, r = leaves.get_sr(leaf_key)
+    sre = [sr for sr in zip(s, r) if (sr_base < sr[0] < sr_top)]
+    snew = [sr_base] + [x for x, _ in sre] + [sr_top]
+    rnew = (
+        [numpy.interp(sr_base, s, r)]
+        + [y for _, y in sre]
+        + [numpy.interp(sr_top, s, r)]
+    )
+    return simpson(rnew, x=snew) * Lshape * Lwshape, numpy.mean(rnew) * Lwshape
+
+
+class _SimpsonLeaves:
+    """Leaves proxy computing blade element areas and widths by Simpson integration"""
+
+    def __init__(self, leaves):
+        self.leaves = leaves
+
+    def blade_elt_area(self, *args):
+        return _simpson_blade_elt(self.leaves, *args)[0]
+
+    def blade_elt_width(self, *args):
+        return _simpson_blade_elt(self.leaves, *args)[1]
+
+
+def bench_blade_elt_area(nplants=100):
+    """compare Simpson integration and table lookups in the computation of the blade elements of a canopy"""
+    from openalea.adel.astk_interface import AdelWheat
+    from openalea.adel.newmtg import blade_elements
+
+    adel = AdelWheat(nplants=nplants, seed=1)
+    g = adel.setup_canopy(age=1200)
+    leaves = adel.leaves[0]
+    blades = [
+        g.node(vid) for vid in g.vertices(scale=4) if g.label(vid) == "blade"
+    ]
+
+    def _run(leaves):
+        return [
+            blade_elements(
+                b.n_sect,
+                b.length,
+                b.visible_length,
+                b.rolled_length,
+                b.senesced_length,
+                b.shape_mature_length,
+                b.shape_max_width,
+                b.shape_key,
+                leaves,
+            )
+            for b in blades
+        ]
+
+    t_simpson, e1 = _timeit(_run, _SimpsonLeaves(leaves))
+    t_lookup, e2 = _timeit(_run, leaves)
+    diff = max(
+        abs(a["area"] - b["area"])
+        for elts1, elts2 in zip(e1, e2)
+        for a, b in zip(elts1, elts2)
+    )
+    print(
+        "%d blades of %d plants: simpson %.3fs, lookup tables %.3fs (x%.1f), "
+        "max area difference %.1e"
+        % (len(blades), nplants, t_simpson, t_lookup, t_simpson / t_lookup, diff)
+    )
+    return t_simpson, t_lookup
+
+
+def _tesselated_stem(length, diameter_base, diameter_top, slices=6):
+    """classic StemElement_mesh as it was before the unit cylinder templates"""
+    stem = pgl.Tapered(
+        diameter_base / 2.0,
+        diameter_top / 2.0,
+        pgl.Cylinder(1.0, length, True, slices),
+    )
+    tessel = pgl.Tesselator()
+    stem.apply(tessel)
+    return tessel.triangulation
+
+
+def bench_stem_meshes(n=20000, seed=0):
+    """compare tesselation and unit cylinder templates for n classic stem element meshes"""
+    from openalea.adel.mtg_interpreter import StemElement_mesh
+
+    rng = numpy.random.default_rng(seed)
+    stems = list(
+        zip(rng.uniform(0.1, 10, n), rng.uniform(0.1, 0.5, n), rng.uniform(0.1, 0.5, n))
+    )
+    t_tessel, _ = _timeit(lambda: [_tesselated_stem(*s) for s in stems])
+    t_template, _ = _timeit(
+        lambda: [StemElement_mesh(*s, classic=True) for s in stems]
+    )
+    print(
+        "%d classic stem meshes: tesselation %.2fs, template %.2fs (x%.1f)"
+        % (n, t_tessel, t_template, t_tessel / t_template)
+    )
+    return t_tessel, t_template
+
+
+def bench_lod(nplants=100, ratios=(1, 2, 3, 5)):
+    """triangle count, area error and meshing time of a canopy for decreasing triangle budgets"""
+    from openalea.adel.astk_interface import AdelWheat
+    from openalea.adel.lod import lod_report, set_lod
+    from openalea.adel.mtg_interpreter import mtg_interpreter
+
+    leaves = Leaves(lod_levels=(6, 4, 3))
+    adel = AdelWheat(nplants=nplants, seed=1, leaves=leaves)
+    g = adel.setup_canopy(age=1200)
+    full = lod_report(g, adel.leaves, adel.min_length)["triangles"]
+    reports = {}
+    for ratio in ratios:
+        set_lod(
+            g, adel.leaves, "budget", min_length=adel.min_length, budget=full / ratio
+        )
+        t, g = _timeit(mtg_interpreter, g, adel.leaves, min_length=adel.min_length)
+        report = lod_report(g, adel.leaves, adel.min_length)
+        reports[ratio] = report
+        print(
+            "%d plants, budget 1/%d: %d leaf triangles (x%.1f fewer), "
+            "area error %.2f%%, meshing %.2fs"
+            % (
+                nplants,
+                ratio,
+                report["triangles"],
+                report["full_triangles"] / report["triangles"],
+                100 * report["area_error"],
+                t,
+            )
+        )
+    return reports
+
+
+def bench_simplification(sizes=(100, 1000, 5000), nb_points=9, seed=0):
+    """compare the historical and the lazy deletion point removal of simplification.cost on dense polylines"""
+    from openalea.adel.simplification import cost
+
+    rng = numpy.random.default_rng(seed)
+    timings = {}
+    for n in sizes:
+        x = numpy.linspace(0, 1, n)
+        y = numpy.sin(5 * x) + rng.normal(0, 1e-3, n)
+        r = numpy.abs(numpy.cos(3 * x))
+        polyline = list(zip(x, r, y))
+        t_legacy, _ = _timeit(cost, polyline, nb_points)
+        t_lazy, _ = _timeit(cost, polyline, nb_points, legacy=False)
+        timings[n] = t_legacy, t_lazy
+        print(
+            "simplification of %d points: legacy %.3fs, lazy deletion %.3fs (x%.1f)"
+            % (n, t_legacy, t_lazy, t_legacy / t_lazy)
+        )
+    return timings
+
+
+def bench_merged_scene(nplants=200):
+    """compare per element and merged by material scenes (construction and bgeom export)"""
+    from openalea.adel.astk_interface import AdelWheat
+    from openalea.adel.mtg_interpreter import plot3d
+
+    adel = AdelWheat(nplants=nplants, seed=1)
+    g = adel.setup_canopy(age=1200)
+    t_scene, scene = _timeit(plot3d, g)
+    t_save, _ = _timeit(scene.save, "bench_scene.bgeom", "BGEOM")
+    t_merged, (merged, table) = _timeit(plot3d, g, merge=True)
+    t_msave, _ = _timeit(merged.save, "bench_merged.bgeom", "BGEOM")
+    print(
+        "%d plants: %d shapes in %.2fs (bgeom %.2fs), merged %d shapes in %.2fs (bgeom %.2fs)"
+        % (nplants, len(scene), t_scene, t_save, len(merged), t_merged, t_msave)
+    )
+    return t_scene + t_save, t_merged + t_msave
+
+
+def bench_bake_transform(nplants=200, nquot=20):
+    """compare duplicated canopies with wrapped and baked plant transforms (construction and scene bbox)"""
+    from openalea.adel.astk_interface import AdelWheat
+    from openalea.adel.mtg_interpreter import plot3d
+
+    res = []
+    for bake in (False, True):
+        adel = AdelWheat(
+            nplants=nplants, duplicate=nquot, seed=1, bake_transforms=bake
+        )
+        t_build, g = _timeit(adel.setup_canopy, age=1200)
+        scene = plot3d(g)
+        t_bbox, _ = _timeit(pgl.BoundingBox, scene)
+        print(
+            "%d plants, bake=%s: setup_canopy %.2fs, bbox %.2fs"
+            % (nplants, bake, t_build, t_bbox)
+        )
+        res.append(t_build + t_bbox)
+    return res
+
+
+def _canopy_table(nplants, nmetamers=10):
+    """a RunAdel like table of nplants plants with a main stem and a tiller"""
+    from openalea.adel.data_samples import canopy_two_metamers
+
+    row = {k: v[0] for k, v in canopy_two_metamers().items()}
+    rows = []
+    for plant in range(1, nplants + 1):
+        for axe, mspos, nm in (("MS", 0, nmetamers), ("T1", 1, nmetamers // 2)):
+            for num in range(1, nm + 1):
+                rows.append(
+                    dict(row, plant=plant, axe_id=axe, ms_insertion=mspos, numphy=num)
+                )
+    return pandas.DataFrame(rows)
+
+
+def bench_mtg_factory(nplants=(100, 500, 1000)):
+    """compare per vertex and bulk construction of canopy mtgs"""
+    from openalea.adel.newmtg import mtg_factory
+
+    res = []
+    for n in nplants:
+        table = _canopy_table(n)
+        t_mtg, g = _timeit(mtg_factory, table)
+        t_bulk, _ = _timeit(mtg_factory, table, bulk=True)
+        print(
+            "%d plants (%d vertices): mtg_factory %.2fs, bulk %.2fs"
+            % (n, len(g), t_mtg, t_bulk)
+        )
+        res.append((t_mtg, t_bulk))
+    return res
+
+
+def bench_exposed_areas(nplants=(100, 500, 1000)):
+    """time the extraction of the exposed areas of canopy mtgs and their conversion to canS tables"""
+    from openalea.adel.newmtg import exposed_areas, exposed_areas2canS, mtg_factory
+
+    res = []
+    for n in nplants:
+        g = mtg_factory(_canopy_table(n), bulk=True)
+        for name in ("length", "area"):
+            for state in ("green", "senesced"):
+                g.add_property(state + "_" + name)
+                g.property(state + "_" + name).update(g.property(name))
+        t_areas, df = _timeit(exposed_areas, g)
+        t_canS, _ = _timeit(exposed_areas2canS, df)
+        print(
+            "%d plants (%d elements): exposed_areas %.2fs, exposed_areas2canS %.2fs"
+            % (n, len(df), t_areas, t_canS)
+        )
+        res.append((t_areas, t_canS))
+    return res
+
+
+if __name__ == "__main__":
+    bench_mesh4()
+    bench_packed_geometry()
+    bench_turtle_engines()
+    bench_workers()
+    bench_blade_elt_area()
+    bench_stem_meshes()
+    bench_lod()
+    bench_simplification()
+    bench_merged_scene()
+    bench_bake_transform()
+    bench_mtg_factory()
+    bench_exposed_areas()
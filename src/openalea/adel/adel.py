@@ -13,10 +13,23 @@ except ImportError:
     import pickle
 from openalea.plantgl.all import Viewer, Scene
 
+from openalea.adel.adel_index import adel_index
 from openalea.adel.colormap import colormap
 from openalea.adel.geometric_elements import Leaves
 from openalea.adel.Stand import AgronomicStand
-from openalea.adel.mtg_interpreter import plot3d, transform_geom, mtg_interpreter
+from openalea.adel.mtg_interpreter import (
+    plot3d,
+    transform_plant_geometry,
+    mtg_interpreter,
+)
+from openalea.adel.canopy_mesh import (
+    CanopyMesh,
+    get_canopy_mesh,
+    pack_geometry,
+    plant_transform,
+    unpack_geometry,
+)
+from openalea.adel.lod import set_lod
 from openalea.adel.postprocessing import (
     axis_statistics,
     plot_statistics,
@@ -81,6 +94,11 @@ class Adel:
         leaf_db=None,
         positions=None,
         convUnit=None,
+        packed_geometry=False,
+        instancing=False,
+        lod=None,
+        bake_transforms=False,
+        clone_plants=False,
     ):
         """
 
@@ -107,6 +125,22 @@ class Adel:
             leaf_db: deprecated, use leaves
             positions: deprecated, use stand
             convUnit: deprecated, use scene_unit
+            packed_geometry: (bool) should element meshes be stored in a single
+             array backed CanopyMesh store instead of one plantgl object per
+             element ?
+            instancing: (bool) if True, duplicated canopies only store the
+             geometry of prototype plants, other plants referencing them with a
+             transform (see Adel.instanced)
+            lod: (dict) optional level of detail policy for leaf meshing, given
+             as keyword arguments of lod.set_lod (eg {'policy': 'budget',
+             'budget': 100000}). Simplified shapes are taken in the lod_levels
+             of leaves.
+            bake_transforms: (bool) should plant positioning be applied to the
+             vertices of element meshes (flat TriangleSets) instead of wrapping
+             them in Translated / AxisRotated nodes ?
+            clone_plants: (bool) should plants identical to a previously built
+             one (same rows in the canopy table) be cloned from it rather than
+             rebuilt (see newmtg.mtg_factory) ?
         """
 
         self.nrem = None
@@ -167,6 +201,11 @@ class Adel:
         self.face_up = face_up
         self.classic = classic
         self.seed = seed
+        self.packed_geometry = packed_geometry
+        self.instancing = instancing
+        self.lod = lod
+        self.bake_transforms = bake_transforms
+        self.clone_plants = clone_plants
         self.min_length = min_length * self.conv_units['cm'] / self.conv_units[self.scene_unit]
 
         self.meta = {}
@@ -270,6 +309,11 @@ class Adel:
         """Construct g using duplications"""
         if self.duplicate is None:
             raise ValueError("Duplication not defined for this stand")
+        gquot = unpack_geometry(gquot)
+        if grem is not None:
+            grem = unpack_geometry(grem)
+        if self.instancing:
+            return self.instanced(gquot, grem)
         g = duplicate(gquot, self.nquot * self.duplicate, grem)
         # dispose plants and renumber them
         pos = g.property("position ")
@@ -280,11 +324,70 @@ class Adel:
             lab[vid] = "plant" + str(i + 1)
             pos[vid] = self.positions[i]
             az[vid] = self.plant_azimuths[i]
-            for gid in g.components_at_scale(vid, g.max_scale()):
-                if gid in geom:
-                    geom[gid] = transform_geom(
-                        geom[gid], self.positions[i], self.plant_azimuths[i]
-                    )
+            transform_plant_geometry(
+                geom,
+                g.components_at_scale(vid, g.max_scale()),
+                self.positions[i],
+                self.plant_azimuths[i],
+                bake=self.bake_transforms,
+            )
+        if self.packed_geometry:
+            g = pack_geometry(g)
+        return g
+
+    def instanced(self, gquot, grem=None):
+        """Construct g using duplications of the topology, but not of the geometry.
+
+        Plants get a 'prototype' (the vid of the plant holding their geometry)
+        and a 4x4 'transform' property. Only prototypes (plants of grem and gquot)
+        hold element geometries (in plant coordinates), use
+        canopy_mesh.instance_geometry to expand them."""
+        sources = [gg for gg in (grem, gquot) if gg is not None]
+        scale = gquot.max_scale()
+        prototypes = []
+        for gg in sources:
+            geometry = gg.property("geometry")
+            prototypes.extend(
+                [geometry.get(vid) for vid in gg.components_at_scale(pid, scale)]
+                for pid in gg.vertices(scale=1)
+            )
+        saved = [dict(gg.property("geometry")) for gg in sources]
+        for gg in sources:
+            gg.remove_property("geometry")
+        try:
+            g = duplicate(gquot, self.nquot * self.duplicate, grem)
+        finally:
+            for gg, geometry in zip(sources, saved):
+                gg.add_property("geometry")
+                gg.property("geometry").update(geometry)
+
+        nrem = 0 if grem is None else grem.nb_vertices(scale=1)
+        nquot = gquot.nb_vertices(scale=1)
+        for name in ("geometry", "prototype", "transform"):
+            if name not in g.property_names():
+                g.add_property(name)
+        lab = g.property("label")
+        pos = g.property("position")
+        az = g.property("azimuth")
+        geom = g.property("geometry")
+        prototype = g.property("prototype")
+        transform = g.property("transform")
+        plants = list(g.vertices(1))
+        for i, vid in enumerate(plants):
+            lab[vid] = "plant" + str(i + 1)
+            pos[vid] = self.positions[i]
+            az[vid] = self.plant_azimuths[i]
+            iproto = i if i < nrem else nrem + (i - nrem) % nquot
+            prototype[vid] = plants[iproto]
+            transform[vid] = plant_transform(self.positions[i], self.plant_azimuths[i])
+            if iproto == i:
+                for gid, mesh in zip(
+                    g.components_at_scale(vid, scale), prototypes[iproto]
+                ):
+                    if mesh is not None:
+                        geom[gid] = mesh
+        if self.packed_geometry:
+            g = pack_geometry(g)
         return g
 
     def build_mtg(self, parameters, stand, **kwds):
@@ -294,9 +397,14 @@ class Adel:
             leaf_sectors=self.nsect,
             leaves=self.leaves,
             split=self.split,
+            clone_plants=self.clone_plants,
             **kwds,
         )
+        if self.lod is not None:
+            g = set_lod(g, self.leaves, min_length=self.min_length, **self.lod)
         g = mtg_interpreter(g, self.leaves, min_length=self.min_length, classic=self.classic, face_up=self.face_up)
+        if self.packed_geometry:
+            g = pack_geometry(g)
         return g
 
     def meta_informations(self, g):
@@ -312,13 +420,20 @@ class Adel:
         return g.sub_mtg(ax, copy=True)
 
     @staticmethod
-    def plot(g, property=None):
-        s = Adel.scene(g, property)
-        Viewer.display(s)
+    def plot(g, property=None, merge=False):
+        s = Adel.scene(g, property, merge=merge)
+        if merge:
+            Viewer.display(s[0])
+        else:
+            Viewer.display(s)
         return s
 
     @staticmethod
-    def scene(g, property=None):
+    def scene(g, property=None, merge=False):
+        """plantgl scene of g, colored by property if given
+
+        If merge is True, (scene, table) is returned, with element meshes merged by colour (see mtg_interpreter.plot3d)
+        """
         if property:
             g = colormap(g, property, cmap="jet", lognorm=True)
             colored = g.property("color")
@@ -329,7 +444,7 @@ class Adel:
         else:
             colors = None
         s = plot3d(
-            g, colors=colors
+            g, colors=colors, merge=merge
         )  # use the one of openalea.plantframe.color instead ?
         return s
 
@@ -371,11 +486,24 @@ class Adel:
             basename_adel = directory + "/adel%04d" % index
         else:
             basename_adel = basename_geom = str(basename)
+        fg = basename_adel + ".pckl"
+        store = get_canopy_mesh(g)
+        if store is not None and len(g.property("geometry")) == 0:
+            # packed geometry is saved as numpy buffers
+            fgeom = basename_geom + ".npz"
+            store.save(fgeom)
+            g.remove_property("canopy_mesh")
+            with open(fg, "wb") as output:
+                pickle.dump(g, output)
+            g.add_property("canopy_mesh")
+            g.property("canopy_mesh")[g.root] = store
+            return fgeom, fg
         s = Adel.scene(g)
-        geom = {sh.id: sh.geometry for sh in s}
+        # the scene of an instanced mtg holds expanded meshes: restore the
+        # geometry property as it was, not the scene shapes
+        geom = dict(g.property("geometry"))
         g.remove_property("geometry")
         fgeom = basename_geom + ".bgeom"
-        fg = basename_adel + ".pckl"
         s.save(fgeom, "BGEOM")
         with open(fg, "wb") as output:
             pickle.dump(g, output)
@@ -394,8 +522,10 @@ class Adel:
         else:
             basename_adel = basename_geom = basename
         fgeom = basename_geom + ".bgeom"
+        fpacked = basename_geom + ".npz"
         fg = basename_adel + ".pckl"
-        if not os.path.exists(fgeom) or not os.path.exists(fg):
+        packed = not os.path.exists(fgeom) and os.path.exists(fpacked)
+        if not (os.path.exists(fgeom) or packed) or not os.path.exists(fg):
             raise IOError("adel cannot find saved files")
 
         with open(fg, "rb") as f:
@@ -411,10 +541,18 @@ class Adel:
             else:
                 root.meta.update(meta)
 
-        if load_geom:
+        if load_geom and packed:
+            g.add_property("canopy_mesh")
+            g.property("canopy_mesh")[g.root] = CanopyMesh.load(fpacked)
+            if "geometry" not in g.property_names():
+                g.add_property("geometry")
+        elif load_geom:
             s = Scene()
             s.read(fgeom, "BGEOM")
             geom = {sh.id: sh.geometry for sh in s}
+            if "prototype" in g.property_names():
+                # saved scene holds expanded instances
+                g.remove_property("prototype")
             g.add_property("geometry")
             g.property("geometry").update(geom)
 
@@ -427,10 +565,13 @@ class Adel:
             for vid in g.vertices(scale=g.max_scale() - 1)
             if g.label(vid).startswith("blade")
         )
-        vids = (vid for vid in blades if visible_length[vid] > 0)
-        metamer = {vid: g.complex(vid) for vid in vids}
-        axe = {vid: g.complex(metamer[vid]) for vid in metamer}
-        plant = {vid: g.complex(axe[vid]) for vid in axe}
+        vids = [vid for vid in blades if visible_length[vid] > 0]
+        index = adel_index(g)
+        number = index.numbers(g)
+        plant, axe, metamer = (
+            dict(zip(vids, index.complex_at_scale(vids, scale).tolist()))
+            for scale in (1, 2, 3)
+        )
         p = g.property("species")
         species = {vid: p.get(plant[vid], 0) for vid in plant}
 
@@ -454,9 +595,9 @@ class Adel:
                 {
                     "vid": vid,
                     "ntop": ntop[vid],
-                    "metamer": int(g.label(metamer[vid]).split("metamer")[1]),
+                    "metamer": int(number[metamer[vid]]),
                     "axe": g.label(axe[vid]),
-                    "plant": int(g.label(plant[vid]).split("plant")[1]),
+                    "plant": int(number[plant[vid]]),
                     "species": species[vid],
                     "x": midribs[vid][0],
                     "y": midribs[vid][1],
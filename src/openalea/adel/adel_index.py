@@ -0,0 +1,100 @@
+"""Cached integer index of the multiscale hierarchy of Adel mtgs"""
+
+import re
+import weakref
+
+import numpy
+
+_number = re.compile(r"(\d+)$")
+_indices = weakref.WeakKeyDictionary()
+
+
+def _signature(g):
+    """a cheap key changing with every vertex addition or removal"""
+    return len(g), g._id
+
+
+def label_number(label):
+    """the integer ending a label (eg 12 for 'metamer12'), -1 if none"""
+    match = _number.search(label or "")
+    return int(match.group(1)) if match else -1
+
+
+class AdelIndex(object):
+    """Integer arrays giving the complexes at all scales of the vertices of a mtg
+
+    ancestors[s][vid] is the complex at scale s of vertex vid (vid itself if vid
+    is at scale s, -1 if vid is at a coarser scale). The index is only valid as
+    long as no vertex is added to or removed from the mtg (see is_valid).
+    Labels are not indexed, as they can be edited (see numbers).
+    """
+
+    def __init__(self, g):
+        self.signature = _signature(g)
+        self.max_scale = g.max_scale()
+        vids = numpy.fromiter(g.vertices_iter(), dtype=int)
+        size = vids.max() + 1 if len(vids) > 0 else 1
+        scale = numpy.array([g.scale(vid) for vid in vids.tolist()], dtype=int)
+        complex_ = numpy.array(
+            [g.complex(vid) if vid != g.root else -1 for vid in vids.tolist()],
+            dtype=int,
+        )
+        self.scale = numpy.full(size, -1)
+        self.scale[vids] = scale
+        self.ancestors = numpy.full((self.max_scale + 1, size), -1)
+        self.ancestors[0, vids] = g.root
+        for s in range(1, self.max_scale + 1):
+            at_scale = scale == s
+            svids = vids[at_scale]
+            self.ancestors[:s, svids] = self.ancestors[:s, complex_[at_scale]]
+            self.ancestors[s, svids] = svids
+        self.elements = numpy.fromiter(
+            g.vertices_iter(scale=self.max_scale), dtype=int
+        )
+        self.numbered = vids[(scale > 0) & (scale < self.max_scale)]
+        self._labels, self._number = None, None
+
+    def is_valid(self, g):
+        return _signature(g) == self.signature
+
+    def numbers(self, g):
+        """array giving, for all vids, the integer ending the current label of vid
+        (plant and metamer numbers), or -1. Elements are not numbered.
+        Labels are only parsed again if one of them changed since last call."""
+        labels = g.property("label")
+        current = [labels.get(vid) for vid in self.numbered.tolist()]
+        if current != self._labels:
+            number = numpy.full(len(self.scale), -1)
+            number[self.numbered] = [label_number(label) for label in current]
+            self._labels, self._number = current, number
+        return self._number.copy()
+
+    def complex_at_scale(self, vids, scale):
+        """the complexes at scale of vids (int or array)"""
+        return self.ancestors[scale][vids]
+
+    def members(self, vid):
+        """the array of vid and of its components at all scales, in vid order"""
+        return numpy.flatnonzero(self.ancestors[self.scale[vid]] == vid)
+
+    def element_ancestors(self, vids=None):
+        """the list of the complexes of elements vids (default to all elements), from the plant scale to the scale just above elements"""
+        if vids is None:
+            vids = self.elements
+        return [self.ancestors[s][vids] for s in range(1, self.max_scale)]
+
+
+def adel_index(g, build=True):
+    """return the AdelIndex cached for g
+
+    A new index is built and cached if the cached one is missing or outdated.
+    If build is False, None is returned instead.
+    """
+    index = _indices.get(g)
+    if index is not None and index.is_valid(g):
+        return index
+    if not build:
+        return None
+    index = AdelIndex(g)
+    _indices[g] = index
+    return index
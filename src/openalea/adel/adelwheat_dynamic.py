@@ -10,7 +10,12 @@ from openalea.adel.mtg_editions import (
     update_organ_elements,
 )
 from openalea.adel.AdelR import plantSample
-from openalea.adel.mtg_interpreter import mtg_interpreter, transform_geom
+from openalea.adel.mtg_interpreter import (
+    mtg_interpreter,
+    transform_plant_geometry,
+    update_interpreter,
+)
+from openalea.adel.canopy_mesh import pack_geometry, unpack_geometry
 
 
 class AdelWheatDyn(AdelWheat):
@@ -103,10 +108,16 @@ class AdelWheatDyn(AdelWheat):
             **kwds,
         )
         g = mtg_interpreter(g, self.leaves, min_length=self.min_length, classic=self.classic, face_up=self.face_up)
+        if self.packed_geometry:
+            g = pack_geometry(g)
         return g
 
     def update_geometry(
-        self, g, SI_units=False, properties_to_convert={"lengths": [], "areas": []}
+        self,
+        g,
+        SI_units=False,
+        properties_to_convert={"lengths": [], "areas": []},
+        incremental=False,
     ):
         """Update MTG geometry.
 
@@ -114,6 +125,7 @@ class AdelWheatDyn(AdelWheat):
             - `g` (:class:`openalea.mtg.mtg.MTG`) - The MTG to update the geometry.
             - `SI_units` (:class:`bool`) - A boolean indicating whether the MTG properties are expressed in SI units.
             - `properties_to_convert` (:class:`dict` of :class:`pandas.DataFrame`) - A dictionnary with the list of length properties area properties to be converted.
+            - `incremental` (:class:`bool`) - If True, only organs and elements whose properties or frames changed since the last incremental update are re-meshed and re-positioned.
         :Returns:
             MTG with updated geometry
         :Returns Type:
@@ -124,19 +136,50 @@ class AdelWheatDyn(AdelWheat):
             self.convert_to_ADEL_units(g, properties_to_convert)
 
         # update elements
-        g = update_organ_elements(g, self.leaves, self.split, self.phyllochron())
-        g = mtg_interpreter(g, self.leaves, min_length=self.min_length, face_up=self.face_up, classic=self.classic)
+        g = update_organ_elements(
+            g, self.leaves, self.split, self.phyllochron(), incremental=incremental
+        )
+        if incremental:
+            g = unpack_geometry(g)
+            # elements of moved plants are placed again
+            transforms = {
+                vid: (
+                    tuple(map(float, self.positions[i])),
+                    float(self.plant_azimuths[i]),
+                    self.bake_transforms,
+                )
+                for i, vid in enumerate(g.vertices(1))
+            }
+            updated = set(
+                update_interpreter(
+                    g,
+                    self.leaves,
+                    min_length=self.min_length,
+                    face_up=self.face_up,
+                    classic=self.classic,
+                    transforms=transforms,
+                )
+            )
+        else:
+            g = mtg_interpreter(g, self.leaves, min_length=self.min_length, face_up=self.face_up, classic=self.classic)
         pos = g.property("position")
         az = g.property("azimuth")
         geom = g.property("geometry")
         for i, vid in enumerate(g.vertices(1)):
             pos[vid] = self.positions[i]
             az[vid] = self.plant_azimuths[i]
-            for gid in g.components_at_scale(vid, g.max_scale()):
-                if gid in geom:
-                    geom[gid] = transform_geom(
-                        geom[gid], self.positions[i], self.plant_azimuths[i]
-                    )
+            gids = g.components_at_scale(vid, g.max_scale())
+            if incremental:
+                gids = [gid for gid in gids if gid in updated]
+            transform_plant_geometry(
+                geom,
+                gids,
+                self.positions[i],
+                self.plant_azimuths[i],
+                bake=self.bake_transforms,
+            )
+        if self.packed_geometry:
+            g = pack_geometry(g)
         return g
 
     def convert_to_ADEL_units(self, g, properties_to_convert):
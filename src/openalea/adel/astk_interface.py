@@ -86,6 +86,11 @@ class AdelWheat(Adel):
         leaf_db=None,
         positions=None,
         convUnit=None,
+        packed_geometry=False,
+        instancing=False,
+        lod=None,
+        bake_transforms=False,
+        clone_plants=False,
     ):
         self.canopy_age = None
         if species is not None or isinstance(leaves, dict):
@@ -128,6 +133,11 @@ class AdelWheat(Adel):
             leaf_db=leaf_db,
             positions=positions,
             convUnit=convUnit,
+            packed_geometry=packed_geometry,
+            instancing=instancing,
+            lod=lod,
+            bake_transforms=bake_transforms,
+            clone_plants=clone_plants,
         )
 
         if run_adel_pars is None:
@@ -0,0 +1,315 @@
+"""Packed, array backed storage of the triangle meshes of a canopy"""
+
+import numpy
+
+import openalea.plantgl.all as pgl
+import openalea.adel.fitting as fitting
+
+
+def geometry_arrays(geom, dtype=float):
+    """return (points, indices) numpy arrays of a plantgl geometry (or shape, or list of them)"""
+    if isinstance(geom, list):
+        pts, ind = [], []
+        npts = 0
+        for g in geom:
+            p, i = geometry_arrays(g, dtype)
+            pts.append(p)
+            ind.append(i + npts)
+            npts += len(p)
+        if not pts:
+            return numpy.zeros((0, 3), dtype), numpy.zeros((0, 3), numpy.int32)
+        return numpy.concatenate(pts), numpy.concatenate(ind)
+    if isinstance(geom, pgl.Shape):
+        geom = geom.geometry
+    if not isinstance(geom, pgl.TriangleSet):
+        tessel = pgl.Tesselator()
+        geom.apply(tessel)
+        geom = tessel.triangulation
+    points = _pgl_array(geom.pointList, dtype)
+    indices = _pgl_array(geom.indexList, numpy.int32)
+    return points, indices
+
+
+def _pgl_array(values, dtype):
+    """(n, 3) numpy array of a plantgl Point3Array or Index3Array"""
+    if callable(getattr(values, "data", None)):
+        values = values.data()
+    return numpy.array(values, dtype=dtype).reshape(-1, 3)
+
+
+class CanopyMesh:
+    """Contiguous vertex / index buffers holding the meshes of all the elements of a canopy
+
+    Element i (vid = vids[i]) spans points[point_offsets[i]:point_offsets[i + 1]]
+    and indices[index_offsets[i]:index_offsets[i + 1]]. Indices are local to
+    each element. PlantGL meshes are only built on demand (mesh, geometry).
+    """
+
+    def __init__(
+        self,
+        vids=(),
+        points=None,
+        indices=None,
+        point_offsets=None,
+        index_offsets=None,
+        dtype=float,
+    ):
+        self.vids = numpy.asarray(vids, dtype=int)
+        if points is None:
+            points = numpy.zeros((0, 3))
+        if indices is None:
+            indices = numpy.zeros((0, 3))
+        if point_offsets is None:
+            point_offsets = numpy.zeros(len(self.vids) + 1)
+        if index_offsets is None:
+            index_offsets = numpy.zeros(len(self.vids) + 1)
+        self.points = numpy.asarray(points, dtype=dtype).reshape(-1, 3)
+        self.indices = numpy.asarray(indices, dtype=numpy.int32).reshape(-1, 3)
+        self.point_offsets = numpy.asarray(point_offsets, dtype=int)
+        self.index_offsets = numpy.asarray(index_offsets, dtype=int)
+        self._slot = {vid: i for i, vid in enumerate(self.vids.tolist())}
+
+    @classmethod
+    def from_arrays(cls, arrays, dtype=float):
+        """build from a {vid: (points, indices)} dict"""
+        vids = sorted(arrays)
+        pts = [numpy.asarray(arrays[vid][0]).reshape(-1, 3) for vid in vids]
+        ind = [numpy.asarray(arrays[vid][1]).reshape(-1, 3) for vid in vids]
+        point_offsets = numpy.concatenate(([0], numpy.cumsum([len(p) for p in pts])))
+        index_offsets = numpy.concatenate(([0], numpy.cumsum([len(i) for i in ind])))
+        if vids:
+            pts = numpy.concatenate(pts)
+            ind = numpy.concatenate(ind)
+        else:
+            pts = ind = None
+        return cls(vids, pts, ind, point_offsets, index_offsets, dtype=dtype)
+
+    @classmethod
+    def from_geometry(cls, geometry, dtype=float):
+        """build from a {vid: plantgl geometry} dict (eg g.property('geometry'))"""
+        arrays = {
+            vid: geometry_arrays(geom, dtype)
+            for vid, geom in geometry.items()
+            if geom is not None
+        }
+        return cls.from_arrays(arrays, dtype=dtype)
+
+    def __len__(self):
+        return len(self.vids)
+
+    def __contains__(self, vid):
+        return vid in self._slot
+
+    def __iter__(self):
+        return iter(self.vids.tolist())
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_slot"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._slot = {vid: i for i, vid in enumerate(self.vids.tolist())}
+
+    def arrays(self, vid):
+        """return the (points, indices) arrays of element vid"""
+        i = self._slot[vid]
+        po, io = self.point_offsets, self.index_offsets
+        return (
+            self.points[po[i] : po[i + 1]],
+            self.indices[io[i] : io[i + 1]],
+        )
+
+    def mesh(self, vid):
+        """return a new plantgl TriangleSet for element vid (None if it has no triangles)"""
+        pts, ind = self.arrays(vid)
+        if len(ind) < 1:
+            return None
+        return fitting.plantgl_shape(pts, ind)
+
+    def geometry(self):
+        """return a {vid: plantgl mesh} dict"""
+        return {vid: self.mesh(vid) for vid in self}
+
+    def merged(self):
+        """return (points, indices) of the whole canopy as a single mesh"""
+        nind = numpy.diff(self.index_offsets)
+        shift = numpy.repeat(self.point_offsets[:-1], nind)
+        return self.points, self.indices + shift[:, None].astype(numpy.int32)
+
+    def triangles(self):
+        """return a (n, 3, 3) array of triangle coordinates and the (n,) array of their vids"""
+        pts, ind = self.merged()
+        vids = numpy.repeat(self.vids, numpy.diff(self.index_offsets))
+        return pts[ind], vids
+
+    def areas(self):
+        """return a {vid: area} dict of element mesh areas"""
+        pts, ind = self.merged()
+        tri_areas = fitting.triangle_areas(pts, ind)
+        cum = numpy.concatenate(([0], numpy.cumsum(tri_areas)))
+        areas = cum[self.index_offsets[1:]] - cum[self.index_offsets[:-1]]
+        return dict(zip(self.vids.tolist(), areas.tolist()))
+
+    def caribu_triangles(self):
+        """return a {vid: [triangles]} dict, triangles being lists of 3 (x, y, z) tuples (caribu scene format)"""
+        triangles, vids = self.triangles()
+        triangles = triangles.tolist()
+        ends = self.index_offsets
+        return {
+            vid: [[tuple(p) for p in t] for t in triangles[ends[i] : ends[i + 1]]]
+            for i, vid in enumerate(self.vids.tolist())
+        }
+
+    def save(self, filename):
+        numpy.savez(
+            filename,
+            vids=self.vids,
+            points=self.points,
+            indices=self.indices,
+            point_offsets=self.point_offsets,
+            index_offsets=self.index_offsets,
+        )
+
+    @classmethod
+    def load(cls, filename):
+        with numpy.load(filename) as data:
+            return cls(
+                data["vids"],
+                data["points"],
+                data["indices"],
+                data["point_offsets"],
+                data["index_offsets"],
+                dtype=data["points"].dtype,
+            )
+
+
+def get_canopy_mesh(g):
+    """return the CanopyMesh store attached to g, or None"""
+    if "canopy_mesh" in g.property_names():
+        return g.property("canopy_mesh").get(g.root)
+    return None
+
+
+def pack_geometry(g, dtype=float):
+    """Move the element geometries of g into a CanopyMesh store attached to the root of g"""
+    store = CanopyMesh.from_geometry(g.property("geometry"), dtype=dtype)
+    g.remove_property("geometry")
+    g.add_property("geometry")
+    g.add_property("canopy_mesh")
+    g.property("canopy_mesh")[g.root] = store
+    return g
+
+
+def unpack_geometry(g):
+    """Materialize the CanopyMesh store of g as plantgl meshes in the 'geometry' property"""
+    store = get_canopy_mesh(g)
+    if store is None:
+        return g
+    geometry = g.property("geometry")
+    for vid, mesh in store.geometry().items():
+        if mesh is not None and vid not in geometry:
+            geometry[vid] = mesh
+    g.remove_property("canopy_mesh")
+    return g
+
+
+def plant_transform(position, azimuth):
+    """4x4 matrix of the plant positioning done by mtg_interpreter.transform_geom"""
+    x, y, z = map(float, position)
+    c, s = numpy.cos(float(azimuth)), numpy.sin(float(azimuth))
+    return numpy.array(
+        [[c, -s, 0, x], [s, c, 0, y], [0, 0, 1, z], [0, 0, 0, 1]], dtype=float
+    )
+
+
+def is_instanced(g):
+    """True if plants of g reference the geometry of prototype plants"""
+    return "prototype" in g.property_names()
+
+
+def _element_arrays(g, vid):
+    """(points, indices) of the geometry stored on element vid, or None"""
+    geom = g.property("geometry").get(vid)
+    if geom is not None:
+        return geometry_arrays(geom)
+    store = get_canopy_mesh(g)
+    if store is not None and vid in store:
+        return store.arrays(vid)
+    return None
+
+
+def instance_arrays(g):
+    """Expand the geometry of an instanced mtg
+
+    Each plant gets the geometry of the elements of its prototype plant (elements
+    are matched by position), transformed with its 'transform' matrix.
+
+    Returns:
+        a {vid: (points, indices)} dict (use CanopyMesh.from_arrays to pack it)
+    """
+    prototype = g.property("prototype")
+    transform = g.property("transform")
+    scale = g.max_scale()
+    local = {}
+    arrays = {}
+    for pid in g.vertices(scale=1):
+        proto = prototype.get(pid, pid)
+        if proto not in local:
+            local[proto] = [
+                _element_arrays(g, vid) for vid in g.components_at_scale(proto, scale)
+            ]
+        mat = transform.get(pid)
+        for vid, a in zip(g.components_at_scale(pid, scale), local[proto]):
+            if a is None:
+                continue
+            pts, ind = a
+            if mat is not None:
+                pts = numpy.dot(pts, mat[:3, :3].T) + mat[:3, 3]
+            arrays[vid] = (pts, ind)
+    return arrays
+
+
+def instance_geometry(g):
+    """return {vid: plantgl mesh} for all the elements of an instanced mtg"""
+    return {
+        vid: fitting.plantgl_shape(pts, ind)
+        for vid, (pts, ind) in instance_arrays(g).items()
+        if len(ind) > 0
+    }
+
+
+def geometry_items(g):
+    """iterate over (vid, geometry) of g, looking into the 'geometry' property first, then in the CanopyMesh store.
+    Instanced mtgs are expanded."""
+    if is_instanced(g):
+        for item in instance_geometry(g).items():
+            yield item
+        return
+    geometry = g.property("geometry")
+    for vid, geom in geometry.items():
+        yield vid, geom
+    store = get_canopy_mesh(g)
+    if store is not None:
+        for vid in store:
+            if vid not in geometry:
+                yield vid, store.mesh(vid)
+
+
+def arrays_items(g):
+    """iterate over (vid, (points, indices)) of the element meshes of g (see geometry_items),
+    without building plantgl meshes for the elements of the CanopyMesh store"""
+    if is_instanced(g):
+        for item in instance_arrays(g).items():
+            yield item
+        return
+    geometry = g.property("geometry")
+    for vid, geom in geometry.items():
+        if geom is not None:
+            yield vid, geometry_arrays(geom)
+    store = get_canopy_mesh(g)
+    if store is not None:
+        for vid in store:
+            if vid not in geometry:
+                yield vid, store.arrays(vid)
@@ -30,7 +30,7 @@ def leaves_db():
     fn = datadir + "/data/simpleleavesdb.json"
     with open(fn) as f:
         leaves = json_np.load(f)
-    leaves, discard = fitting.fit_leaves(leaves, 9)
+    leaves, discard = fitting.fit_leaves(leaves, 9, cache=True)
     return leaves
 
 
@@ -79,7 +79,7 @@ def wheat_leaf_db():
     leaves = extract_leaf_info(
         datadir + "/data/So99.RData", datadir + "/data/SRSo.RData"
     )
-    leaves, discard = fitting.fit_leaves(leaves, 9)
+    leaves, discard = fitting.fit_leaves(leaves, 9, cache=True)
     return leaves
 
 
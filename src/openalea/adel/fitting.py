@@ -1,4 +1,9 @@
+import ast
+import hashlib
 import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from scipy.interpolate import splprep, splev
 from scipy.integrate import simpson, trapezoid
@@ -292,18 +297,30 @@ def leaf_to_mesh_new(x, y, r, twist=True, nb_twist=1.0, nb_waves=8, **kwds):
 
 
 def leaf_to_mesh(x, y, r, twist_start=0, twist_end=0, **kwds):
+    """Mesh a leaf midrib (x, y) with radius r.
+
+    Returns a (2n, 3) float array of points and a (m, 3) int array of indices
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    r = np.asarray(r, dtype=float)
     n = len(x)
     theta = np.linspace(np.radians(twist_start), np.radians(twist_end), n)
-    points = list(
-        zip(x, -r / 2.0 * abs(np.cos(theta)), y + abs(np.sin(theta)) * r / 2.0)
-    )
-    points.extend(
-        list(zip(x, r / 2.0 * abs(np.cos(theta)), y - abs(np.sin(theta)) * r / 2.0))
-    )
-
-    ind = np.array(range(n - 2)) if n > 2 else np.array([0])
-    indices = list(zip(ind, ind + n, ind + (n + 1)))
-    indices.extend(list(zip(ind, ind + (n + 1), ind + 1)))
+    half_width = r / 2.0 * abs(np.cos(theta))
+    half_height = abs(np.sin(theta)) * r / 2.0
+    points = np.empty((2 * n, 3))
+    points[:n, 0] = x
+    points[:n, 1] = -half_width
+    points[:n, 2] = y + half_height
+    points[n:, 0] = x
+    points[n:, 1] = half_width
+    points[n:, 2] = y - half_height
+
+    ind = np.arange(n - 2) if n > 2 else np.array([0])
+    indices = [
+        np.column_stack((ind, ind + n, ind + (n + 1))),
+        np.column_stack((ind, ind + (n + 1), ind + 1)),
+    ]
 
     # add only one triangle at the end !!
     if n < 2:
@@ -311,12 +328,21 @@ def leaf_to_mesh(x, y, r, twist_start=0, twist_end=0, **kwds):
         if r[-1] < 0.001:
             indices = indices[0:1]
     elif r[-1] < 0.001:
-        indices.append((n - 2, 2 * n - 2, 2 * n - 1))
+        indices.append([(n - 2, 2 * n - 2, 2 * n - 1)])
     else:
-        indices.append((n - 2, 2 * n - 2, 2 * n - 1))
-        indices.append((n - 2, 2 * n - 1, n - 1))
+        indices.append([(n - 2, 2 * n - 2, 2 * n - 1), (n - 2, 2 * n - 1, n - 1)])
 
-    return points, indices
+    return points, np.concatenate(indices).astype(int)
+
+
+def triangle_areas(points, indices):
+    """Area of the triangles of a mesh given as (n, 3) points and (m, 3) indices arrays"""
+    points = np.asarray(points, dtype=float)
+    indices = np.asarray(indices, dtype=int).reshape(-1, 3)
+    a = points[indices[:, 0]]
+    b = points[indices[:, 1]]
+    c = points[indices[:, 2]]
+    return np.sqrt((np.cross(b - a, c - a) ** 2).sum(axis=1)) / 2.0
 
 
 def _mesh(
@@ -357,9 +383,7 @@ def mesh2(leaf, length_max, length, radius_max):
 
 def leaf_element(leaf, length_max, length, s_base, s_top, radius_max):
     def insert_values(a, values):
-        l = a.tolist()
-        l.extend(values)
-        return np.unique(l)
+        return np.unique(np.concatenate((a, values)))
 
     s_base = min(s_base, s_top, 1.0)
     s_top = max(s_base, s_top, 0.0)
@@ -433,26 +457,19 @@ def leaf_element(leaf, length_max, length, s_base, s_top, radius_max):
 
 
 def mesh4(leaf, length_max, length, s_base, s_top, radius_max, twist=0, volume=0.1,min_area=1e-6):
-    xf, yf, s_val, rf = leaf_element(
-        leaf, length_max, length, s_base, s_top, radius_max
-    )
+    element = leaf_element(leaf, length_max, length, s_base, s_top, radius_max)
 
-    if len(xf) < 2:
-        # All the radius are negative or null.
+    if element is None or len(element[0]) < 2:
+        # Null length, or all the radius are negative or null.
         # Degenerated element.
-        return [], []
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=int)
+    xf, yf, s_val, rf = element
 
     pts, ind = leaf_to_mesh(
         xf, yf, rf, twist_start=twist * min(s_val), twist_end=twist * max(s_val)
     )
 
-    def _surf(ind, pts):
-        from openalea.plantgl.all import norm, cross, Vector3
-
-        A, B, C = [Vector3(pts[i]) for i in ind]
-        return norm(cross(B - A, C - A)) / 2.0
-
-    ind = [id for id in ind if _surf(id, pts) > min_area]
+    ind = ind[triangle_areas(pts, ind) > min_area]
     return pts, ind
 
 
@@ -510,9 +527,23 @@ def read_smf(filename):
     return points, indices
 
 
+def _pgl_array(array_type, values):
+    try:
+        return array_type(values)
+    except TypeError:
+        # plantgl built without numpy support
+        return array_type(values.tolist())
+
+
 def plantgl_shape(points, indices):
-    indices = [list(map(int, index)) for index in indices]
-    return pgl.TriangleSet(points, indices, normalPerVertex=False)
+    """Build a pgl.TriangleSet from (n, 3) points and (m, 3) indices"""
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    indices = np.asarray(indices, dtype=np.int32).reshape(-1, 3)
+    return pgl.TriangleSet(
+        _pgl_array(pgl.Point3Array, points),
+        _pgl_array(pgl.Index3Array, indices),
+        normalPerVertex=False,
+    )
 
 
 def qslim(nb_triangles, points, indexes):
@@ -563,7 +594,7 @@ def fit3(x, y, s, r, nb_points):
     return xn, yn, sn, rn
 
 
-def simplify(leaf, nb_points, scale_radius=True):
+def simplify(leaf, nb_points, scale_radius=True, legacy=True):
     """ " Simplify a 2d polyline up to nb_points
     Parameters
     ----------
@@ -571,6 +602,7 @@ def simplify(leaf, nb_points, scale_radius=True):
     nb_points : the number of points along the polyline after simplification
     scale_radius : (bool, default=True)  should radius be scaled after simplification to ensure
         polygonial_area(simplified_leaf) = smooth_area(input_leaf) ?
+    legacy : (bool, default=True) use the historical point removal order (see simplification.cost)
 
     Returns
     -------
@@ -578,10 +610,9 @@ def simplify(leaf, nb_points, scale_radius=True):
     """
     xn, yn, sn, rn = leaf
 
-    points = [pgl.Vector3(*pt) for pt in zip(xn, rn, yn)]
-    pts = [_f for _f in cost(points, nb_points) if _f]
-    coords = ((pt.x, pt.y, pt.z) for pt in pts)
-    x, r, y = list(map(np.array, zip(*coords)))
+    points = list(zip(xn, rn, yn))
+    pts = [pt for pt in cost(points, nb_points, legacy=legacy) if pt is not None]
+    x, r, y = list(map(np.array, zip(*pts)))
     s = curvilinear_abscisse(x, y)
     # keep smax similar to sn
     adj = max(sn) / max(s)
@@ -630,33 +661,293 @@ def _fit_element(el, nb_points):
     return leaf
 
 
-def fit_leaves(leaves, nb_points, dynamic=False):
+def _fit_elements(elements, nb_points, workers=1):
+    """fit a list of leaf elements, in a pool of worker processes if workers > 1 (order is kept)"""
+    if workers > 1 and len(elements) > 1:
+        chunksize = max(1, len(elements) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(
+                pool.map(
+                    _fit_element,
+                    elements,
+                    [nb_points] * len(elements),
+                    chunksize=chunksize,
+                )
+            )
+    return [_fit_element(el, nb_points) for el in elements]
+
+
+def _fit_db(leaves, nb_points, dynamic=False, workers=1):
     new_db = {}
     discarded = {}
     db = leaves
 
+    # flat list of elements to fit, in database order
+    elements = []
+    for key in db:
+        for el in db[key]:
+            if not dynamic:
+                elements.append(el)
+            else:
+                elements.extend(el.values())
+    fitted = iter(_fit_elements(elements, nb_points, workers))
+
     for key in db:
         l = db[key]
         for i, el in enumerate(l):
             if not dynamic:
-                leaf = _fit_element(el, nb_points)
+                leaf = next(fitted)
             else:
-                leaf = {age: _fit_element(v, nb_points) for age, v in el.items()}
+                leaf = {age: next(fitted) for age in el}
                 if any([x is None for x in list(leaf.values())]):
                     leaf = None
             if leaf is not None:
                 new_db.setdefault(key, []).append(leaf)
             else:
-                print(
-                    (
-                        "openalea.adel.fitting->fit_leaves: can't fit leaf shape index %s,"
-                        " Rsub-index %d (python sub-index %d)=> leaf shape discarded"
-                        % (key, i + 1, i)
-                    )
-                )
                 discarded.setdefault(key, []).append(i + 1)
 
     return (
         new_db,
         discarded,
     )
+
+
+def _warn_discarded(discarded):
+    for key, indices in discarded.items():
+        for i in indices:
+            print(
+                (
+                    "openalea.adel.fitting->fit_leaves: can't fit leaf shape index %s,"
+                    " Rsub-index %d (python sub-index %d)=> leaf shape discarded"
+                    % (key, i, i - 1)
+                )
+            )
+
+
+def _simplify_element(leaf, nb_points):
+    """simplified copy of a fitted leaf (or the leaf itself if it cannot be simplified)"""
+    x, y, s, r = leaf
+    if len(x) <= nb_points:
+        return leaf
+    try:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xn, yn, sn, rn = simplify(leaf, nb_points, scale_radius=False, legacy=False)
+            # keep the area of the (polygonal) fitted shape
+            rn *= trapezoid(r, x=s) / trapezoid(rn, x=sn)
+    except (ZeroDivisionError, ValueError):
+        # degenerated shape (null length or too few distinct points)
+        return leaf
+    if not all(np.isfinite(a).all() for a in (xn, yn, sn, rn)):
+        # null area shape
+        return leaf
+    sn[-1] = 1.0
+    rn[-1] = 0.0
+    return xn, yn, sn, rn
+
+
+def simplify_leaves(fitted, nb_points, dynamic=False):
+    """Simplify the shapes of a fitted leaf database (see fit_leaves) down to nb_points
+
+    Args:
+        fitted: a fitted leaf database
+        nb_points: number of points of the simplified shapes
+        dynamic: (bool) is fitted a dynamic database ?
+
+    Returns:
+        a database with the same structure (and the same indices) as fitted.
+        Shapes that cannot be simplified are kept unchanged.
+    """
+    simplified = {}
+    for key, leaves in fitted.items():
+        if dynamic:
+            simplified[key] = [
+                {age: _simplify_element(leaf, nb_points) for age, leaf in el.items()}
+                for el in leaves
+            ]
+        else:
+            simplified[key] = [_simplify_element(leaf, nb_points) for leaf in leaves]
+    return simplified
+
+
+def cache_dir():
+    """directory of the fitted leaves cache (OPENALEA_ADEL_CACHE env variable, or
+    openalea.adel in the user cache directory)"""
+    path = os.environ.get("OPENALEA_ADEL_CACHE")
+    if path is None:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        path = os.path.join(base, "openalea.adel")
+    return path
+
+
+def _hash_content(obj, h):
+    """feed a deterministic serialisation of a (nested) leaf database into hash h"""
+    if isinstance(obj, dict):
+        h.update(b"d%d" % len(obj))
+        for k in sorted(obj, key=repr):
+            h.update(repr(k).encode())
+            _hash_content(obj[k], h)
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"l%d" % len(obj))
+        for x in obj:
+            _hash_content(x, h)
+    elif isinstance(obj, np.ndarray) and obj.dtype != object:
+        a = np.ascontiguousarray(obj, dtype=float)
+        h.update(b"a" + repr(a.shape).encode())
+        h.update(a.tobytes())
+    elif hasattr(obj, "tolist"):
+        # numpy object arrays, pandas series / index
+        _hash_content(obj.tolist(), h)
+    else:
+        if isinstance(obj, (int, float, np.number)) and not isinstance(obj, bool):
+            obj = float(obj)
+        h.update(repr(obj).encode())
+
+
+def fit_key(leaves, nb_points, dynamic=False, lod_levels=()):
+    """content hash identifying a fit_leaves (or fit_leaf_pyramid) call"""
+    h = hashlib.sha1()
+    h.update(b"fit_leaves-3")
+    _hash_content((leaves, nb_points, bool(dynamic), sorted(lod_levels)), h)
+    return h.hexdigest()
+
+
+def _literal(key):
+    """key as a python literal (numpy scalars are converted)"""
+    return key.item() if isinstance(key, np.generic) else key
+
+
+def _pack_db(db, dynamic, arrays):
+    """layout of a fitted database, the x, y, s, r arrays of leaves being
+    appended to arrays (leaves are replaced by their index in the layout)"""
+
+    def pack(leaf):
+        arrays.extend(np.asarray(a, dtype=float) for a in leaf)
+        return len(arrays) // 4 - 1
+
+    layout = {}
+    for key, leaves in db.items():
+        if dynamic:
+            layout[_literal(key)] = [
+                {_literal(age): pack(leaf) for age, leaf in el.items()}
+                for el in leaves
+            ]
+        else:
+            layout[_literal(key)] = [pack(leaf) for leaf in leaves]
+    return layout
+
+
+def _unpack_db(layout, dynamic, arrays):
+    def unpack(i):
+        return tuple(arrays[4 * i : 4 * i + 4])
+
+    if dynamic:
+        return {
+            key: [{age: unpack(i) for age, i in el.items()} for el in leaves]
+            for key, leaves in layout.items()
+        }
+    return {key: [unpack(i) for i in leaves] for key, leaves in layout.items()}
+
+
+def _read_cache(path):
+    """(layout, arrays) stored in path, or None if path is missing or unreadable"""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            layout = ast.literal_eval(str(data["layout"]))
+            arrays = [data["arr_%d" % i] for i in range(len(data.files) - 1)]
+    except (OSError, EOFError, KeyError, ValueError, SyntaxError, zipfile.BadZipFile):
+        return None
+    return layout, arrays
+
+
+def _write_cache(path, layout, arrays):
+    """atomic write of a python literal layout and a list of float arrays in path
+    (errors are ignored: the cache is optional)"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, *arrays, layout=np.array(repr(layout)))
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    except OSError:
+        pass
+
+
+def fit_leaves(leaves, nb_points, dynamic=False, cache=False, workers=1):
+    """Fit all leaf shapes of a database
+
+    Args:
+        leaves: a {key: [leaf, ...]} dict, leaf being a (x, y, s, r) tuple or
+         dict (or, if dynamic, a {age: leaf} dict)
+        nb_points: number of points of fitted shapes
+        dynamic: (bool) is leaves a dynamic database ?
+        cache: (bool) should the result be looked for / stored in the on-disk
+         cache (see cache_dir) ? Cache entries are numpy .npz archives
+         (read without pickle) keyed by the content of leaves, nb_points and
+         dynamic.
+        workers: (int) number of worker processes used for fitting. Results
+         (including discarded shapes) do not depend on it.
+
+    Returns:
+        fitted database and a {key: [discarded R (1-based) indices]} dict
+    """
+    fitted, discarded, _ = fit_leaf_pyramid(
+        leaves, nb_points, (), dynamic, cache=cache, workers=workers
+    )
+    return fitted, discarded
+
+
+def fit_leaf_pyramid(
+    leaves, nb_points, lod_levels, dynamic=False, cache=False, workers=1
+):
+    """Fit all leaf shapes of a database and simplify them down to lod_levels
+
+    Args are those of fit_leaves, plus lod_levels, a list of discretisation
+    levels (see simplify_leaves). The simplified databases are cached along
+    with the fitted one.
+
+    Returns:
+        fitted database, {key: [discarded R (1-based) indices]} dict and
+        {level: simplified database} dict
+    """
+    if not cache:
+        fitted, discarded = _fit_db(leaves, nb_points, dynamic, workers)
+        _warn_discarded(discarded)
+        lod = {
+            level: simplify_leaves(fitted, level, dynamic) for level in lod_levels
+        }
+        return fitted, discarded, lod
+    path = os.path.join(
+        cache_dir(),
+        "fitted_leaves-%s.npz" % fit_key(leaves, nb_points, dynamic, lod_levels),
+    )
+    cached = _read_cache(path)
+    if cached is not None:
+        layout, arrays = cached
+        _warn_discarded(layout["discarded"])
+        return (
+            _unpack_db(layout["fitted"], dynamic, arrays),
+            layout["discarded"],
+            {
+                level: _unpack_db(db, dynamic, arrays)
+                for level, db in layout["lod"].items()
+            },
+        )
+    fitted, discarded, lod = fit_leaf_pyramid(
+        leaves, nb_points, lod_levels, dynamic, workers=workers
+    )
+    arrays = []
+    layout = {
+        "fitted": _pack_db(fitted, dynamic, arrays),
+        "discarded": {_literal(k): v for k, v in discarded.items()},
+        "lod": {
+            int(level): _pack_db(db, dynamic, arrays) for level, db in lod.items()
+        },
+    }
+    _write_cache(path, layout, arrays)
+    return fitted, discarded, lod
@@ -5,6 +5,8 @@ New proposal for computing organ shapes
 import numpy
 import pandas
 import os
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from scipy.integrate import simpson
 
 import openalea.plantgl.all as pgl
@@ -42,6 +44,181 @@ def leaf_keys(lindex, lseed, db):
     return keys[lindex - 1], lseed - 1
 
 
+def _div(a, b):
+    """a / b, with 0 where b is 0 (as in scipy.integrate.simpson)"""
+    if isinstance(b, float):
+        return a / b if b != 0 else 0.0
+    a, b = numpy.broadcast_arrays(numpy.asarray(a, dtype=float), numpy.asarray(b, dtype=float))
+    return numpy.divide(a, b, out=numpy.zeros(b.shape), where=b != 0)
+
+
+def _simpson_pair(h0, h1, y0, y1, y2):
+    """Simpson's rule on two consecutive intervals of widths h0 and h1"""
+    hsum = h0 + h1
+    h0divh1 = _div(h0, h1)
+    return (
+        hsum
+        / 6.0
+        * (
+            y0 * (2.0 - _div(1.0, h0divh1))
+            + y1 * hsum * _div(hsum, h0 * h1)
+            + y2 * (2.0 - h0divh1)
+        )
+    )
+
+
+def _simpson_last(h0, h1, y0, y1, y2):
+    """Cartwright's correction used by simpson for the last interval of an even number of points"""
+    alpha = _div(2 * h1**2 + 3 * h0 * h1, 6 * (h0 + h1))
+    beta = _div(h1**2 + 3 * h0 * h1, 6 * h0)
+    eta = _div(h1**3, 6 * h0 * (h0 + h1))
+    return alpha * y2 + beta * y1 - eta * y0
+
+
+def sr_table(s, r):
+    """Precompute the lookup tables of blade_element_areas / blade_element_widths for one leaf shape
+
+    Args:
+        s: relative curvilinear abscissa of the shape
+        r: relative width of the shape at s
+
+    Returns:
+        a dict with sorted s and r arrays, the cumulated Simpson contributions
+        of pairs of consecutive intervals ('pairs', cumulated separately for
+        odd and even starting points) and the cumulated sum of r ('rsum')
+    """
+    order = numpy.argsort(s, kind="stable")
+    s = numpy.asarray(s, dtype=float)[order]
+    r = numpy.asarray(r, dtype=float)[order]
+    h = numpy.diff(s)
+    pairs = numpy.zeros(len(s) + 1)
+    contrib = _simpson_pair(h[:-1], h[1:], r[:-2], r[1:-1], r[2:])
+    for parity in (0, 1):
+        pairs[parity + 2 :: 2][: len(contrib[parity::2])] = numpy.cumsum(contrib[parity::2])
+    rsum = numpy.concatenate(([0], numpy.cumsum(r)))
+    return {
+        "s": s,
+        "r": r,
+        "pairs": pairs,
+        "rsum": rsum,
+        # python lists for the scalar lookups
+        "lists": (s.tolist(), r.tolist(), pairs.tolist(), rsum.tolist()),
+    }
+
+
+def _sr_interp(x, s, r, i):
+    """r at x, knowing that s[i - 1] <= x < s[i]"""
+    if i == 0:
+        return r[0]
+    if i == len(s):
+        return r[-1]
+    return r[i - 1] + (x - s[i - 1]) * (r[i] - r[i - 1]) / (s[i] - s[i - 1])
+
+
+def blade_element_area(table, sr_base, sr_top):
+    """Scalar version of blade_element_areas"""
+    s, r, pairs, _ = table["lists"]
+    b = min(1.0, max(0.0, float(sr_base)))
+    t = min(1.0, max(b, float(sr_top)))
+    lo = bisect_right(s, b)
+    hi = max(lo, bisect_left(s, t))
+    rb = _sr_interp(b, s, r, lo)
+    rt = _sr_interp(t, s, r, bisect_right(s, t))
+    m = hi - lo
+    if m == 0:
+        return (t - b) * (rb + rt) / 2.0
+    if m == 1:
+        return _simpson_pair(s[lo] - b, t - s[lo], rb, r[lo], rt)
+    odd = m % 2
+    first = _simpson_pair(s[lo] - b, s[lo + 1] - s[lo], rb, r[lo], r[lo + 1])
+    middle = pairs[max(hi - 3 - odd, lo - 1) + 2] - pairs[lo + 1]
+    h0, h1 = s[hi - 1] - s[hi - 2], t - s[hi - 1]
+    if odd:
+        end = _simpson_pair(h0, h1, r[hi - 2], r[hi - 1], rt)
+    else:
+        end = _simpson_last(h0, h1, r[hi - 2], r[hi - 1], rt)
+    return first + middle + end
+
+
+def blade_element_width(table, sr_base, sr_top):
+    """Scalar version of blade_element_widths"""
+    s, r, _, rsum = table["lists"]
+    b = min(1.0, max(0.0, float(sr_base)))
+    t = min(1.0, max(b, float(sr_top)))
+    lo = bisect_right(s, b)
+    hi = max(lo, bisect_left(s, t))
+    rb = _sr_interp(b, s, r, lo)
+    rt = _sr_interp(t, s, r, bisect_right(s, t))
+    return (rb + rt + rsum[hi] - rsum[lo]) / (hi - lo + 2)
+
+
+def _sr_bounds(table, sr_base, sr_top):
+    """clamped element bounds, their interpolated widths and the range of shape points strictly inside"""
+    s, r = table["s"], table["r"]
+    sr_base = numpy.clip(numpy.asarray(sr_base, dtype=float), 0, 1)
+    sr_top = numpy.clip(numpy.asarray(sr_top, dtype=float), sr_base, 1)
+    lo = numpy.searchsorted(s, sr_base, side="right")
+    hi = numpy.maximum(lo, numpy.searchsorted(s, sr_top, side="left"))
+    return (
+        sr_base,
+        sr_top,
+        numpy.interp(sr_base, s, r),
+        numpy.interp(sr_top, s, r),
+        lo,
+        hi,
+    )
+
+
+def blade_element_areas(table, sr_base, sr_top):
+    """Integral of r between sr_base and sr_top (arrays)
+
+    The result is the one of simpson() applied on (sr_base, s points strictly
+    inside, sr_top), as done by Leaves.blade_elt_area, but computed by lookup
+    in a table returned by sr_table.
+    """
+    s, r, pairs = table["s"], table["r"], table["pairs"]
+    last = len(s) - 1
+    b, t, rb, rt, lo, hi = _sr_bounds(table, sr_base, sr_top)
+    m = hi - lo  # number of shape points inside the element
+
+    def at(i):
+        i = numpy.clip(i, 0, last)
+        return s[i], r[i]
+
+    s1, r1 = at(lo)
+    s2, r2 = at(lo + 1)
+    sp, rp = at(hi - 2)
+    sl, rl = at(hi - 1)
+    odd = m % 2 == 1
+    # first pair of intervals (b, s1, s2), regular pairs, then last interval(s) up to t
+    first = _simpson_pair(s1 - b, s2 - s1, rb, r1, r2)
+    start = lo + 1
+    stop = numpy.maximum(hi - 3 - odd, start - 2)
+    middle = pairs[numpy.clip(stop + 2, 0, last + 1)] - pairs[numpy.clip(start, 0, last + 1)]
+    end = numpy.where(
+        odd,
+        _simpson_pair(sl - sp, t - sl, rp, rl, rt),
+        _simpson_last(sl - sp, t - sl, rp, rl, rt),
+    )
+    area = numpy.where(
+        m == 0,
+        (t - b) * (rb + rt) / 2.0,
+        numpy.where(
+            m == 1,
+            _simpson_pair(s1 - b, t - s1, rb, r1, rt),
+            first + middle + end,
+        ),
+    )
+    return area
+
+
+def blade_element_widths(table, sr_base, sr_top):
+    """Mean of r over (sr_base, s points strictly inside, sr_top) (arrays), using a table returned by sr_table"""
+    b, t, rb, rt, lo, hi = _sr_bounds(table, sr_base, sr_top)
+    rsum = table["rsum"]
+    return (rb + rt + rsum[hi] - rsum[lo]) / (hi - lo + 2)
+
+
 def xydb_to_csv(xydb, filename):
     dat = [
         (numpy.repeat(k, len(x)), numpy.repeat(i, len(x)), x, y)
@@ -116,6 +293,13 @@ def incline_leaf(shape, inclin, relative_angle=True):
     return leaf
 
 
+def _spans(starts, sizes, order):
+    """concatenated ranges starts[j]:starts[j] + sizes[j] for j in order"""
+    sizes = sizes[order]
+    shift = numpy.repeat(starts[order] - (numpy.cumsum(sizes) - sizes), sizes)
+    return numpy.arange(sizes.sum()) + shift
+
+
 class Leaves:
     def __init__(
         self,
@@ -125,7 +309,35 @@ class Leaves:
         dynamic_bins=None,
         discretisation_level=9,
         twist=0,
+        mesh_cache_size=4096,
+        mesh_cache_precision=6,
+        fit_cache=False,
+        fit_workers=1,
+        lod_levels=(),
     ):
+        """
+        Args:
+            xydb: a leaf midrib database (x, y coordinates). If None, the
+             default So99 database is used
+            srdb: a leaf shape database (relative curvilinear abscissa, relative
+             width). If None, the default SRSo database is used
+            geoLeaf: R code used by AdelR to select leaf shapes
+            dynamic_bins: age bins of a dynamic (age dependant) xydb
+            discretisation_level: the number of points used for representing
+             fitted leaf shapes
+            twist: leaf twist angle (deg)
+            mesh_cache_size: (int) maximal number of leaf element meshes kept in
+             the mesh cache. Set to 0 to disable caching
+            mesh_cache_precision: (int) number of decimals used to quantize mesh
+             inputs when looking for a cached mesh
+            fit_cache: (bool) should fitted shapes be read from / written to the
+             on-disk cache of fitted leaves (see fitting.fit_leaves) ? Off by
+             default, as it writes in the user cache directory
+            fit_workers: (int) number of processes used for fitting leaf shapes
+            lod_levels: (list of int) discretisation levels (lower than
+             discretisation_level) of the simplified shapes available for level
+             of detail meshing (see openalea.adel.lod)
+        """
         self.leaves = None
         if xydb is None:
             data = datadir + "/data/So99.csv"
@@ -149,8 +361,26 @@ class Leaves:
         self.bins = dynamic_bins
         self.discretisation_level = discretisation_level
         self.twist = twist
+        self.mesh_cache_size = mesh_cache_size
+        self.mesh_cache_precision = mesh_cache_precision
+        self.fit_cache = fit_cache
+        self.fit_workers = fit_workers
+        self._mesh_cache = OrderedDict()
+        self._mesh_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._sr_tables = {}
+        self.lod_levels = tuple(
+            sorted({int(lev) for lev in lod_levels if lev < discretisation_level}, reverse=True)
+        )
+        self.lod_leaves = {}
         self.fit_leaves()
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # cached meshes are plantgl objects that are cheap to recompute
+        state["_mesh_cache"] = OrderedDict()
+        state["_sr_tables"] = {}
+        return state
+
     def fit_leaves(self):
         leaves = {}
         xy = self.xydb
@@ -171,11 +401,36 @@ class Leaves:
                 else:
                     xysr = (xy[k][i][0], xy[k][i][1], sr[k][0], sr[k][1])
                 leaves[k].append(xysr)
-        leaves, discard = fitting.fit_leaves(
-            leaves, self.discretisation_level, self.dynamic
+        leaves, discard, lod_leaves = fitting.fit_leaf_pyramid(
+            leaves,
+            self.discretisation_level,
+            self.lod_levels,
+            self.dynamic,
+            cache=self.fit_cache,
+            workers=self.fit_workers,
         )
 
         self.leaves = leaves
+        self.lod_leaves = lod_leaves
+        self._sr_tables = {}
+        self.clear_mesh_cache()
+
+    def levels(self):
+        """discretisation levels available for meshing, from the finest to the coarsest"""
+        return (self.discretisation_level,) + self.lod_levels
+
+    def lod_level(self, lod=None):
+        """the level of the shape pyramid used for meshing at discretisation level lod
+
+        This is the coarsest available level not lower than lod, or None for
+        full resolution shapes.
+        """
+        if lod is None:
+            return None
+        finer = [level for level in self.lod_levels if level >= lod]
+        if finer:
+            return min(finer)
+        return None
 
     def get_age_index(self, age=None):
         age_index = age
@@ -198,12 +453,17 @@ class Leaves:
         # age_index = '(%s, %s]'%(str(self.bins[age_index-1]), str(self.bins[age_index]))
         return key, index, age_index
 
-    def get_leaf(self, leaf_key):
+    def get_leaf(self, leaf_key, lod=None):
         key, index, age_index = leaf_key
+        level = self.lod_level(lod)
+        if level is None:
+            leaves = self.leaves
+        else:
+            leaves = self.lod_leaves[level]
         if age_index is None:
-            leaf = self.leaves[key][index]
+            leaf = leaves[key][index]
         else:
-            leaf = self.leaves[key][index][age_index]
+            leaf = leaves[key][index][age_index]
         # deep copy is required as fitting.mesh alter shape
         leaf = deepcopy(leaf)
         if isinstance(leaf, dict):
@@ -217,56 +477,72 @@ class Leaves:
             sr = sr["s"], sr["r"]
         return sr
 
+    def sr_table(self, leaf_key):
+        """return the (cached) area / width lookup table of the shape of leaf_key"""
+        key = leaf_key[0]
+        table = self._sr_tables.get(key)
+        if table is None:
+            table = sr_table(*self.get_sr(leaf_key))
+            self._sr_tables[key] = table
+        return table
+
     def blade_elt_area(self, leaf_key, Lshape, Lwshape, sr_base, sr_top):
         """surface of a blade element, positioned with two relative curvilinear abscissa"""
 
         S = 0
-        sr_base = min([1, max([0, sr_base])])
-        sr_top = min([1, max([sr_base, sr_top])])
         if leaf_key is not None:
-            s, r = self.get_sr(leaf_key)
-            sre = [sr for sr in zip(s, r) if (sr_base < sr[0] < sr_top)]
-            if len(sre) > 0:
-                se, re = list(zip(*sre))
-                snew = [sr_base] + list(se) + [sr_top]
-                rnew = (
-                    [numpy.interp(sr_base, s, r)]
-                    + list(re)
-                    + [numpy.interp(sr_top, s, r)]
-                )
-            else:
-                snew = [sr_base, sr_top]
-                rnew = [numpy.interp(sr_base, s, r), numpy.interp(sr_top, s, r)]
-
-            S = simpson(rnew, x=snew) * Lshape * Lwshape
-
+            table = self.sr_table(leaf_key)
+            S = blade_element_area(table, sr_base, sr_top) * Lshape * Lwshape
         return S
 
     def blade_elt_width(self, leaf_key, Lshape, Lwshape, sr_base, sr_top):
         """width of a blade element, positioned with two relative curvilinear abscissa"""
 
         w = 0
-        sr_base = min([1, max([0, sr_base])])
-        sr_top = min([1, max([sr_base, sr_top])])
         if leaf_key is not None:
-            s, r = self.get_sr(leaf_key)
-            sre = [sr for sr in zip(s, r) if (sr_base < sr[0] < sr_top)]
-            if len(sre) > 0:
-                se, re = list(zip(*sre))
-                rnew = (
-                    [numpy.interp(sr_base, s, r)]
-                    + list(re)
-                    + [numpy.interp(sr_top, s, r)]
-                )
-            else:
-                rnew = [numpy.interp(sr_base, s, r), numpy.interp(sr_top, s, r)]
+            table = self.sr_table(leaf_key)
+            w = blade_element_width(table, sr_base, sr_top) * Lwshape
+        return w
 
-            w = numpy.mean(rnew) * Lwshape
+    def blade_elt_areas(self, leaf_key, Lshape, Lwshape, sr_base, sr_top):
+        """surfaces of blade elements of a same leaf shape (vectorised blade_elt_area)
 
-        return w
+        Args:
+            leaf_key: the shape key
+            Lshape, Lwshape: (scalars or arrays) length and width of the leaf shape
+            sr_base, sr_top: (arrays) relative curvilinear abscissa of the elements
+
+        Returns:
+            an array of element surfaces
+        """
+        table = self.sr_table(leaf_key)
+        return blade_element_areas(table, sr_base, sr_top) * Lshape * Lwshape
+
+    def blade_elt_widths(self, leaf_key, Lshape, Lwshape, sr_base, sr_top):
+        """widths of blade elements of a same leaf shape (vectorised blade_elt_width)"""
+        table = self.sr_table(leaf_key)
+        return blade_element_widths(table, sr_base, sr_top) * Lwshape
+
+    def clear_mesh_cache(self):
+        """Empty the leaf element mesh cache and reset its counters"""
+        self._mesh_cache = OrderedDict()
+        self._mesh_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def mesh_cache_info(self):
+        """return a dict with hits, misses, evictions, size and maxsize of the mesh cache"""
+        info = dict(self._mesh_cache_stats)
+        info.update({"size": len(self._mesh_cache), "maxsize": self.mesh_cache_size})
+        return info
+
+    def _mesh_key(self, leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline, flipx, min_area, lod=None):
+        ndigits = self.mesh_cache_precision
+        values = (L_shape, Lw_shape, length, s_base, s_top, incline, min_area)
+        return (tuple(leaf_key), bool(flipx), self.lod_level(lod)) + tuple(
+            round(float(v), ndigits) for v in values
+        )
 
     def mesh(
-        self, leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline=1, flipx=False, min_area=1e-6
+        self, leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline=1, flipx=False, min_area=1e-6, lod=None
     ):
         """Compute mesh for a leaf element.
         - shape is a x,y,s,r tuple describing leaf shape
@@ -274,29 +550,164 @@ class Leaves:
         - Lw_shape is the width of the scaled shape
         - length is the total visible length to be meshed
         - s_base and s_top are relative proportion (on length) of the element to represent
+        - lod is an optional discretisation level of the shape (see lod_level)
+
+        Meshes are memoized in a bounded LRU cache keyed on quantized inputs:
+        returned meshes may be shared between elements and should not be
+        modified in place.
+        """
+        entry = self._mesh_entry(
+            leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline, flipx, min_area, lod
+        )
+        pts, ind, mesh = entry
+        if mesh is None and pts is not None:
+            mesh = fitting.plantgl_shape(pts, ind)
+            entry[2] = mesh
+        return mesh
+
+    def mesh_arrays(
+        self, leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline=1, flipx=False, min_area=1e-6, lod=None
+    ):
+        """Same as mesh, but return (points, indices) numpy arrays ((None, None) if the element is degenerated)"""
+        pts, ind, _ = self._mesh_entry(
+            leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline, flipx, min_area, lod
+        )
+        return pts, ind
+
+    def mesh_batch(self, records, flipx=False, min_area=1e-6):
+        """Mesh a collection of leaf elements at once.
+
+        Args:
+            records: a dict of columns (or a pandas DataFrame) with 'shape_key',
+             'L_shape', 'Lw_shape', 'length', 'srb', 'srt' and (optional)
+             'inclination' and 'lod' entries, one row per blade element
+            flipx: (bool) passed to mesh
+            min_area: minimal area of the triangles kept in the meshes
+
+        Returns:
+            a dict with 'points' (packed (n, 3) vertex buffer), 'indices' (packed
+            (m, 3) index buffer, indices are local to each element),
+            'point_offsets' and 'index_offsets' (element i spans
+            points[point_offsets[i]:point_offsets[i + 1]]). Degenerated
+            elements have empty spans.
         """
-        shape = self.get_leaf(leaf_key)
+        keys = list(records["shape_key"])
+        nrec = len(keys)
+        columns = [
+            numpy.asarray(records[c], dtype=float)
+            for c in ("L_shape", "Lw_shape", "length", "srb", "srt")
+        ]
+        if "inclination" in records:
+            columns.append(numpy.asarray(records["inclination"], dtype=float))
+        else:
+            columns.append(numpy.ones(nrec))
+        lods = [None] * nrec
+        if "lod" in records:
+            lods = [None if pandas.isnull(lod) else int(lod) for lod in records["lod"]]
+
+        # mesh each distinct element once, then gather the meshes of all records
+        values = numpy.column_stack(columns) if nrec else numpy.zeros((0, 6))
+        if self.mesh_cache_size:
+            values = numpy.round(values, self.mesh_cache_precision)
+        distinct = {}
+        uid = numpy.empty(nrec, dtype=int)
+        for i, key in enumerate(
+            zip(map(tuple, keys), lods, map(tuple, values.tolist()))
+        ):
+            uid[i] = distinct.setdefault(key, len(distinct))
+        first = numpy.unique(uid, return_index=True)[1]
+
+        upoints, uindices = [], []
+        unpts = numpy.zeros(len(distinct), dtype=int)
+        unind = numpy.zeros(len(distinct), dtype=int)
+        for u, i in enumerate(first.tolist()):
+            pts, ind = self.mesh_arrays(
+                keys[i],
+                *[c[i] for c in columns],
+                flipx=flipx,
+                min_area=min_area,
+                lod=lods[i],
+            )
+            if pts is not None:
+                upoints.append(pts)
+                uindices.append(ind)
+                unpts[u] = len(pts)
+                unind[u] = len(ind)
+
+        npts, nind = unpts[uid], unind[uid]
+        point_offsets = numpy.concatenate(([0], numpy.cumsum(npts)))
+        index_offsets = numpy.concatenate(([0], numpy.cumsum(nind)))
+        if upoints:
+            upoints = numpy.concatenate(upoints)
+            uindices = numpy.concatenate(uindices).astype(numpy.int32)
+            points = upoints[_spans(numpy.cumsum(unpts) - unpts, unpts, uid)]
+            indices = uindices[_spans(numpy.cumsum(unind) - unind, unind, uid)]
+        else:
+            points = numpy.zeros((0, 3))
+            indices = numpy.zeros((0, 3), dtype=numpy.int32)
+        return {
+            "points": points,
+            "indices": indices,
+            "point_offsets": point_offsets,
+            "index_offsets": index_offsets,
+        }
+
+    def element_triangles(self, leaf_key, L_shape, length, s_base, s_top, lod=None):
+        """number of triangles of a leaf element mesh (before removal of the small ones)"""
+        element = fitting.leaf_element(
+            self.get_leaf(leaf_key, lod), L_shape, length, s_base, s_top, 1
+        )
+        if element is None or len(element[0]) < 2:
+            return 0
+        return 2 * (len(element[0]) - 1)
+
+    def _mesh_entry(
+        self, leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline, flipx, min_area, lod=None
+    ):
+        """return a [points, indices, plantgl mesh] cache entry (mesh is built lazily)"""
+        if not self.mesh_cache_size:
+            pts, ind = self._mesh(
+                leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline, flipx, min_area, lod
+            )
+            return [pts, ind, None]
+
+        key = self._mesh_key(
+            leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline, flipx, min_area, lod
+        )
+        cache = self._mesh_cache
+        if key in cache:
+            self._mesh_cache_stats["hits"] += 1
+            cache.move_to_end(key)
+            return cache[key]
+
+        self._mesh_cache_stats["misses"] += 1
+        pts, ind = self._mesh(
+            leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline, flipx, min_area, lod
+        )
+        entry = [pts, ind, None]
+        cache[key] = entry
+        if len(cache) > self.mesh_cache_size:
+            cache.popitem(last=False)
+            self._mesh_cache_stats["evictions"] += 1
+        return entry
+
+    def _mesh(
+        self, leaf_key, L_shape, Lw_shape, length, s_base, s_top, incline=1, flipx=False, min_area=1e-6, lod=None
+    ):
+        """return points and indices arrays of a leaf element mesh, or (None, None)"""
+        shape = self.get_leaf(leaf_key, lod)
 
         shape = incline_leaf(shape, incline)
         if flipx:
             shape = (-shape[0],) + shape[1:]  # to position leaves along tiller emitted
-        leaf_mesh = fitting.mesh4(
+        pts, ind = fitting.mesh4(
             shape, L_shape, length, s_base, s_top, Lw_shape, twist=self.twist,
         min_area=min_area)
-        if leaf_mesh:
-            pts, ind = leaf_mesh
-            if len(ind) < 1:
-                # raise  AdelError('ERROR less than 1 triangles') # mesh4 filters triangle < 1e-6
-                mesh = None
-            else:
-                mesh = fitting.plantgl_shape(pts, ind)
-        else:
-            if length > 0:
-                print("ERROR No mesh", s_base, s_top, length)
-                pass
-            mesh = None
+        if len(ind) < 1:
+            # raise  AdelError('ERROR less than 1 triangles') # mesh4 filters triangle < 1e-6
+            return None, None
+        return pts, ind
 
-        return mesh
     def form_factor(self):
         """
         return form factor for each key in sr_db
@@ -351,5 +762,10 @@ def leaves_node(
     dynamic_bins=None,
     discretisation_level=9,
     twist=0,
+    mesh_cache_size=4096,
+    mesh_cache_precision=6,
+    fit_cache=False,
+    fit_workers=1,
+    lod_levels=(),
 ):
     return Leaves(**locals())
@@ -0,0 +1,191 @@
+"""Level of detail (LOD) policies for the meshing of leaves
+
+Policies set a 'lod' property on the leaf elements of a canopy mtg. This is the
+discretisation level of the leaf shape used by mtg_interpreter to mesh the
+element (see Leaves.lod_level). Simplified shapes are taken from the pyramid
+built by Leaves when lod_levels are given.
+"""
+
+import numpy
+
+import openalea.adel.fitting as fitting
+from openalea.adel.canopy_mesh import geometry_arrays, geometry_items
+from openalea.adel.mtg_interpreter import element_data, mesh_element
+
+
+def leaf_elements(g, min_length=0.01):
+    """return a {vid: element_data} dict of the elements of g meshed with a leaf shape"""
+    elements = {}
+    for vid in g.vertices(scale=g.max_scale()):
+        if not g.label(vid).startswith("Leaf"):
+            continue
+        data = element_data(g, vid)
+        if (
+            data["shape_key"] is None
+            or data["srb"] is None
+            or not data["length"] > 0
+            or data["visible_length"] < min_length
+        ):
+            continue
+        elements[vid] = data
+    return elements
+
+
+def area_lod(g, leaves, elements, thresholds=(1.0, 0.1)):
+    """Rank elements on their area
+
+    Args:
+        thresholds: decreasing element areas. Elements larger than
+         thresholds[0] are kept at full resolution, elements between
+         thresholds[0] and thresholds[1] get the first simplified level, etc.
+
+    Returns:
+        a {vid: rank} dict (rank 0 is full resolution, rank i the ith level of the pyramid)
+    """
+    area = g.property("area")
+    return {
+        vid: int(sum(area.get(vid, 0) < t for t in thresholds)) for vid in elements
+    }
+
+
+def distance_lod(g, leaves, elements, camera=(0, 0, 0), thresholds=(100, 500)):
+    """Rank elements on the distance between their plant and a camera
+
+    Args:
+        camera: (x, y, z) position of the camera, in the units of plant positions
+        thresholds: increasing distances. Plants closer than thresholds[0] are
+         kept at full resolution, etc.
+
+    Returns:
+        a {vid: rank} dict
+    """
+    position = g.property("position")
+    camera = numpy.asarray(camera, dtype=float)
+    ranks = {}
+    for vid in elements:
+        pid = g.complex_at_scale(vid, scale=1)
+        d = numpy.linalg.norm(numpy.asarray(position.get(pid, (0, 0, 0)), dtype=float) - camera)
+        ranks[vid] = int(sum(d > t for t in thresholds))
+    return ranks
+
+
+def budget_lod(g, leaves, elements, budget=100000):
+    """Rank elements so that leaves are meshed with at most budget triangles (if possible)
+
+    The smallest elements are simplified first: all the elements are moved
+    to the next level of the pyramid, from the smallest to the largest, until
+    the budget is met.
+
+    Returns:
+        a {vid: rank} dict
+    """
+    vids = list(elements)
+    if not vids:
+        return {}
+    area = g.property("area")
+    nlevels = max(len(leaves[data["species"]].levels()) for data in elements.values())
+    triangles = numpy.zeros((len(vids), nlevels), dtype=int)
+    for i, vid in enumerate(vids):
+        data = elements[vid]
+        species_leaves = leaves[data["species"]]
+        levels = species_leaves.levels()
+        for k in range(nlevels):
+            triangles[i, k] = species_leaves.element_triangles(
+                data["shape_key"],
+                data["shape_mature_length"],
+                data["visible_length"],
+                data["srb"],
+                data["srt"],
+                lod=levels[min(k, len(levels) - 1)],
+            )
+    order = numpy.argsort([area.get(vid, 0) for vid in vids], kind="stable")
+    rank = numpy.zeros(len(vids), dtype=int)
+    total = triangles[:, 0].sum()
+    for k in range(1, nlevels):
+        if total <= budget:
+            break
+        saving = numpy.cumsum(triangles[order, k - 1] - triangles[order, k])
+        n = min(int(numpy.searchsorted(saving, total - budget)) + 1, len(vids))
+        rank[order[:n]] = k
+        total -= saving[n - 1]
+    return dict(zip(vids, rank.tolist()))
+
+
+policies = {"area": area_lod, "distance": distance_lod, "budget": budget_lod}
+
+
+def set_lod(g, leaves, policy="area", min_length=0.01, **kwds):
+    """Set the 'lod' property of the leaf elements of g with a LOD policy
+
+    Args:
+        g: a canopy mtg (before interpretation)
+        leaves: a {species: Leaves} dict
+        policy: one of 'area', 'distance' or 'budget' (see area_lod,
+         distance_lod and budget_lod), or None for full resolution everywhere
+        min_length: minimal visible length of the meshed leaves
+        kwds: parameters of the policy
+
+    Returns:
+        g
+    """
+    if "lod" in g.property_names():
+        g.remove_property("lod")
+    if policy is None:
+        return g
+    elements = leaf_elements(g, min_length)
+    ranks = policies[policy](g, leaves, elements, **kwds)
+    g.add_property("lod")
+    lod = g.property("lod")
+    for vid, rank in ranks.items():
+        levels = leaves[elements[vid]["species"]].levels()
+        if rank > 0:
+            lod[vid] = levels[min(rank, len(levels) - 1)]
+    return g
+
+
+def lod_report(g, leaves, min_length=0.01, classic=False):
+    """Compare the leaf meshes of an interpreted mtg with full resolution ones
+
+    Returns:
+        a dict with the number of meshed leaf 'elements', the number of
+        elements per discretisation level ('levels'), the number of
+        'triangles' and the 'area' of the leaf meshes, their values at
+        full resolution ('full_triangles', 'full_area') and the relative
+        'area_error'
+    """
+    elements = leaf_elements(g, min_length)
+    geometry = dict(geometry_items(g))
+    report = {
+        "elements": 0,
+        "levels": {},
+        "triangles": 0,
+        "full_triangles": 0,
+        "area": 0.0,
+        "full_area": 0.0,
+    }
+    for vid, data in elements.items():
+        geom = geometry.get(vid)
+        if geom is None:
+            continue
+        pts, ind = geometry_arrays(geom)
+        ntri = len(ind)
+        area = fitting.triangle_areas(pts, ind).sum()
+        level = leaves[data["species"]].lod_level(data["lod"])
+        if level is None:
+            level = leaves[data["species"]].discretisation_level
+            full_ntri, full_area = ntri, area
+        else:
+            full = mesh_element(dict(data, lod=None), leaves, min_length, classic)
+            pts, ind = geometry_arrays(full)
+            full_ntri = len(ind)
+            full_area = fitting.triangle_areas(pts, ind).sum()
+        report["elements"] += 1
+        report["levels"][level] = report["levels"].get(level, 0) + 1
+        report["triangles"] += ntri
+        report["full_triangles"] += full_ntri
+        report["area"] += area
+        report["full_area"] += full_area
+    report["area_error"] = 0.0
+    if report["full_area"] > 0:
+        report["area_error"] = (report["area"] - report["full_area"]) / report["full_area"]
+    return report
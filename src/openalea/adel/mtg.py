@@ -21,6 +21,8 @@ from openalea.mtg.algo import union
 
 import numpy
 
+from openalea.adel.adel_index import adel_index
+
 try:
     from openalea.plantgl.all import (
         Scene,
@@ -419,12 +421,11 @@ def to_aggregation_table(g):
 
             nb_stem_elements[mid] = stem_index
 
+    ancestors = adel_index(g).ancestors[1:4]
     i = 0
     for root_elt in g.roots_iter(scale=4):
         for vid in pre_order(g, root_elt):
-            metamer_id = g.complex(vid)
-            axe_id = g.complex(metamer_id)
-            plant_id = g.complex(axe_id)
+            plant_id, axe_id, metamer_id = ancestors[:, vid].tolist()
 
             plant_index = index[plant_id]
             axe_index = index[axe_id]
@@ -561,7 +562,10 @@ def to_canestra(g):
     """
     Return a string representing a canestra file.
     """
-    geometry = g.property("geometry")
+    from openalea.adel.canopy_mesh import CanopyMesh, arrays_items
+
+    # packed (CanopyMesh) and instanced geometries are read from their buffers
+    triangles = CanopyMesh.from_arrays(dict(arrays_items(g))).caribu_triangles()
     can_label = g.property("can_label")
 
     begin = "# File generated by OpenAlea.Adel program"
@@ -571,13 +575,10 @@ def to_canestra(g):
 
     for root_elt in g.roots_iter(scale=max_scale):
         for vid in pre_order(g, root_elt):
-            mesh = geometry.get(vid)
-            if not mesh:
+            if not triangles.get(vid):
                 continue
-            pts = numpy.array(mesh.pointList, ndmin=2)
-            indices = numpy.array(mesh.indexList, ndmin=2)
             label = can_label[vid]
-            lines.extend([_line(ind, pts, label) for ind in indices])
+            lines.extend([_line(range(3), t, label) for t in triangles[vid]])
     lines.append("")
     return "\n".join(lines)
 
@@ -626,7 +627,9 @@ def planter(g, distribution, random_seed=0, azimuths=None):
     plants = g.vertices(scale=1)
     plants = plants[: len(distribution)]
 
-    max_scale = g.max_scale()
+    index = adel_index(g)
+    elements = index.elements
+    element_plants = index.complex_at_scale(elements, 1)
 
     for i, root_elt in enumerate(plants):
         previous_translation = translations.get(root_elt, (0, 0, 0))
@@ -642,11 +645,7 @@ def planter(g, distribution, random_seed=0, azimuths=None):
         transfo, translation = pt2transfo(
             Vector3(distribution[i]), -Vector3(previous_translation), rotation
         )
-        l = (
-            vid
-            for vid in g.vertices_iter(scale=max_scale)
-            if g.complex_at_scale(vid, scale=1) == root_elt
-        )
+        l = elements[element_plants == root_elt].tolist()
         # for vid in g.components_at_scale(root_elt, 4):
         for vid in l:
             geom = geometry.get(vid)
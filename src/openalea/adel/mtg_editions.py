@@ -11,16 +11,18 @@
 # ==============================================================================
 """new mtg edition function (should be integrated in new mtg"""
 
-from openalea.mtg.traversal import iter_mtg
 from openalea.adel.newmtg import (
     internode_elements,
     sheath_elements,
     blade_elements,
+    blade_elements_table,
+    blade_elements_lists,
     convert,
     properties_from_dict,
     adel_metamer,
 )
 from openalea.mtg import MTG, fat_mtg
+from openalea.adel.adel_index import adel_index
 from openalea.adel.exception import AdelDeprecationError
 
 
@@ -40,14 +42,11 @@ def find_label(label, g, constrained_in=0):
     labels = g.property("label")
     if ci == 0:
         return [k for k in g.vertices_iter() if labels.get(k, "") == label]
-    else:
-        # Hack car iter_mtg peut recycler sur le reste du mtg
-        cscale = g.scale(ci)
-        return [
-            k
-            for k in iter_mtg(g, ci)
-            if (labels.get(k, "") == label) and (g.complex_at_scale(k, cscale) == ci)
-        ]
+    if g.scale(ci) == g.max_scale() - 1:
+        # elements of an organ are its direct components: no index needed
+        return [k for k in [ci] + g.components(ci) if labels.get(k, "") == label]
+    index = adel_index(g)
+    return [k for k in index.members(ci).tolist() if labels.get(k, "") == label]
 
 
 def find_plants(g):
@@ -352,7 +351,7 @@ def add_axe(
     return vid_axe
 
 
-def update_organ_elements(g, leaves=None, split=False, phyllochron=None):
+def update_organ_elements(g, leaves=None, split=False, phyllochron=None, incremental=False):
     """Set / update organ elements
 
     Args:
@@ -360,6 +359,9 @@ def update_organ_elements(g, leaves=None, split=False, phyllochron=None):
         leaves: a leaf shape database
         split: (bool) flag trigering the separation between senescent and green
         part of an organ
+        incremental: (bool) if True, organs whose properties did not change
+         since the last incremental update (recorded in 'organ_state' property)
+         keep their elements untouched
 
     Returns:
 
@@ -379,8 +381,62 @@ def update_organ_elements(g, leaves=None, split=False, phyllochron=None):
     area = g.property("area")
     species = g.property("species")
     age = g.property("age")
+    if incremental and "organ_state" not in g.property_names():
+        g.add_property("organ_state")
+    organ_state = g.property("organ_state")
 
+    # organs to update
+    todo = []
     for organ in g.vertices(scale=4):
+        if labels[organ].startswith("blade"):
+            l = leaves[species[organ]]
+            if l is not None and l.dynamic:
+                lctype, lcindex, _ = shape_key[organ]
+                axe = labels[g.complex(g.complex(organ))]
+                age_index = l.get_age_index(
+                    float(age[organ]) / phyllochron.get(axe, phyllochron["T1"]) - 0.3
+                )
+                shape_key[organ] = (lctype, lcindex, age_index)
+        if incremental:
+            state = (
+                labels[organ],
+                length.get(organ),
+                visible_length.get(organ),
+                rolled_length.get(organ),
+                senesced_length.get(organ),
+                azimuth.get(organ),
+                inclination.get(organ),
+                diameter.get(organ),
+                sectors.get(organ),
+                shape_mature_length.get(organ),
+                shape_max_width.get(organ),
+                shape_key.get(organ),
+                species.get(organ),
+                split,
+            )
+            if organ_state.get(organ) == state:
+                continue
+            organ_state[organ] = state
+        todo.append(organ)
+
+    blades = [organ for organ in todo if labels[organ].startswith("blade")]
+    blade_elts = {}
+    for sp in set(species[organ] for organ in blades):
+        organs = [organ for organ in blades if species[organ] == sp]
+        hidden, table = blade_elements_table(
+            [sectors[organ] for organ in organs],
+            [length[organ] for organ in organs],
+            [visible_length[organ] for organ in organs],
+            [rolled_length[organ] for organ in organs],
+            [senesced_length[organ] for organ in organs],
+            [shape_mature_length[organ] for organ in organs],
+            [shape_max_width[organ] for organ in organs],
+            [shape_key[organ] for organ in organs],
+            leaves[sp],
+        )
+        blade_elts.update(zip(organs, blade_elements_lists(hidden, table, split)))
+
+    for organ in todo:
         if labels[organ].startswith("internode"):
             elts = internode_elements(
                 length[organ],
@@ -402,26 +458,7 @@ def update_organ_elements(g, leaves=None, split=False, phyllochron=None):
                 split=split,
             )
         elif labels[organ].startswith("blade"):
-            l = leaves[species[organ]]
-            if l is not None and l.dynamic:
-                lctype, lcindex, _ = shape_key[organ]
-                axe = labels[g.complex(g.complex(organ))]
-                age_index = l.get_age_index(
-                    float(age[organ]) / phyllochron.get(axe, phyllochron["T1"]) - 0.3
-                )
-                shape_key[organ] = (lctype, lcindex, age_index)
-            elts = blade_elements(
-                sectors[organ],
-                length[organ],
-                visible_length[organ],
-                rolled_length[organ],
-                senesced_length[organ],
-                shape_mature_length[organ],
-                shape_max_width[organ],
-                shape_key[organ],
-                leaves=leaves[species[organ]],
-                split=split,
-            )
+            elts = blade_elts[organ]
         else:
             elts = []
 
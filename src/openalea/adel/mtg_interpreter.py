@@ -1,9 +1,23 @@
 """Methods for mtg interpretation with turtle"""
 
+from concurrent.futures import ProcessPoolExecutor
 from math import degrees, pi, cos, sin
 
+import numpy
+import pandas
+
 import openalea.plantgl.all as pgl
 from openalea.mtg.plantframe.turtle import TurtleFrame
+from openalea.mtg.traversal import pre_order2
+
+import openalea.adel.fitting as fitting
+from openalea.adel.canopy_mesh import (
+    arrays_items,
+    geometry_arrays,
+    geometry_items,
+    plant_transform,
+    unpack_geometry,
+)
 
 
 def _is_iterable(x):
@@ -66,91 +80,246 @@ def slim_cylinder(length, radius_base, radius_top):
     return set
 
 
-def StemElement_mesh(length, diameter_base, diameter_top, classic=False):
+# unit cylinder meshes (radius 1, height 1), by (classic, slices)
+_cylinder_templates = {}
+
+
+def cylinder_template(classic=False, slices=6):
+    """return (points, indices) arrays of the unit cylinder mesh used by StemElement_mesh
+
+    The template is computed once per (classic, slices): a slim_cylinder, or
+    the tesselation of a solid pgl.Cylinder with slices slices if classic.
+    """
+    key = (bool(classic), int(slices))
+    template = _cylinder_templates.get(key)
+    if template is None:
+        if classic:
+            tessel = pgl.Tesselator()
+            pgl.Cylinder(1.0, 1.0, True, slices).apply(tessel)
+            template = geometry_arrays(tessel.triangulation)
+        else:
+            template = geometry_arrays(slim_cylinder(1.0, 1.0, 1.0))
+        _cylinder_templates[key] = template
+    return template
+
+
+def cylinder_arrays(length, radius_base, radius_top, classic=False, slices=6):
+    """points and indices of a (tapered) cylinder, obtained by scaling the unit cylinder template
+
+    The radius varies linearly from radius_base (z=0) to radius_top (z=length), as with pgl.Tapered.
+    """
+    template, indices = cylinder_template(classic, slices)
+    z = template[:, 2]
+    radius = radius_base + (radius_top - radius_base) * z
+    points = numpy.empty_like(template)
+    points[:, :2] = template[:, :2] * radius[:, numpy.newaxis]
+    points[:, 2] = z * length
+    return points, indices.copy()
+
+
+def StemElement_mesh(length, diameter_base, diameter_top, classic=False, slices=6):
     """Compute mesh for a stem element
-    - classic indicates
+    - classic indicates the use of a solid tapered cylinder with slices slices
+      instead of a slim (8 triangles) one. 6 is the minimal number of slices for
+      a correct computation of star (percentage error lower than 5)
     """
-    if classic:
-        solid = True
-        slices = 6  # 6 is the minimal number of slices for a correct computation of star (percentage error lower than 5)
-        stem = pgl.Tapered(
-            diameter_base / 2.0,
-            diameter_top / 2.0,
-            pgl.Cylinder(1.0, length, solid, slices),
+    return fitting.plantgl_shape(
+        *cylinder_arrays(
+            length, diameter_base / 2.0, diameter_top / 2.0, classic, slices
         )
-        tessel = pgl.Tesselator()
-        stem.apply(tessel)
-        mesh = tessel.triangulation
-    else:
-        mesh = slim_cylinder(length, diameter_base / 2.0, diameter_top / 2.0)
+    )
 
-    return mesh
 
+def element_data(g, vid):
+    """the properties of element vid (and of its organ) needed to compute its mesh"""
+    label = g.label(vid)
+    organ = g.complex(vid)
+    prop = g.property
+    data = {"label": label, "length": prop("length").get(vid)}
+    if label.startswith("Leaf"):
+        for k in ("srb", "srt", "lrolled", "d_rolled", "lod"):
+            data[k] = prop(k).get(vid)
+        for k in (
+            "species",
+            "visible_length",
+            "shape_key",
+            "shape_mature_length",
+            "shape_max_width",
+            "inclination",
+        ):
+            data[k] = prop(k).get(organ)
+    elif label.startswith("Stem"):
+        data["diameter"] = prop("diameter").get(organ)
+    return data
 
-def compute_element(element_node, leaves, min_length=0.01, classic=False):
-    """compute geometry of Adel base elements (LeafElement and StemElement)
-    element_node should be a mtg node proxy"""
-    n = element_node
+
+def mesh_element(data, leaves, min_length=0.01, classic=False, leaf_mesh=None):
+    """compute geometry of an Adel base element (LeafElement and StemElement) from its element_data
+    leaf_mesh is an optional leaf mesh computed beforehand"""
+    label = data["label"]
     geom = None
 
-    if n.label.startswith("Leaf"):  # leaf element
-        blade = n.complex()
-        species = blade.species
-        if blade.visible_length >= min_length:
-            if blade.shape_key is not None and n.srb is not None:
+    if label.startswith("Leaf"):  # leaf element
+        species = data["species"]
+        if data["visible_length"] >= min_length:
+            if leaf_mesh is not None:
+                geom = leaf_mesh
+            elif data["shape_key"] is not None and data["srb"] is not None:
                 if leaves[species].dynamic:
                     inclin = 1  # inclination is encoded in db
                 else:
-                    inclin = blade.inclination
+                    inclin = data["inclination"]
                 geom = leaves[
                     species
                 ].mesh(
-                    blade.shape_key,
-                    blade.shape_mature_length,
-                    blade.shape_max_width,
-                    blade.visible_length,
-                    n.srb,
-                    n.srt,
+                    data["shape_key"],
+                    data["shape_mature_length"],
+                    data["shape_max_width"],
+                    data["visible_length"],
+                    data["srb"],
+                    data["srt"],
                     incline=inclin,
                     flipx=True,
                     min_area=min_length**2 / 100,
+                    lod=data.get("lod"),
                 )  # flipx allows x-> -x to place the shape along with the tiller positioned with turtle.down()
 
-            if n.lrolled > 0:
-                rolled = StemElement_mesh(n.lrolled, n.d_rolled, n.d_rolled, classic)
+            lrolled = data["lrolled"]
+            if lrolled > 0:
+                d_rolled = data["d_rolled"]
+                rolled = StemElement_mesh(lrolled, d_rolled, d_rolled, classic)
                 if geom is None:
                     geom = rolled
                 else:
-                    geom = addSets(rolled, geom, translate=(0, 0, n.lrolled))
-    elif n.label.startswith("Stem"):  # stem element
-        stem = n.complex()
+                    geom = addSets(rolled, geom, translate=(0, 0, lrolled))
+    elif label.startswith("Stem"):  # stem element
         # diameter_base = stem.parent().diameter if (stem.parent() and stem.parent().diameter > 0.) else stem.diameter
         # diameter_top = n.diam
-        if n.length >= min_length:
-            diameter_base = stem.diameter
-            diameter_top = stem.diameter
-            geom = StemElement_mesh(n.length, diameter_base, diameter_top, classic)
+        if data["length"] >= min_length:
+            diameter_base = data["diameter"]
+            diameter_top = data["diameter"]
+            geom = StemElement_mesh(data["length"], diameter_base, diameter_top, classic)
 
     return geom
 
 
+def compute_element(element_node, leaves, min_length=0.01, classic=False, leaf_meshes=None):
+    """compute geometry of Adel base elements (LeafElement and StemElement)
+    element_node should be a mtg node proxy
+    leaf_meshes is an optional {vid: mesh} dict of leaf element meshes computed beforehand (see batch_leaf_meshes)"""
+    n = element_node
+    leaf_mesh = None
+    if leaf_meshes is not None:
+        leaf_mesh = leaf_meshes.get(n._vid)
+    return mesh_element(
+        element_data(n._g, n._vid), leaves, min_length, classic, leaf_mesh=leaf_mesh
+    )
+
+
+def leaf_records(g, leaves, min_length=0.01):
+    """Collect the leaf elements of g that are to be meshed by compute_element
+
+    Returns:
+        a {species: records} dict, records being a dict of columns (with a 'vid'
+        column) suitable for Leaves.mesh_batch
+    """
+    records = {}
+    lod = g.property("lod")
+    for vid in g.vertices(scale=5):
+        n = g.node(vid)
+        if not n.label.startswith("Leaf") or not n.length > 0:
+            continue
+        blade = n.complex()
+        if blade.visible_length < min_length:
+            continue
+        if blade.shape_key is None or n.srb is None:
+            continue
+        species = blade.species
+        if leaves[species].dynamic:
+            inclin = 1  # inclination is encoded in db
+        else:
+            inclin = blade.inclination
+        rec = records.setdefault(
+            species,
+            {
+                k: []
+                for k in (
+                    "vid",
+                    "shape_key",
+                    "L_shape",
+                    "Lw_shape",
+                    "length",
+                    "srb",
+                    "srt",
+                    "inclination",
+                    "lod",
+                )
+            },
+        )
+        rec["vid"].append(vid)
+        rec["shape_key"].append(blade.shape_key)
+        rec["L_shape"].append(blade.shape_mature_length)
+        rec["Lw_shape"].append(blade.shape_max_width)
+        rec["length"].append(blade.visible_length)
+        rec["srb"].append(n.srb)
+        rec["srt"].append(n.srt)
+        rec["inclination"].append(inclin)
+        rec["lod"].append(lod.get(vid))
+    return records
+
+
+def batch_leaf_meshes(g, leaves, min_length=0.01):
+    """Mesh all the leaf elements of g with one Leaves.mesh_batch call per species
+
+    Returns:
+        a {vid: mesh} dict (mesh is None for degenerated elements) to be passed to compute_element
+    """
+    meshes = {}
+    for species, records in leaf_records(g, leaves, min_length).items():
+        batch = leaves[species].mesh_batch(
+            records, flipx=True, min_area=min_length**2 / 100
+        )
+        meshes.update(unpack_leaf_meshes(records["vid"], batch))
+    return meshes
+
+
+def unpack_leaf_meshes(vids, batch):
+    """convert a packed mesh_batch output into a {vid: plantgl mesh} dict"""
+    po, io = batch["point_offsets"], batch["index_offsets"]
+    meshes = {}
+    for i, vid in enumerate(vids):
+        if io[i + 1] > io[i]:
+            meshes[vid] = fitting.plantgl_shape(
+                batch["points"][po[i] : po[i + 1]], batch["indices"][io[i] : io[i + 1]]
+            )
+        else:
+            meshes[vid] = None
+    return meshes
+
+
+def frame_transform(mesh, position, heading, up, face_up=False):
+    """Place a mesh in a turtle frame (position, heading and up vectors)"""
+    x = pgl.Vector3(*map(float, up))
+    if face_up:
+        z = pgl.Vector3(0, 0, 1)
+    else:
+        z = pgl.Vector3(*map(float, heading))
+    bo = pgl.BaseOrientation(x, z ^ x)
+    matrix = pgl.Transform4(bo.getMatrix())
+    matrix.translate(pgl.Vector3(*map(float, position)))
+    mesh = mesh.transform(matrix)
+    return mesh
+
+
 class AdelTurtle(pgl.PglTurtle):
     def __init__(self):
         super(AdelTurtle, self).__init__()
         self.context = {}
 
     def transform(self, mesh, face_up=False):
-        x = self.getUp()
-        if face_up:
-            z = pgl.Vector3(0, 0, 1)
-        else:
-            z = self.getHeading()
-        bo = pgl.BaseOrientation(x, z ^ x)
-        matrix = pgl.Transform4(bo.getMatrix())
-        matrix.translate(self.getPosition())
-        # print 'Position ', turtle.getPosition()
-        mesh = mesh.transform(matrix)
-        return mesh
+        return frame_transform(
+            mesh, self.getPosition(), self.getHeading(), self.getUp(), face_up
+        )
 
     def getFrame(self):
         pos = self.getPosition()
@@ -166,11 +335,15 @@ class AdelTurtle(pgl.PglTurtle):
 class AdelVisitor:
     """Performs geometric interpretation of mtg nodes"""
 
-    def __init__(self, leaves, min_length, classic, face_up):
+    def __init__(self, leaves, min_length, classic, face_up, leaf_meshes=None, frames=None):
+        """If frames is a dict, elements are not meshed: their turtle frames
+        (position, heading, up) are recorded in frames instead"""
         self.classic = classic
         self.face_up = face_up
         self.min_length = min_length
         self.leaves = leaves
+        self.leaf_meshes = leaf_meshes
+        self.frames = frames
 
     def __call__(self, g, v, turtle):
         geometry = g.property("geometry")
@@ -263,11 +436,22 @@ class AdelVisitor:
                 # print 'node', n._vid, 'azim ', azim
                 turtle.rollR(azim)
 
-        if n.label.startswith("Leaf") or n.label.startswith("Stem"):
+        if self.frames is not None:
+            if n.label.startswith("Leaf") or n.label.startswith("Stem"):
+                self.frames[v] = tuple(
+                    tuple(x) for x in (turtle.getPosition(), turtle.getHeading(), turtle.getUp())
+                )
+        elif n.label.startswith("Leaf") or n.label.startswith("Stem"):
             # update geometry of elements
             mesh = None
             if n.length > 0:
-                mesh = compute_element(n, self.leaves, min_length=self.min_length, classic=self.classic)
+                mesh = compute_element(
+                    n,
+                    self.leaves,
+                    min_length=self.min_length,
+                    classic=self.classic,
+                    leaf_meshes=self.leaf_meshes,
+                )
             if mesh:
                 n.geometry = turtle.transform(
                     mesh, face_up=self.face_up and n.label.startswith("Leaf")
@@ -289,8 +473,563 @@ class AdelVisitor:
         turtle.context.update({"axis": axis})
 
 
-def mtg_interpreter(g, leaves, min_length=0.01, classic=False, face_up=False):
-    """Compute/update the geometry on each node of the MTG using Turtle geometry."""
+# Vectorized turtle engine: same interpretation as AdelVisitor, with frames of
+# all plants propagated together in numpy
+
+
+def _rotate(v, axis, angle, mask):
+    """Rotate rows of v around (unit) rows of axis by angle (radians) where mask is True"""
+    if not mask.any():
+        return v
+    a = angle[mask][:, None]
+    k = axis[mask]
+    vv = v[mask]
+    c, s = numpy.cos(a), numpy.sin(a)
+    v = v.copy()
+    v[mask] = (
+        vv * c
+        + numpy.cross(k, vv) * s
+        + k * numpy.sum(k * vv, axis=1)[:, None] * (1 - c)
+    )
+    return v
+
+
+def _normed(v):
+    n = numpy.linalg.norm(v, axis=1)[:, None]
+    return numpy.where(n > 0, v / numpy.where(n > 0, n, 1), v)
+
+
+def turtle_sequence(g, plants=None):
+    """Collect, in turtle traversal order, the element data needed by turtle_frames
+
+    If plants (a list of plant vids) is given, only the elements of these
+    plants are collected (plants are independent for the turtle).
+
+    Returns:
+        a dict of numpy arrays, one entry per element
+    """
+    scale = g.max_scale()
+    label = g.property("label")
+    edge_type = g.property("edge_type")
+    position = g.property("position")
+    azimuth = g.property("azimuth")
+    inclination = g.property("inclination")
+    length = g.property("length")
+    lrolled = g.property("lrolled")
+
+    def _float(x):
+        return float(x) if x else 0.0
+
+    columns = (
+        "vid",
+        "plant",
+        "base",
+        "x",
+        "y",
+        "z",
+        "plant_azimuth",
+        "axis_change",
+        "branch",
+        "prev_ms",
+        "stem",
+        "leaf",
+        "inclination",
+        "azimuth",
+        "axis_azimuth",
+        "first",
+        "length",
+        "lrolled",
+    )
+    data = {k: [] for k in columns}
+    prev_axis = None
+    first = True
+    iplant = -1
+    if plants is None:
+        roots = g.component_roots_at_scale(g.root, scale=scale)
+    else:
+        roots = [
+            root
+            for plant in plants
+            for root in g.component_roots_at_scale(plant, scale=scale)
+        ]
+    for root in roots:
+        for vid in pre_order2(g, root):
+            organ = g.complex(vid)
+            metamer = g.complex(organ)
+            axe = g.complex(metamer)
+            axis = label.get(axe)
+            if prev_axis is None:
+                prev_axis = axis
+            base = g.parent(vid) is None
+            x = y = z = paz = 0.0
+            if base:
+                iplant += 1
+                plant = g.complex(axe)
+                if plant in position:
+                    x, y, z = map(float, position[plant])
+                paz = _float(azimuth.get(plant))
+                first = True
+            axis_change = axis != prev_axis
+            branch = axis_change and edge_type.get(metamer) == "+"
+            if branch:
+                first = True
+            lab = label.get(vid, "")
+            stem = lab.startswith("Stem")
+            inclin = _float(inclination.get(vid)) if stem else 0.0
+            data["vid"].append(vid)
+            data["plant"].append(iplant)
+            data["base"].append(base)
+            data["x"].append(x)
+            data["y"].append(y)
+            data["z"].append(z)
+            data["plant_azimuth"].append(paz)
+            data["axis_change"].append(axis_change)
+            data["branch"].append(branch)
+            data["prev_ms"].append(prev_axis == "MS")
+            data["stem"].append(stem)
+            data["leaf"].append(lab.startswith("Leaf"))
+            data["inclination"].append(inclin)
+            data["azimuth"].append(_float(azimuth.get(vid)) if stem else 0.0)
+            data["axis_azimuth"].append(_float(azimuth.get(axe)))
+            data["first"].append(first)
+            data["length"].append(_float(length.get(vid)))
+            data["lrolled"].append(_float(lrolled.get(vid)))
+            if stem and inclin:
+                first = False
+            prev_axis = axis
+    return {k: numpy.array(v) for k, v in data.items()}
+
+
+def turtle_frames(g, sequence=None):
+    """Compute the turtle frames used by AdelVisitor to position element meshes, for all plants at once.
+
+    Returns:
+        vids, position, heading, up arrays (one row per element, in turtle traversal order)
+    """
+    if sequence is None:
+        sequence = turtle_sequence(g)
+    seq = sequence
+    nelt = len(seq["vid"])
+    if nelt == 0:
+        empty = numpy.zeros((0, 3))
+        return seq["vid"], empty, empty, empty
+    plant = seq["plant"]
+    nplants = plant.max() + 1
+    start = numpy.searchsorted(plant, numpy.arange(nplants))
+    count = numpy.bincount(plant, minlength=nplants)
+    rad = pi / 180.0
+    zaxis = numpy.zeros((nplants, 3))
+    zaxis[:, 2] = 1
+
+    pos = numpy.zeros((nplants, 3))
+    head = numpy.tile([0.0, 0.0, 1.0], (nplants, 1))
+    up = numpy.tile([-1.0, 0.0, 0.0], (nplants, 1))
+    registers = {
+        k: [pos.copy(), head.copy(), up.copy()]
+        for k in ("MS_top", "tiller_base", "top")
+    }
+
+    def _store(name, mask, frame):
+        for reg, x in zip(registers[name], frame):
+            reg[mask] = x[mask]
+
+    def _copy(dest, src, mask):
+        _store(dest, mask, registers[src])
+
+    out_pos = numpy.zeros((nelt, 3))
+    out_head = numpy.zeros((nelt, 3))
+    out_up = numpy.zeros((nelt, 3))
+
+    for k in range(count.max()):
+        active = count > k
+        e = numpy.where(active, start + k, 0)
+
+        def col(name):
+            return numpy.where(active, seq[name][e], 0)
+
+        # 1. plant base
+        base = active & seq["base"][e]
+        if base.any():
+            pos[base] = numpy.column_stack((col("x"), col("y"), col("z")))[base]
+            head[base] = (0, 0, 1)
+            up[base] = (-1, 0, 0)
+            up = _rotate(up, head, col("plant_azimuth") * rad, base)
+            for name in registers:
+                _store(name, base, (pos, head, up))
+        # 2. axis changes
+        change = active & seq["axis_change"][e]
+        branch = change & seq["branch"][e]
+        prev_ms = seq["prev_ms"][e]
+        _copy("MS_top", "top", branch & prev_ms)
+        _copy("tiller_base", "top", branch & prev_ms)
+        _copy("top", "tiller_base", branch & ~prev_ms)
+        _copy("top", "MS_top", change & ~branch)
+        # 3. go to top
+        pos, head, up = [x.copy() for x in registers["top"]]
+        # 4. stem inclination and azimuth
+        stem = active & seq["stem"][e]
+        inclin = col("inclination") * rad
+        inclined = stem & (inclin != 0)
+        first = inclined & seq["first"][e]
+        tiller = first & ~prev_ms
+        up = _rotate(up, head, col("axis_azimuth") * rad, tiller)
+        _store("tiller_base", tiller, (pos, head, up))
+        left = numpy.cross(up, head)
+        head, up = (
+            _rotate(head, left, inclin, first),
+            _rotate(up, left, inclin, first),
+        )
+        other = inclined & ~first
+        if other.any():
+            up0 = up.copy()
+            zleft = numpy.cross(up, head)[:, 2]
+            # roll to vertical
+            vleft = numpy.cross(zaxis, head)
+            vert = other & (numpy.linalg.norm(vleft, axis=1) > 1e-10)
+            vleft = _normed(vleft)
+            up[vert] = numpy.cross(head, vleft)[vert]
+            angle = numpy.arctan2(
+                numpy.linalg.norm(numpy.cross(up0, up), axis=1),
+                numpy.sum(up0 * up, axis=1),
+            )
+            left = numpy.cross(up, head)
+            dzl = zleft - left[:, 2]
+            head, up = (
+                _rotate(head, left, inclin, other),
+                _rotate(up, left, inclin, other),
+            )
+            angle = numpy.where(dzl < 0, -angle, angle)
+            up = _rotate(up, head, -angle, other)
+        up = _rotate(up, head, col("azimuth") * rad, stem & (col("azimuth") != 0))
+        # 5. record frames
+        idx = e[active]
+        out_pos[idx] = pos[active]
+        out_head[idx] = head[active]
+        out_up[idx] = up[active]
+        # 6. move forward
+        length = numpy.where(stem, col("length"), 0)
+        leaf = active & seq["leaf"][e]
+        lrolled = col("lrolled")
+        length = numpy.where(leaf & (lrolled > 0), lrolled, length)
+        moved = (length > 0)[:, None]
+        pos = numpy.where(moved, pos + head * length[:, None], pos)
+        _store("top", stem | (leaf & (lrolled > 0)), (pos, head, up))
+
+    return seq["vid"], out_pos, out_head, out_up
+
+
+def visitor_frames(g):
+    """Compute the turtle frames used by AdelVisitor to position element meshes, without meshing
+
+    Returns:
+        vids, position, heading, up arrays (one row per element, in turtle traversal order)
+    """
+    frames = {}
+    visitor = AdelVisitor(None, 0.0, False, False, frames=frames)
+    _ = TurtleFrame(g, visitor=visitor, turtle=AdelTurtle(), gc=False, all_roots=True)
+    vids = numpy.array(list(frames), dtype=int)
+    position, heading, up = (
+        numpy.array([f[k] for f in frames.values()], dtype=float).reshape(-1, 3)
+        for k in range(3)
+    )
+    return vids, position, heading, up
+
+
+_worker = {}
+
+
+def _init_worker(leaves, min_length, classic):
+    _worker.update({"leaves": leaves, "min_length": min_length, "classic": classic})
+
+
+def _mesh_shard(tasks):
+    """mesh and place a list of (vid, element_data, position, heading, up, face_up, leaf_arrays) in a worker process
+
+    Returns:
+        a list of (vid, points, indices) (points and indices are None if the element has no mesh)
+    """
+    results = []
+    for vid, data, position, heading, up, face_up, leaf_arrays in tasks:
+        leaf_mesh = None
+        if leaf_arrays is not None:
+            leaf_mesh = fitting.plantgl_shape(*leaf_arrays)
+        mesh = mesh_element(
+            data,
+            _worker["leaves"],
+            _worker["min_length"],
+            _worker["classic"],
+            leaf_mesh=leaf_mesh,
+        )
+        if mesh:
+            pts, ind = geometry_arrays(
+                frame_transform(mesh, position, heading, up, face_up=face_up)
+            )
+            results.append((vid, pts, ind))
+        else:
+            results.append((vid, None, None))
+    return results
+
+
+def parallel_meshes(tasks, plants, leaves, min_length=0.01, classic=False, workers=2):
+    """Mesh and place elements in a pool of worker processes, plants being distributed over workers
+
+    Args:
+        tasks: a list of (vid, element_data, position, heading, up, face_up,
+         leaf_arrays), leaf_arrays being the (points, indices) of a leaf mesh
+         computed beforehand (see batch_leaf_meshes), or None
+        plants: the plant index of each task
+        leaves: a {species: Leaves} dict
+
+    Returns:
+        a {vid: mesh} dict, mesh being None for elements without geometry
+    """
+    plants = numpy.asarray(plants)
+    shards = [[] for _ in range(workers)]
+    for task, plant in zip(tasks, plants.tolist()):
+        shards[plant % workers].append(task)
+    shards = [shard for shard in shards if shard]
+    meshes = {}
+    if not shards:
+        return meshes
+    with ProcessPoolExecutor(
+        max_workers=len(shards),
+        initializer=_init_worker,
+        initargs=(leaves, min_length, classic),
+    ) as pool:
+        for results in pool.map(_mesh_shard, shards):
+            for vid, pts, ind in results:
+                meshes[vid] = None if pts is None else fitting.plantgl_shape(pts, ind)
+    return meshes
+
+
+def _changed_plants(g, geometry_state, options, transforms):
+    """Plants whose turtle or mesh inputs changed since the last call
+
+    The inputs of each plant (its transform, and the properties read by
+    turtle_sequence and element_data for its elements) are recorded in
+    geometry_state.
+
+    Returns:
+        the list of changed plants and a {element vid: plant transform} dict
+        for their elements
+    """
+    scale = g.max_scale()
+    position = g.property("position")
+    azimuth = g.property("azimuth")
+    inclination = g.property("inclination")
+    edge_type = g.property("edge_type")
+    changed = []
+    element_transform = {}
+    for plant in g.vertices(scale=1):
+        transform = transforms.get(plant)
+        elements = g.components_at_scale(plant, scale)
+        inputs = []
+        for vid in elements:
+            metamer = g.complex(g.complex(vid))
+            axe = g.complex(metamer)
+            inputs.append(
+                (
+                    vid,
+                    edge_type.get(metamer),
+                    azimuth.get(axe),
+                    azimuth.get(vid),
+                    inclination.get(vid),
+                    tuple(element_data(g, vid).items()),
+                )
+            )
+        pos = position.get(plant)
+        state = (
+            (0.0, 0.0, 0.0) if pos is None else tuple(map(float, pos)),
+            float(azimuth.get(plant) or 0),
+            transform,
+            options,
+            tuple(inputs),
+        )
+        if geometry_state.get(plant) == state:
+            continue
+        geometry_state[plant] = state
+        changed.append(plant)
+        element_transform.update((vid, transform) for vid in elements)
+    return changed, element_transform
+
+
+def _interpret(
+    g,
+    leaves,
+    min_length=0.01,
+    classic=False,
+    face_up=False,
+    leaf_meshes=None,
+    incremental=False,
+    workers=1,
+    transforms=None,
+    engine="numpy",
+):
+    for name in ("geometry", "anchor_point", "geometry_state"):
+        if name not in g.property_names():
+            g.add_property(name)
+    geometry = g.property("geometry")
+    anchor_point = g.property("anchor_point")
+    geometry_state = g.property("geometry_state")
+    labels = g.property("label")
+    lengths = g.property("length")
+    plants = None
+    if incremental:
+        # unchanged plants keep their frames: the turtle only visits the others
+        plants, element_transform = _changed_plants(
+            g, geometry_state, (min_length, classic, face_up), transforms or {}
+        )
+    if engine == "visitor":
+        vids, position, heading, up = visitor_frames(g)
+        rank = {vid: i for i, vid in enumerate(g.vertices(scale=1))}
+        plant = numpy.array(
+            [rank[g.complex_at_scale(vid, 1)] for vid in vids.tolist()], dtype=int
+        )
+    else:
+        sequence = turtle_sequence(g, plants)
+        vids, position, heading, up = turtle_frames(g, sequence)
+        plant = sequence["plant"]
+    updated = []
+    tasks = []
+    for i, vid in enumerate(vids.tolist()):
+        label = labels.get(vid, "")
+        if not (label.startswith("Leaf") or label.startswith("Stem")):
+            continue
+        data = element_data(g, vid)
+        if incremental:
+            state = (
+                tuple(position[i].tolist() + heading[i].tolist() + up[i].tolist()),
+                tuple(data.items()),
+                min_length,
+                classic,
+                face_up,
+                element_transform.get(vid),
+            )
+            if geometry_state.get(vid) == state:
+                continue
+            geometry_state[vid] = state
+        updated.append(vid)
+        if lengths.get(vid) > 0:
+            tasks.append((i, vid, data))
+        elif vid in geometry:
+            geometry.pop(vid)
+
+    if workers > 1:
+        leaf_arrays = {}
+        if leaf_meshes is not None:
+            leaf_arrays = {
+                vid: geometry_arrays(mesh)
+                for vid, mesh in leaf_meshes.items()
+                if mesh is not None
+            }
+        meshes = parallel_meshes(
+            [
+                (
+                    vid,
+                    data,
+                    position[i],
+                    heading[i],
+                    up[i],
+                    face_up and data["label"].startswith("Leaf"),
+                    leaf_arrays.get(vid),
+                )
+                for i, vid, data in tasks
+            ],
+            plant[[i for i, _, _ in tasks]],
+            leaves,
+            min_length,
+            classic,
+            workers,
+        )
+    for i, vid, data in tasks:
+        if workers > 1:
+            mesh = meshes[vid]
+        else:
+            leaf_mesh = None
+            if leaf_meshes is not None:
+                leaf_mesh = leaf_meshes.get(vid)
+            mesh = mesh_element(data, leaves, min_length, classic, leaf_mesh=leaf_mesh)
+            if mesh:
+                mesh = frame_transform(
+                    mesh,
+                    position[i],
+                    heading[i],
+                    up[i],
+                    face_up=face_up and data["label"].startswith("Leaf"),
+                )
+        if mesh:
+            geometry[vid] = mesh
+            anchor_point[vid] = pgl.Vector3(*map(float, position[i]))
+        elif vid in geometry:
+            geometry.pop(vid)
+    return updated
+
+
+def numpy_interpreter(
+    g, leaves, min_length=0.01, classic=False, face_up=False, leaf_meshes=None, workers=1
+):
+    """Same as mtg_interpreter with AdelVisitor, but with frames computed by turtle_frames.
+    If workers > 1, elements are meshed in a pool of worker processes"""
+    _interpret(g, leaves, min_length, classic, face_up, leaf_meshes, workers=workers)
+    return g
+
+
+def parallel_interpreter(
+    g, leaves, min_length=0.01, classic=False, face_up=False, leaf_meshes=None, workers=2
+):
+    """Same as mtg_interpreter with AdelVisitor, elements being meshed in a pool of
+    worker processes (frames are computed by AdelVisitor in the calling process)"""
+    _interpret(
+        g, leaves, min_length, classic, face_up, leaf_meshes, workers=workers, engine="visitor"
+    )
+    return g
+
+
+def update_interpreter(
+    g, leaves, min_length=0.01, classic=False, face_up=False, transforms=None
+):
+    """Incremental version of numpy_interpreter.
+
+    The inputs of each plant, and the mesh inputs and the frame of each
+    element are recorded in the 'geometry_state' property: frames are only
+    computed for plants whose inputs changed since the last call, and only
+    elements whose state changed (growing organs and elements downstream of
+    them) are meshed again.
+    transforms is an optional {plant vid: transform} dict of the (hashable)
+    transforms applied to plants after interpretation: all the elements of a
+    plant whose transform changed are updated.
+
+    Returns:
+        the list of vids whose geometry has been recomputed (or removed)
+    """
+    return _interpret(
+        g, leaves, min_length, classic, face_up, incremental=True, transforms=transforms
+    )
+
+
+def mtg_interpreter(
+    g,
+    leaves,
+    min_length=0.01,
+    classic=False,
+    face_up=False,
+    batch=False,
+    engine="visitor",
+    incremental=False,
+    workers=1,
+):
+    """Compute/update the geometry on each node of the MTG using Turtle geometry.
+
+    If batch is True, leaf elements are meshed beforehand with Leaves.mesh_batch
+    and the turtle only positions the meshes.
+    engine is either 'visitor' (PlantGL turtle driven by AdelVisitor) or 'numpy'
+    (frames of all plants computed at once by turtle_frames).
+    If incremental is True, the numpy engine is used and only elements whose
+    geometry inputs changed since the last incremental call are updated (see
+    update_interpreter).
+    If workers > 1, plants are meshed in a pool of workers processes (frames
+    are computed in the calling process by engine, so that the result is the
+    same as in serial mode)."""
     # BUG : sub_mtg mange le vertex plant => on perd la plante !
     # plants = g.component_roots_at_scale(g.root, scale=1)
     # nplants = g.nb_vertices(scale=1)
@@ -298,17 +1037,51 @@ def mtg_interpreter(g, leaves, min_length=0.01, classic=False, face_up=False):
 
     # for plant in plants:
     #   gplant = g.sub_mtg(plant)
+    if incremental:
+        g = unpack_geometry(g)
+        update_interpreter(g, leaves, min_length, classic, face_up)
+        return g
+    if "canopy_mesh" in g.property_names():
+        # all geometries are recomputed, packed ones are obsolete
+        g.remove_property("canopy_mesh")
+    if "geometry_state" in g.property_names():
+        # states of elements no longer match their geometry
+        g.remove_property("geometry_state")
+    leaf_meshes = None
+    if batch:
+        leaf_meshes = batch_leaf_meshes(g, leaves, min_length)
+    if engine == "numpy":
+        return numpy_interpreter(
+            g, leaves, min_length, classic, face_up, leaf_meshes=leaf_meshes, workers=workers
+        )
+    if workers > 1:
+        return parallel_interpreter(
+            g, leaves, min_length, classic, face_up, leaf_meshes=leaf_meshes, workers=workers
+        )
     turtle = AdelTurtle()
-    visitor = AdelVisitor(leaves, min_length, classic, face_up)
+    visitor = AdelVisitor(leaves, min_length, classic, face_up, leaf_meshes)
     _ = TurtleFrame(g, visitor=visitor, turtle=turtle, gc=False, all_roots=True)
     #   gt = union(gplant,gt)
 
     return g
 
 
-def plot3d(g, leaf_material=None, stem_material=None, soil_material=None, colors=None):
+def plot3d(
+    g,
+    leaf_material=None,
+    stem_material=None,
+    soil_material=None,
+    colors=None,
+    merge=False,
+):
     """
     Returns a plantgl scene from an mtg.
+
+    If merge is True, the meshes of all the elements sharing a material (or a
+    color) are concatenated in a single shape, and (scene, table) is returned.
+    table is a pandas DataFrame giving, for each element vid, the id of its
+    shape and its [start, stop) range of triangles in the shape (see
+    triangle_vids).
     """
 
     Material = pgl.Material
@@ -325,11 +1098,73 @@ def plot3d(g, leaf_material=None, stem_material=None, soil_material=None, colors
             soil_material = Material(Color3(170, 85, 0))
         # colors = g.property('color')
 
-    geometries = g.property("geometry")
     greeness = g.property("is_green")
     labels = g.property("label")
     scene = Scene()
 
+    if merge:
+        materials = {
+            "leaf": leaf_material,
+            "stem": stem_material,
+            "soil": soil_material,
+            None: None,
+        }
+
+        def material_key(vid):
+            label = labels.get(vid)
+            is_green = greeness.get(vid)
+            if colors:
+                return tuple(colors.get(vid, [0, 0, 0]))
+            elif not greeness:
+                return None
+            elif label.startswith("Stem") and is_green:
+                return "stem"
+            elif label.startswith("Leaf") and is_green:
+                return "leaf"
+            elif not is_green:
+                return "soil"
+            return None
+
+        groups = {}
+        for vid, (pts, ind) in arrays_items(g):
+            if len(ind) < 1:
+                continue
+            groups.setdefault(material_key(vid), []).append((vid, pts, ind))
+
+        table = []
+        for shape_id, (key, elements) in enumerate(groups.items()):
+            vids = [vid for vid, _, _ in elements]
+            npts = numpy.cumsum([0] + [len(pts) for _, pts, _ in elements])
+            ntri = numpy.cumsum([0] + [len(ind) for _, _, ind in elements])
+            points = numpy.concatenate([pts for _, pts, _ in elements])
+            indices = numpy.concatenate(
+                [ind + npts[i] for i, (_, _, ind) in enumerate(elements)]
+            )
+            mesh = fitting.plantgl_shape(points, indices)
+            if colors:
+                shape = Shape(mesh, Material(Color3(*key)))
+            elif materials.get(key) is None:
+                shape = Shape(mesh)
+            else:
+                shape = Shape(mesh, materials[key])
+            shape.id = shape_id
+            scene.add(shape)
+            table.append(
+                pandas.DataFrame(
+                    {
+                        "shape_id": shape_id,
+                        "vid": vids,
+                        "start": ntri[:-1],
+                        "stop": ntri[1:],
+                    }
+                )
+            )
+        if table:
+            table = pandas.concat(table, ignore_index=True)
+        else:
+            table = pandas.DataFrame(columns=["shape_id", "vid", "start", "stop"])
+        return scene, table
+
     def geom2shape(vid, mesh, scene, colors):
         shape = None
         if isinstance(mesh, list):
@@ -357,12 +1192,32 @@ def plot3d(g, leaf_material=None, stem_material=None, soil_material=None, colors
         shape.id = vid
         scene.add(shape)
 
-    for vid, mesh in geometries.items():
+    for vid, mesh in geometry_items(g):
         geom2shape(vid, mesh, scene, colors)
     return scene
 
 
-def transform_geom(geom, translation, rotation):
+def triangle_vids(table, shape_id):
+    """return the vid of each triangle of a merged shape (see plot3d(merge=True))"""
+    rows = table[table["shape_id"] == shape_id]
+    return numpy.repeat(
+        rows["vid"].values.astype(int), (rows["stop"] - rows["start"]).values.astype(int)
+    )
+
+
+def transform_geom(geom, translation, rotation, bake=False):
+    """Position geom: rotation (radians) around z, then translation
+
+    If bake is True, the transform is applied to the vertices of a flat
+    TriangleSet instead of wrapping geom in Translated / AxisRotated nodes.
+    """
+    if bake:
+        pts, ind = geometry_arrays(geom)
+        mat = plant_transform(translation, rotation)
+        mesh = fitting.plantgl_shape(numpy.dot(pts, mat[:3, :3].T) + mat[:3, 3], ind)
+        if isinstance(geom, pgl.Shape):
+            return pgl.Shape(mesh)
+        return mesh
     # force cast to float (pgl does not accept values extracted from numpy arryas
     translation = list(map(float, translation))
     if isinstance(geom, pgl.Geometry):
@@ -374,3 +1229,36 @@ def transform_geom(geom, translation, rotation):
             )
         )
     return geom
+
+
+def transform_plant_geometry(geometry, vids, translation, rotation, bake=False):
+    """Position the geometries of the elements vids of a plant (see transform_geom)
+
+    Args:
+        geometry: a {vid: geometry} dict, updated in place
+        vids: the vids of the elements to transform (vids without geometry are skipped)
+        bake: if True, the vertices of all the elements are transformed in one
+         batch and elements get flat TriangleSets
+
+    Returns:
+        geometry
+    """
+    vids = [vid for vid in vids if geometry.get(vid) is not None]
+    if not bake:
+        for vid in vids:
+            geometry[vid] = transform_geom(geometry[vid], translation, rotation)
+        return geometry
+    arrays = [geometry_arrays(geometry[vid]) for vid in vids]
+    if not arrays:
+        return geometry
+    mat = plant_transform(translation, rotation)
+    pts = numpy.concatenate([a[0] for a in arrays])
+    pts = numpy.dot(pts, mat[:3, :3].T) + mat[:3, 3]
+    offsets = numpy.cumsum([0] + [len(a[0]) for a in arrays])
+    for i, vid in enumerate(vids):
+        # elements without triangles still get their (transformed) points
+        mesh = fitting.plantgl_shape(pts[offsets[i] : offsets[i + 1]], arrays[i][1])
+        if isinstance(geometry[vid], pgl.Shape):
+            mesh = pgl.Shape(mesh)
+        geometry[vid] = mesh
+    return geometry
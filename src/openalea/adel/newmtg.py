@@ -15,6 +15,7 @@ A place to develop candidates methods for mtg.py / topological builder
 """
 
 from openalea.adel.exception import AdelDeprecationError
+from openalea.adel.adel_index import adel_index
 
 # temporary import
 from openalea.adel.mtg import convert, properties_from_dict
@@ -25,6 +26,7 @@ from openalea.mtg import MTG, fat_mtg
 from openalea.mtg.algo import union
 
 
+import copy
 import numpy
 import pandas
 
@@ -133,6 +135,225 @@ def sheath_elements(l, lvis, lsen, az, inc, d, split=False):
     return internode_elements(l, lvis, lsen, az, inc, d, split)
 
 
+_scalar_blade_areas = 16
+
+
+def _blade_areas(leaves, shape_key, Lshape, Lwshape, sr_base, sr_top, select):
+    """areas and widths of the blade elements selected, grouping them by shape key"""
+    area = numpy.zeros(len(select))
+    width = numpy.zeros(len(select))
+    if leaves is None:
+        return area, width
+    index = [i for i in numpy.flatnonzero(select).tolist() if shape_key[i] is not None]
+    if len(index) <= _scalar_blade_areas:
+        # numpy overhead is not worth it for a few elements
+        for i in index:
+            args = (Lshape[i], Lwshape[i], sr_base[i], sr_top[i])
+            area[i] = leaves.blade_elt_area(shape_key[i], *args)
+            width[i] = leaves.blade_elt_width(shape_key[i], *args)
+        return area, width
+    groups = {}
+    for i in index:
+        groups.setdefault(tuple(shape_key[i]), []).append(i)
+    for key, index in groups.items():
+        args = (Lshape[index], Lwshape[index], sr_base[index], sr_top[index])
+        area[index] = leaves.blade_elt_areas(key, *args)
+        width[index] = leaves.blade_elt_widths(key, *args)
+    return area, width
+
+
+def blade_elements_table(
+    sectors, l, lvis, lrolled, lsen, Lshape, Lwshape, shape_key, leaves
+):
+    """Vectorised partitioning of blades into hidden, green, senescent and rolled parts
+
+    Args:
+        sectors: (int or array) the number of sectors of the blades
+        l, lvis, lrolled, lsen, Lshape, Lwshape: arrays of blade dimensions
+         (see blade_elements). Blades with missing (None / NaN) l, lsen,
+         Lshape or Lwshape get empty sectors.
+        shape_key: the sequence of the shape keys of the blades
+        leaves: a Leaves instance (or None, for null areas)
+
+    Returns:
+        a (hidden, sectors) tuple of {name: array} dicts. hidden has one row
+        per blade (length, area), sectors one row per sector of the blades
+        with a visible length, with the blade index ('blade'), the sector
+        number ('sector', starting at 1) and the green ('_green') /
+        senescent ('_sen') values of the element parameters of blade_elements
+        (srb / srt are NaN when undefined)
+    """
+    l, lvis, lrolled, lsen, Lshape, Lwshape = [
+        numpy.array(x, dtype=float, ndmin=1)
+        for x in (l, lvis, lrolled, lsen, Lshape, Lwshape)
+    ]
+    nblades = len(lvis)
+    sectors = numpy.broadcast_to(numpy.asarray(sectors, dtype=int), (nblades,))
+    shape_key = list(shape_key)
+
+    lrolled = numpy.maximum(0, numpy.minimum(lrolled, lvis))
+    lrolled[lrolled < 1e-6] = 0
+    defined = ~numpy.isnan(l + lsen + Lshape + Lwshape)
+    lhide = numpy.maximum(l - lvis, 0.0)
+    s_hide_base = (Lshape - l) / Lshape
+    s_hide_top = (Lshape - lvis) / Lshape
+    with_hidden_area = ~numpy.isnan(l + Lshape + Lwshape) & (lhide > 0)
+    hidden_area, _ = _blade_areas(
+        leaves, shape_key, Lshape, Lwshape, s_hide_base, s_hide_top, with_hidden_area
+    )
+    lflat = lvis - numpy.minimum(lrolled, lvis)
+    lgreen = lvis - numpy.minimum(lsen, lvis)
+    lsen = lvis - lgreen
+    s_limvis = Lshape - lvis
+    s_limsen = Lshape - lsen
+    s_limrolled = Lshape - lflat
+    ds = Lshape / sectors
+
+    # one row per sector
+    nsect = numpy.where(lvis > 1e-6, sectors, 0)
+    blade = numpy.repeat(numpy.arange(nblades), nsect)
+    offsets = numpy.cumsum(nsect) - nsect
+    isect = numpy.arange(len(blade)) - numpy.repeat(offsets, nsect)
+    ds, lvis, Lshape, Lwshape, s_limvis, s_limsen, s_limrolled = [
+        x[blade] for x in (ds, lvis, Lshape, Lwshape, s_limvis, s_limsen, s_limrolled)
+    ]
+    keys = [shape_key[b] for b in blade.tolist()]
+
+    st = (isect + 1) * ds
+    ls_vis = numpy.minimum(ds, numpy.maximum(0.0, st - s_limvis))
+    visible = defined[blade] & (ls_vis > 0)
+    ls_vis = numpy.where(visible, ls_vis, 0)
+    sb = st - ls_vis
+    st_green = numpy.minimum(st, numpy.maximum(sb, s_limsen))
+    ls_green = numpy.where(visible, st_green - sb, 0)
+    ls_sen = numpy.where(visible, st - st_green, 0)
+    area_green, width_green = _blade_areas(
+        leaves, keys, Lshape, Lwshape, sb / Lshape, st_green / Lshape, ls_green > 0
+    )
+    area_sen, width_sen = _blade_areas(
+        leaves, keys, Lshape, Lwshape, st_green / Lshape, st / Lshape, ls_sen > 0
+    )
+    area = area_green + area_sen
+    width = numpy.maximum(width_green, width_sen)
+
+    # position of flat parts of the elements
+    ls_flat = numpy.where(
+        visible, numpy.minimum(ls_vis, numpy.maximum(0.0, st - s_limrolled)), 0
+    )
+    flat = ls_flat > 0
+    sb = st - ls_flat
+    st_green = numpy.minimum(st, numpy.maximum(sb, s_limsen))
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        srb_green = numpy.where(flat, (sb - s_limvis) / lvis, numpy.nan)
+        srt_green = numpy.where(flat, (st_green - s_limvis) / lvis, numpy.nan)
+        srb_sen = srt_green
+        srt_sen = numpy.where(flat, (st - s_limvis) / lvis, numpy.nan)
+        rolled = visible & (ls_flat < ls_vis)
+        ls_rolled = numpy.where(rolled, ls_vis - ls_flat, 0)
+        ls_rolled_green = numpy.minimum(ls_rolled, ls_green)
+        ls_rolled_sen = ls_rolled - ls_rolled_green
+        s_rolled = area * ls_rolled / ls_vis
+        d_rolled = numpy.where(rolled, s_rolled / numpy.pi / ls_rolled, 0)
+
+    hidden = {
+        "length": numpy.where(numpy.isnan(l), numpy.nan, lhide),
+        "area": hidden_area,
+    }
+    sectors = {
+        "blade": blade,
+        "sector": isect + 1,
+        "length_green": ls_green,
+        "length_sen": ls_sen,
+        "area_green": area_green,
+        "area_sen": area_sen,
+        "area": area,
+        "width_green": width_green,
+        "width_sen": width_sen,
+        "width": width,
+        "srb_green": srb_green,
+        "srt_green": srt_green,
+        "srb_sen": srb_sen,
+        "srt_sen": srt_sen,
+        "lrolled": ls_rolled,
+        "lrolled_green": ls_rolled_green,
+        "lrolled_sen": ls_rolled_sen,
+        "d_rolled": d_rolled,
+    }
+    return hidden, sectors
+
+
+def _none(x):
+    return None if x != x else x
+
+
+def blade_elements_lists(hidden, sectors, split=False):
+    """Convert the tables returned by blade_elements_table to lists of blade element dicts (see blade_elements), one list per blade"""
+    elements = [
+        [
+            {
+                "label": "HiddenElement",
+                "length": _none(length),
+                "area": area,
+                "is_green": True,
+            }
+        ]
+        for length, area in zip(hidden["length"].tolist(), hidden["area"].tolist())
+    ]
+    table = {k: v.tolist() for k, v in sectors.items()}
+    for i, (blade, isect) in enumerate(zip(table["blade"], table["sector"])):
+        ls_green, ls_sen = table["length_green"][i], table["length_sen"][i]
+        srb_green = _none(table["srb_green"][i])
+        srt_green = _none(table["srt_green"][i])
+        srb_sen, srt_sen = _none(table["srb_sen"][i]), _none(table["srt_sen"][i])
+        d_rolled = table["d_rolled"][i]
+        if split:
+            elements[blade].append(
+                {
+                    "label": "LeafElement" + str(isect) + "g",
+                    "length": ls_green,
+                    "area": table["area_green"][i],
+                    "is_green": True,
+                    "srb": srb_green,
+                    "srt": srt_green,
+                    "lrolled": table["lrolled_green"][i],
+                    "d_rolled": d_rolled,
+                    "width": table["width_green"][i],
+                }
+            )
+            elements[blade].append(
+                {
+                    "label": "LeafElement" + str(isect) + "s",
+                    "length": ls_sen,
+                    "area": table["area_sen"][i],
+                    "is_green": False,
+                    "srb": srb_sen,
+                    "srt": srt_sen,
+                    "lrolled": table["lrolled_sen"][i],
+                    "d_rolled": d_rolled,
+                    "width": table["width_sen"][i],
+                }
+            )
+        else:
+            elements[blade].append(
+                {
+                    "label": "LeafElement" + str(isect),
+                    "length": ls_sen + ls_green,
+                    "area": table["area"][i],
+                    "green_length": ls_green,
+                    "green_area": table["area_green"][i],
+                    "senesced_length": ls_sen,
+                    "senesced_area": table["area_sen"][i],
+                    "is_green": (ls_green > ls_sen),
+                    "srb": srb_green,
+                    "srt": srt_sen,
+                    "lrolled": table["lrolled"][i],
+                    "d_rolled": d_rolled,
+                    "width": table["width"][i],
+                }
+            )
+    return elements
+
+
 def blade_elements(
     sectors, l, lvis, lrolled, lsen, Lshape, Lwshape, shape_key, leaves, split=False
 ):
@@ -143,181 +364,12 @@ def blade_elements(
     lrolled is the visible rolled length of the blade
     lsen is the senescent apical length
     Lshape is length of the blade used as a pattern shape
+    (see blade_elements_table for the computation of several blades at once)
     """
-    lrolled = max(0, min(lrolled, lvis))
-    if lrolled < 1e-6:
-        lrolled = 0
-    lhide = None
-    lgreen = None
-    lflat = None
-    # s (on mature shape) at which leaf becomes flat and visible
-    s_limvis = Lshape
-    # s (on mature shape) at which leaf becomes senescent
-    s_limsen = Lshape
-    # s(on mature shape) at which leaf becomes rolled
-    s_limrolled = Lshape
-    # compute partitioning of visible length
-    S_hide = 0
-    try:
-        lhide = max(l - lvis, 0.0)
-        if lhide > 0:
-            S_hide = leaves.blade_elt_area(
-                shape_key,
-                Lshape,
-                Lwshape,
-                (Lshape - l) / Lshape,
-                (Lshape - lvis) / Lshape,
-            )
-        lflat = lvis - min(lrolled, lvis)
-        lrolled = lvis - lflat
-        lgreen = lvis - min(lsen, lvis)
-        lsen = lvis - lgreen
-        s_limvis = Lshape - lvis
-        s_limsen = Lshape - lsen
-        s_limrolled = Lshape - lflat
-        # print(lgreen,lsen,s_limvis,s_limsen)
-    except TypeError:
-        pass
-
-    # hidden part + rolled : area are set to zero as leaf rolled area is already counted in leaf element
-    # hidden_elt = {'label': 'StemElement', 'offset': lhide, 'length': lrolled, 'area': 0, 'green_length': lrolled, 'green_area': 0, 'senesced_length' : 0, 'senesced_area':0,'is_green': True, 'azimuth': 0, 'inclination':0}
-    hidden_elt = {
-        "label": "HiddenElement",
-        "length": lhide,
-        "area": S_hide,
-        "is_green": True,
-    }
-    elements = [hidden_elt]
-    ds = 0
-    if Lshape is not None:
-        ds = float(Lshape) / sectors
-    # compute sectors from leafshape bes to leaf shape top
-    if lvis > 1e-6:
-        for isect in range(sectors):
-            ls_vis = 0
-            ls_rolled = 0
-            ls_rolled_green = 0
-            ls_rolled_sen = 0
-            d_rolled = 0
-            ls_green = 0
-            ls_sen = 0
-            S_green = 0
-            S_sen = 0
-            S_tot = 0
-            w_green = 0
-            w_sen = 0
-            w_tot = 0
-            srb_green = None
-            srt_green = None
-            srb_sen = None
-            srt_sen = None
-
-            try:
-                st = (isect + 1) * ds
-                ls_vis = min(ds, max(0.0, st - s_limvis))
-                if ls_vis > 0:
-                    sb = st - ls_vis
-                    sb_green = sb
-                    st_green = min(st, max(sb_green, s_limsen))
-                    sb_sen = st_green
-                    st_sen = st
-                    ls_green = st_green - sb_green
-                    ls_sen = st_sen - sb_sen
-                    # print(sb_green,st_green,st_sen)
-                    #
-                    # Compute area of elements
-                    if ls_green > 0 and leaves is not None:
-                        S_green = leaves.blade_elt_area(
-                            shape_key,
-                            Lshape,
-                            Lwshape,
-                            sb_green / Lshape,
-                            st_green / Lshape,
-                        )
-                        w_green = leaves.blade_elt_width(
-                            shape_key,
-                            Lshape,
-                            Lwshape,
-                            sb_green / Lshape,
-                            st_green / Lshape,
-                        )
-                    if ls_sen > 0 and leaves is not None:
-                        S_sen = leaves.blade_elt_area(
-                            shape_key, Lshape, Lwshape, sb_sen / Lshape, st_sen / Lshape
-                        )
-                        w_sen = leaves.blade_elt_width(
-                            shape_key, Lshape, Lwshape, sb_sen / Lshape, st_sen / Lshape
-                        )
-                    # made intergration again for avoiding fluctuations
-                    # S_tot = blade_elt_area(xysr_shape, Lshape, Lwshape, sb / Lshape, st / Lshape)
-                    S_tot = S_green + S_sen
-                    w_tot = max(w_green, w_sen)
-                    #
-                    # compute position of flat parts of the element
-                    ls_flat = min(ls_vis, max(0.0, st - s_limrolled))
-                    if ls_flat > 0:
-                        sb = st - ls_flat
-                        sb_green = sb
-                        st_green = min(st, max(sb_green, s_limsen))
-                        sb_sen = st_green
-                        st_sen = st
-                        srb_green = (float(sb_green) - s_limvis) / lvis
-                        srt_green = (float(st_green) - s_limvis) / lvis
-                        srb_sen = (float(sb_sen) - s_limvis) / lvis
-                        srt_sen = (float(st_sen) - s_limvis) / lvis
-                    # print(srb_green,srt_green,srb_sen,srt_sen)
-                    if ls_flat < ls_vis:
-                        ls_rolled = ls_vis - ls_flat
-                        ls_rolled_green = min(ls_rolled, ls_green)
-                        ls_rolled_sen = ls_rolled - ls_rolled_green
-                        S_rolled = S_tot * ls_rolled / ls_vis
-                        d_rolled = float(S_rolled) / numpy.pi / ls_rolled
-
-            except TypeError:  # input is None
-                #    print "passing"
-                pass
-            green_elt = {
-                "label": "LeafElement" + str(isect + 1) + "g",
-                "length": ls_green,
-                "area": S_green,
-                "is_green": True,
-                "srb": srb_green,
-                "srt": srt_green,
-                "lrolled": ls_rolled_green,
-                "d_rolled": d_rolled,
-                "width": w_green,
-            }
-            sen_elt = {
-                "label": "LeafElement" + str(isect + 1) + "s",
-                "length": ls_sen,
-                "area": S_sen,
-                "is_green": False,
-                "srb": srb_sen,
-                "srt": srt_sen,
-                "lrolled": ls_rolled_sen,
-                "d_rolled": d_rolled,
-                "width": w_sen,
-            }
-            elt = {
-                "label": "LeafElement" + str(isect + 1),
-                "length": ls_sen + ls_green,
-                "area": S_tot,
-                "green_length": ls_green,
-                "green_area": S_green,
-                "senesced_length": ls_sen,
-                "senesced_area": S_sen,
-                "is_green": (ls_green > ls_sen),
-                "srb": srb_green,
-                "srt": srt_sen,
-                "lrolled": ls_rolled,
-                "d_rolled": d_rolled,
-                "width": w_tot,
-            }
-            if split:
-                elements.extend([green_elt, sen_elt])
-            else:
-                elements.extend([elt])
-    return elements
+    hidden, table = blade_elements_table(
+        sectors, l, lvis, lrolled, lsen, Lshape, Lwshape, [shape_key], leaves
+    )
+    return blade_elements_lists(hidden, table, split)[0]
 
 
 def adel_metamer(
@@ -344,6 +396,7 @@ def adel_metamer(
     elongation=None,
     ntop=None,
     leaves=None,
+    blade_elts=None,
     **kwargs,
 ):
     """Contructs metamer elements for adel from parameters describing a static state.
@@ -368,6 +421,7 @@ def adel_metamer(
     * Esen: senescent length of the internode (hidden + visible)
     * Ed: diameter of the internode
     * Einc : relative inclination of the internode
+    * blade_elts : precomputed blade elements (see blade_elements_table), computed from above parameters if None
 
     """
     # to do add diameter and Lrolled to blade
@@ -432,7 +486,9 @@ def adel_metamer(
                 "species": species,
                 "shape_key": shape_key,
                 "inclination": Linc,
-                "elements": blade_elements(
+                "elements": blade_elts
+                if blade_elts is not None
+                else blade_elements(
                     Lsect,
                     Ll,
                     Lv,
@@ -504,6 +560,255 @@ def get_component(components, index):
     return properties, elements
 
 
+def _shape_key(args, leaves, dynamic=False):
+    """the leaf shape key of a row of a canopy table (None if undefined)"""
+    if leaves is None or "LcType" not in args or "LcIndex" not in args:
+        return None
+    lctype = int(args["LcType"])
+    lcindex = int(args["LcIndex"])
+    if lctype == -999 or lcindex == -999:
+        return None
+    age = None
+    if dynamic:
+        age = (
+            float(args["rph"]) - 0.3
+        )  # age_db = HS - rank + 1 = ph - 1.3 - rank +1 = rph - .3
+        if age != "NA":
+            age = max(0, int(float(age)))
+    return leaves.get_leaf_key(lctype, lcindex, age)
+
+
+_blade_columns = ("Ll", "Lv", "Lr", "Lsen", "L_shape", "Lw_shape")
+
+
+def _canopy_blade_elements(
+    columns, shape_keys, species, leaves, sectors, split=False, rows=None
+):
+    """blade elements of the rows (default to all rows) of a canopy table (see
+    blade_elements_table), or None for each row if blade columns are missing
+    (or if the row is not in rows)"""
+    nrow = len(shape_keys)
+    elements = [None] * nrow
+    if not all(k in columns for k in _blade_columns):
+        return elements
+    if rows is None:
+        rows = range(nrow)
+    rows = numpy.asarray(rows, dtype=int)
+    species = numpy.asarray(species, dtype=object)
+    dims = [_numeric(columns[k]) for k in _blade_columns]
+    for sp in set(species[rows].tolist()):
+        index = rows[species[rows] == sp]
+        hidden, table = blade_elements_table(
+            sectors,
+            *[x[index] for x in dims],
+            [shape_keys[i] for i in index.tolist()],
+            leaves[sp],
+        )
+        for i, elts in zip(index.tolist(), blade_elements_lists(hidden, table, split)):
+            elements[i] = elts
+    return elements
+
+
+_aborting_tiller_dimensions = (
+    "Ll",
+    "Lv",
+    "Lr",
+    "Lsen",
+    "L_shape",
+    "Lw_shape",
+    "Gl",
+    "Gv",
+    "Gsen",
+    "Gd",
+    "El",
+    "Ev",
+    "Esen",
+    "Ed",
+)
+
+
+def canopy_columns(parameters, topology=("plant", "axe_id", "numphy")):
+    """return a {name: numpy array} dict of the columns of a canopy table
+
+    parameters may be a dict of lists / arrays, a pandas DataFrame or a numpy
+    structured array (eg a RunAdel output). Text columns holding numbers are
+    converted to numeric columns, their missing values (None, NaN or 'NA')
+    being set to 'NA'. Topology columns are left untouched.
+    """
+    if isinstance(parameters, pandas.DataFrame):
+        columns = {k: parameters[k].to_numpy() for k in parameters.columns}
+    elif isinstance(parameters, numpy.ndarray) and parameters.dtype.names:
+        columns = {k: parameters[k] for k in parameters.dtype.names}
+    else:
+        columns = {k: numpy.asarray(v) for k, v in parameters.items()}
+    for k, col in columns.items():
+        if k in topology or col.dtype.kind not in "OSU":
+            continue
+        if col.dtype.kind == "S":
+            col = col.astype(str)
+        values = pandas.Series(col, dtype=object)
+        na = (values.isnull() | (values == "NA")).values
+        num = pandas.to_numeric(values.where(~na), errors="coerce").values
+        if numpy.isnan(num[~na].astype(float)).any():
+            # a text column
+            continue
+        col = num.astype(object)
+        col[na] = "NA"
+        columns[k] = col
+    return columns
+
+
+def _numeric(col):
+    """float version of a column, 'NA' being converted to NaN"""
+    return pandas.to_numeric(pandas.Series(col, dtype=object), errors="coerce").values
+
+
+def reduce_aborting_tillers(columns, reduction=1.0):
+    """Scale the organ dimensions of the rows of tillers that will abort (HS_final < nff)
+
+    Args:
+        columns: a {name: numpy array} dict (see canopy_columns), updated in place
+        reduction: the scaling factor
+
+    Returns:
+        columns
+    """
+    if "HS_final" not in columns:
+        return columns
+    aborting = _numeric(columns["HS_final"]) < _numeric(columns["nff"])
+    if not aborting.any():
+        return columns
+    for what in _aborting_tiller_dimensions:
+        col = columns[what]
+        col = col.astype(float) if col.dtype.kind in "biu" else col.copy()
+        col[aborting] = col[aborting] * reduction
+        columns[what] = col
+    return columns
+
+
+class MTGRecorder(object):
+    """Record the construction of a MTG (add_component / add_child calls) for a bulk build
+
+    Vertex ids are allocated as MTG does (max id + 1). Topology (parent,
+    children, complex, components, scale) and properties are stored in dicts
+    laid out as the internal dicts of openalea.mtg.MTG (that has no public
+    bulk setter), so that to_mtg returns the MTG built by the same sequence of
+    calls. No fat_mtg pass is run: all the edges between complexes are
+    expected to be explicit, as they are in mtg_factory (fat_mtg only adds
+    the edges of complexes whose first component has a parent).
+    """
+
+    def __init__(self):
+        self.root = 0
+        self._id = 0
+        self._parent = {0: None}
+        self._children = {}
+        self._complex = {}
+        self._components = {}
+        self._scale = {0: 0}
+        self._properties = {"edge_type": {}, "label": {}}
+
+    def _new_vertex(self, vid=None):
+        if vid is None:
+            self._id += 1
+            return self._id
+        self._id = max(self._id, vid)
+        return vid
+
+    def _set_properties(self, vid, properties):
+        props = self._properties
+        for name, value in properties.items():
+            if name in props:
+                props[name][vid] = value
+            else:
+                props[name] = {vid: value}
+
+    def add_component(self, complex_id, component_id=None, **properties):
+        vid = self._new_vertex(component_id)
+        self._complex[vid] = complex_id
+        self._components.setdefault(complex_id, []).append(vid)
+        self._scale[vid] = self._scale[complex_id] + 1
+        self._parent.setdefault(vid, None)
+        self._set_properties(vid, properties)
+        return vid
+
+    def add_child(self, parent, child=None, **properties):
+        if child is None:
+            child = self._new_vertex()
+            self._scale[child] = self._scale[parent]
+            complex_id = self._complex.get(parent)
+            if complex_id is not None:
+                self._complex[child] = complex_id
+                self._components[complex_id].append(child)
+        self._parent[child] = parent
+        self._children.setdefault(parent, []).append(child)
+        self._set_properties(child, properties)
+        return child
+
+    def to_mtg(self):
+        """return the recorded MTG, filling MTG internal dicts in bulk (this
+        relies on the private layout of openalea.mtg.MTG)"""
+        g = MTG()
+        g._id = self._id
+        g._parent.update(self._parent)
+        g._children.update(self._children)
+        g._complex.update(self._complex)
+        g._components.update(self._components)
+        g._scale.update(self._scale)
+        g._properties.update(self._properties)
+        return g
+
+
+def _copy_value(value):
+    """shallow copy of mutable property values (containers and arrays)"""
+    if isinstance(value, (dict, list, set, numpy.ndarray)):
+        return copy.copy(value)
+    return value
+
+
+class _CallLog(object):
+    """Forward add_component / add_child calls to g, logging them for a replay with new vids"""
+
+    def __init__(self, g):
+        self.g = g
+        self.calls = []
+
+    def add_component(self, complex_id, component_id=None, **properties):
+        vid = self.g.add_component(complex_id, component_id, **properties)
+        self.calls.append((True, complex_id, vid, False, properties))
+        return vid
+
+    def add_child(self, parent, child=None, **properties):
+        vid = self.g.add_child(parent, child=child, **properties)
+        self.calls.append((False, parent, vid, child is not None, properties))
+        return vid
+
+    def replay(self, g, vid_map):
+        """Repeat the logged calls on g
+
+        Args:
+            g: the mtg (or MTGRecorder) to add vertices to
+            vid_map: a {logged vid: vid in g} dict of the vertices referenced
+             by the logged calls but not created by them, updated with the
+             new vertices
+
+        Returns:
+            vid_map
+
+        Mutable property values (dicts, lists, sets, arrays) are shallow
+        copied, so that the vertices of g do not share them with the logged ones.
+        """
+        for component, ref, vid, existing, properties in self.calls:
+            properties = {k: _copy_value(v) for k, v in properties.items()}
+            if component:
+                vid_map[vid] = g.add_component(vid_map[ref], **properties)
+            elif existing:
+                g.add_child(vid_map[ref], child=vid_map[vid], **properties)
+            else:
+                vid_map[vid] = g.add_child(vid_map[ref], **properties)
+        return vid_map
+
+
 def mtg_factory(
     parameters,
     metamer_factory=adel_metamer,
@@ -516,10 +821,13 @@ def mtg_factory(
     split=False,
     aborting_tiller_reduction=1.0,
     leaf_db=None,
+    bulk=False,
+    clone_plants=False,
 ):
     """Construct an MTG from a dictionary of parameters.
 
     The dictionary contains the parameters of all metamers in the stand (topology + properties).
+    A pandas DataFrame or a numpy structured array with the same columns can also be used (see canopy_columns).
     metamer_factory is a function that build metamer properties and metamer elements from parameters dict.
     leaf_sectors is an integer giving the number of LeafElements per Leaf blade
     leaves is a {species:adel.geometric_elements.Leaves} dict
@@ -527,6 +835,8 @@ def mtg_factory(
     axis_dynamics is a 3 levels dict describing axis dynamic. 1st key level is plant number, 2nd key level is axis number, and third ky level are labels of values (n, tip, ssi, disp)
     topology is the list of key names used in parameters dict for plant number, axe number and metamer number
     aborting_tiller_reduction is a scaling factor applied to reduce all dimensions of organs of tillers that will abort
+    bulk is a boolean: if True, the MTG is recorded with a MTGRecorder and its internal dicts are filled in bulk (no fat_mtg pass)
+    clone_plants is a boolean: if True, plants whose rows are identical to those of a previous plant (all columns but the plant number) are cloned from it instead of being rebuilt (ignored if axis_dynamics is given)
 
     Axe number 0 is compulsory
 
@@ -543,7 +853,7 @@ def mtg_factory(
     else:
         dynamic_leaf_db = {k: leaves[k].dynamic for k in leaves}
 
-    g = MTG()
+    g = MTGRecorder() if bulk else MTG()
 
     # buffers
     # for detection of newplant/newaxe
@@ -563,17 +873,64 @@ def mtg_factory(
     nodes = []
     elts = []
 
-    dp = parameters
-    nrow = len(dp["plant"])
+    dp = canopy_columns(parameters, topology)
+    nrow = len(dp[topology[0]])
+    plants, num_metamers, mspositions = [
+        pandas.to_numeric(pandas.Series(dp[x])).astype(int).tolist()
+        for x in (topology[0], topology[2], "ms_insertion")
+    ]
+    axes = dp[topology[1]].tolist()
+    if metamer_factory:
+        if "ntop" not in dp:
+            dp["ntop"] = numpy.full(nrow, None, dtype=object)
+        if "Gd" not in dp:
+            dp["Gd"] = numpy.full(nrow, 0.19)
+        dp["split"] = numpy.full(nrow, split, dtype=object)
+        dp = reduce_aborting_tillers(dp, aborting_tiller_reduction)
+    names = [k for k in dp if k not in topology]
+    rows = list(zip(*[dp[k].tolist() for k in names]))
+    clone_plants = clone_plants and not axis_dynamics
+    # rows of the plants that are built (the others are cloned)
+    built = range(nrow)
+    if clone_plants:
+        signatures = {}
+        for i in range(nrow):
+            signatures.setdefault(plants[i], []).append(
+                (axes[i], num_metamers[i], mspositions[i]) + rows[i]
+            )
+        signatures = {k: tuple(v) for k, v in signatures.items()}
+        # {signature: (vid_plant, _CallLog)} of the plants built so far
+        templates = {}
+        first = {}
+        for plant, signature in signatures.items():
+            first.setdefault(signature, plant)
+        built = [i for i in range(nrow) if first[signatures[plants[i]]] == plants[i]]
+    if metamer_factory:
+        shape_keys, row_species = [None] * nrow, [None] * nrow
+        for i in built:
+            args = dict(zip(names, rows[i]))
+            if i == 0 or plants[i] != plants[i - 1]:
+                species = args.get("species", 0)
+            row_species[i] = species
+            shape_keys[i] = _shape_key(args, leaves[species], dynamic_leaf_db[species])
+        # blade elements are precomputed for the default factory only (user
+        # factories may not accept a blade_elts argument)
+        blade_elts = None
+        if metamer_factory is adel_metamer:
+            blade_elts = _canopy_blade_elements(
+                dp, shape_keys, row_species, leaves, leaf_sectors, split, rows=built
+            )
+    builder = g
+    cloned = False
 
     for i in range(nrow):
-        plant, num_metamer = [
-            int(convert(dp.get(x)[i], undef=None))
-            for x in [topology[e] for e in [0, 2]]
-        ]
-        axe = dp.get(topology[1])[i]
-        mspos = int(convert(dp.get("ms_insertion")[i], undef=None))
-        args = properties_from_dict(dp, i, exclude=topology)
+        plant, num_metamer, axe, mspos = (
+            plants[i],
+            num_metamers[i],
+            axes[i],
+            mspositions[i],
+        )
+        args = dict(zip(names, rows[i]))
         # Add plant if new
         if plant != prev_plant:
             label = "plant" + str(plant)
@@ -593,6 +950,15 @@ def mtg_factory(
                 refplant_id=args.get("refplant_id"),
                 species=species,
             )
+            if clone_plants:
+                template = templates.get(signatures[plant])
+                cloned = template is not None
+                if cloned:
+                    vid_template, log = template
+                    log.replay(g, {vid_template: vid_plant})
+                else:
+                    builder = _CallLog(g)
+                    templates[signatures[plant]] = (vid_plant, builder)
             # reset buffers
             prev_axe = -1
             vid_axe = -1
@@ -604,6 +970,10 @@ def mtg_factory(
             nodes = []
             elts = []
 
+        if cloned:
+            prev_plant = plant
+            continue
+
         # Add axis
         if axe != prev_axe:
             label = "".join(axe.split("."))
@@ -611,7 +981,7 @@ def mtg_factory(
             if axis_dynamics:
                 timetable = axis_dynamics[str(plant)][str(axe)]
             if axe == "MS":
-                vid_axe = g.add_component(
+                vid_axe = builder.add_component(
                     vid_plant,
                     edge_type="/",
                     label=label,
@@ -623,7 +993,7 @@ def mtg_factory(
                 )
                 vid_main_stem = vid_axe
             else:
-                vid_axe = g.add_child(
+                vid_axe = builder.add_child(
                     vid_main_stem,
                     edge_type="+",
                     label=label,
@@ -639,19 +1009,7 @@ def mtg_factory(
         # args are added to metamers only if metamer_factory is none, otherwise compute metamer components
         components = []
         if metamer_factory:
-            xysr_key = None
-            if leaves[species] is not None and "LcType" in args and "LcIndex" in args:
-                lctype = int(args["LcType"])
-                lcindex = int(args["LcIndex"])
-                if lctype != -999 and lcindex != -999:
-                    age = None
-                    if dynamic_leaf_db[species]:
-                        age = (
-                            float(args["rph"]) - 0.3
-                        )  # age_db = HS - rank + 1 = ph - 1.3 - rank +1 = rph - .3
-                        if age != "NA":
-                            age = max(0, int(float(age)))
-                    xysr_key = leaves[species].get_leaf_key(lctype, lcindex, age)
+            xysr_key = shape_keys[i]
 
             elongation = None
             if add_elongation:
@@ -669,74 +1027,62 @@ def mtg_factory(
                     "endleaf": endleaf,
                     "endE": endE,
                 }
-            if "ntop" not in args:
-                args.update({"ntop": None})
-            if "Gd" not in args:
-                args.update({"Gd": 0.19})
-            args.update({"split": split})
-
-            hs_f = args.get("HS_final")
-            if hs_f != "NA":
-                if float(hs_f) < args.get("nff"):
-                    for what in (
-                        "Ll",
-                        "Lv",
-                        "Lr",
-                        "Lsen",
-                        "L_shape",
-                        "Lw_shape",
-                        "Gl",
-                        "Gv",
-                        "Gsen",
-                        "Gd",
-                        "El",
-                        "Ev",
-                        "Esen",
-                        "Ed",
-                    ):
-                        args.update({what: args.get(what) * aborting_tiller_reduction})
+            extra = {}
+            if blade_elts is not None:
+                extra["blade_elts"] = blade_elts[i]
             components = metamer_factory(
                 Lsect=leaf_sectors,
                 shape_key=xysr_key,
                 elongation=elongation,
                 leaves=leaves[species],
+                **extra,
                 **args,
             )
             args = {"L_shape": args.get("L_shape")}
         #
         label = "metamer" + str(num_metamer)
-        new_metamer = g.add_component(vid_axe, edge_type="/", label=label, **args)
+        new_metamer = builder.add_component(
+            vid_axe, edge_type="/", label=label, **args
+        )
         if axe == "MS" and num_metamer == 1:
             vid_metamer = new_metamer
         elif num_metamer == 1:
             # add the edge with the bearing metamer on main stem
             vid_metamer = metamers[mspos - 1]
-            vid_metamer = g.add_child(vid_metamer, child=new_metamer, edge_type="+")
+            vid_metamer = builder.add_child(
+                vid_metamer, child=new_metamer, edge_type="+"
+            )
         else:
-            vid_metamer = g.add_child(vid_metamer, child=new_metamer, edge_type="<")
+            vid_metamer = builder.add_child(
+                vid_metamer, child=new_metamer, edge_type="<"
+            )
 
         # add metamer components, if any
         if len(components) > 0:
             # deals with first component (internode) and first element
             node, elements = get_component(components, 0)
             element = elements[0]
-            new_node = g.add_component(vid_metamer, edge_type="/", **node)
-            new_elt = g.add_component(new_node, edge_type="/", **element)
+            new_node = builder.add_component(vid_metamer, edge_type="/", **node)
+            new_elt = builder.add_component(new_node, edge_type="/", **element)
             if axe == "MS" and num_metamer == 1:  # root of main stem
                 vid_node = new_node
                 vid_elt = new_elt
             elif num_metamer == 1:  # root of tiller
                 vid_node = nodes[mspos - 1]
-                vid_node = g.add_child(vid_node, child=new_node, edge_type="+")
+                vid_node = builder.add_child(vid_node, child=new_node, edge_type="+")
                 vid_elt = elts[mspos - 1]
-                vid_elt = g.add_child(vid_elt, child=new_elt, edge_type="+")
+                vid_elt = builder.add_child(vid_elt, child=new_elt, edge_type="+")
             else:
-                vid_node = g.add_child(vid_topstem_node, child=new_node, edge_type="<")
-                vid_elt = g.add_child(vid_topstem_element, child=new_elt, edge_type="<")
+                vid_node = builder.add_child(
+                    vid_topstem_node, child=new_node, edge_type="<"
+                )
+                vid_elt = builder.add_child(
+                    vid_topstem_element, child=new_elt, edge_type="<"
+                )
             # add other elements of first component (the internode)
             for i in range(1, len(elements)):
                 element = elements[i]
-                vid_elt = g.add_child(vid_elt, edge_type="<", **element)
+                vid_elt = builder.add_child(vid_elt, edge_type="<", **element)
             vid_topstem_node = vid_node
             vid_topstem_element = vid_elt  # last element of internode
 
@@ -747,13 +1093,13 @@ def mtg_factory(
                     edge_type = "+"
                 else:
                     edge_type = "<"
-                vid_node = g.add_child(vid_node, edge_type=edge_type, **node)
+                vid_node = builder.add_child(vid_node, edge_type=edge_type, **node)
                 element = elements[0]
-                new_elt = g.add_component(vid_node, edge_type="/", **element)
-                vid_elt = g.add_child(vid_elt, child=new_elt, edge_type=edge_type)
+                new_elt = builder.add_component(vid_node, edge_type="/", **element)
+                vid_elt = builder.add_child(vid_elt, child=new_elt, edge_type=edge_type)
                 for j in range(1, len(elements)):
                     element = elements[j]
-                    vid_elt = g.add_child(vid_elt, edge_type="<", **element)
+                    vid_elt = builder.add_child(vid_elt, edge_type="<", **element)
 
                     # update buffers
         if axe == "MS":
@@ -764,6 +1110,8 @@ def mtg_factory(
         prev_plant = plant
         prev_axe = axe
 
+    if bulk:
+        return g.to_mtg()
     return fat_mtg(g)
 
 
@@ -780,9 +1128,9 @@ def update_elements(organ, leaves=None):
             organ.shape_key,
             leaves=leaves,
         )
-        for i, e in enumerate(organ.components()):
-            for k in elements[i]:
-                exec("e.%s = elements[i]['%s']" % (k, k))
+        for e, element in zip(organ.components(), elements):
+            for k, v in element.items():
+                setattr(e, k, v)
 
 
 def update_plant(plant, time):
@@ -815,28 +1163,6 @@ def update_organ(organ, h_whorl=0):
     organ.dl_visible = organ.visible_length - vlength
 
 
-def update_organ_from_table(organ, metamer, oldmetamer):
-    neworg = metamer[organ.label]
-    # oldorg = oldmetamer[organ.label]
-    new_elts = neworg.pop("elements")
-    for k in neworg:
-        if k != "shape_xysr":
-            exec("organ.%s = neworg['%s']" % (k, k))
-    for i, e in enumerate(organ.components()):
-        has_area = False
-        for k in new_elts[i]:
-            if k in ["area", "green_area", "senesced_area"]:
-                exec("e.%s += (new_elts[i]['%s'] - old_elts[i]['%s'])" % (k, k, k))
-                has_area = True
-            else:
-                exec("e.%s = new_elts[i]['%s']" % (k, k))
-        # control senescence (in case of acceleration by an other process)
-        if has_area:
-            if (e.green_area + e.senesced_area) > e.area:
-                e.green_area = 0
-                e.senesced_area = e.area
-
-
 def mtg_update_at_time(g, time):
     """Compute plant state at a given time according to dynamical parameters found in mtg"""
     for pid in g.component_roots_at_scale_iter(g.root, scale=1):
@@ -862,53 +1188,119 @@ def mtg_update_at_time(g, time):
                         hw[o.complex().index()] = o.length
 
 
-def mtg_update_from_table(g, cantable, old_cantable):
-    """Compute plant state at a given time according to dynamical parameters found in mtg"""
+def _table_rows(df, keys=("plant", "axe_id", "numphy")):
+    """{(plant, axe_id, numphy): row dict} of the first row of each metamer of a canopy table"""
+    rows = {}
+    if len(df) > 0:
+        index = zip(*(df[k].tolist() for k in keys))
+        for key, row in zip(index, df.to_dict("records")):
+            rows.setdefault(key, row)
+    return rows
 
-    df = pandas.DataFrame(cantable)
-    old_df = pandas.DataFrame(old_cantable)
-    for pid in g.component_roots_at_scale_iter(g.root, scale=1):
-        p = g.node(pid)
-        for ax in p.components_at_scale(2):
-            for m in ax.components_at_scale(3):
-                nump = int("".join(list(p.label)[5:]))
-                numphy = int("".join(list(m.label)[7:]))
-                dm = df[
-                    (df["plant"] == nump)
-                    & (df["axe_id"] == ax.label)
-                    & (df["numphy"] == numphy)
-                ]
-                old_dm = old_df[
-                    (old_df["plant"] == nump)
-                    & (old_df["axe_id"] == ax.label)
-                    & (old_df["numphy"] == numphy)
-                ]
-                # G. Garin 02/08: Addition of the following condition
-                if len(dm) > 0:
-                    dmd = dict([(k, v[0]) for k, v in dm.to_dict("list").items()])
-                    old_dmd = dict(
-                        [(k, v[0]) for k, v in old_dm.to_dict("list").items()]
-                    )
-                    blade = m.components_at_scale(4)[2]
-                    dmd["xysr_shape"] = blade.shape_xysr
-                    dmd["Lsect"] = blade.n_sect
-                    old_dmd["xysr_shape"] = blade.shape_xysr
-                    old_dmd["Lsect"] = blade.n_sect
-                    met = adel_metamer(**dmd)
-                    newmetamer = dict([(mm["label"], mm) for mm in met])
-                    old_met = adel_metamer(**old_dmd)
-                    oldmetamer = dict([(mm["label"], mm) for mm in old_met])
-                    for o in m.components_at_scale(4):
-                        update_organ_from_table(o, newmetamer, oldmetamer)
+
+def _table_metamers(args, leaves=None):
+    """adel_metamer organ dicts ({label: organ}) for a list of adel_metamer arguments, blade elements being computed in batch
+
+    leaves is a {species:adel.geometric_elements.Leaves} dict
+    """
+    if leaves is None:
+        leaves = {0: None}
+        species = [0] * len(args)
+    else:
+        species = [a["species"] for a in args]
+    blade_elts = _canopy_blade_elements(
+        {k: [a.get(k) for a in args] for k in _blade_columns},
+        [a["shape_key"] for a in args],
+        species,
+        leaves,
+        [a["Lsect"] for a in args],
+    )
+    return [
+        {organ["label"]: organ for organ in adel_metamer(blade_elts=elts, **a)}
+        for a, elts in zip(args, blade_elts)
+    ]
+
+
+def mtg_update_from_table(g, cantable, old_cantable, leaves=None):
+    """Update the organs and elements of g with the metamer parameters found in cantable
+
+    Metamers are matched on (plant, axe_id, numphy). Element areas are
+    incremented by their variation between old_cantable and cantable.
+    leaves is the {species:adel.geometric_elements.Leaves} dict g was built with.
+    """
+    rows = _table_rows(pandas.DataFrame(cantable))
+    old_rows = _table_rows(pandas.DataFrame(old_cantable))
+    index = adel_index(g)
+    number = index.numbers(g)
+    labels = g.property("label")
+    n_sect = g.property("n_sect")
+    shape_key = g.property("shape_key")
+    species = g.property("species")
+
+    metamers, args, old_args = [], [], []
+    for m in g.vertices_iter(scale=3):
+        plant, axe = index.complex_at_scale(m, 1), index.complex_at_scale(m, 2)
+        key = (int(number[plant]), labels[axe], int(number[m]))
+        if key not in rows:
+            continue
+        organs = g.components(m)
+        blade = organs[2] if len(organs) > 2 else None
+        blade_args = {
+            "Lsect": n_sect.get(blade, 1),
+            "shape_key": shape_key.get(blade),
+            "species": species.get(blade, 0),
+        }
+        metamers.append(organs)
+        args.append(dict(rows[key], **blade_args))
+        old_args.append(dict(old_rows[key], **blade_args) if key in old_rows else None)
+    new_metamers = _table_metamers(args, leaves)
+    old_metamers = iter(
+        _table_metamers([a for a in old_args if a is not None], leaves)
+    )
+    old_metamers = [{} if a is None else next(old_metamers) for a in old_args]
+
+    # property dicts, added to g if missing
+    names = set()
+    for metamer in new_metamers:
+        for organ in metamer.values():
+            names.update(organ)
+            for elt in organ["elements"]:
+                names.update(elt)
+    names -= {"elements", "shape_xysr"}
+    for name in names - set(g.property_names()):
+        g.add_property(name)
+    props = {name: g.property(name) for name in names}
+    increments = ("area", "green_area", "senesced_area")
+    area, green_area, senesced_area = (props.get(k, {}) for k in increments)
+
+    for organs, new, old in zip(metamers, new_metamers, old_metamers):
+        for organ in organs:
+            neworg = new[labels[organ]]
+            old_elts = old.get(labels[organ], {}).get("elements", [])
+            for k, v in neworg.items():
+                if k in props:
+                    props[k][organ] = v
+            elements = zip(g.components(organ), neworg["elements"])
+            for i, (e, elt) in enumerate(elements):
+                old_elt = old_elts[i] if i < len(old_elts) else {}
+                for k, v in elt.items():
+                    if k in increments:
+                        delta = (v or 0) - (old_elt.get(k) or 0)
+                        props[k][e] = (props[k].get(e) or 0) + delta
+                    else:
+                        props[k][e] = v
+                # control senescence (in case of acceleration by an other process)
+                green, sen = green_area.get(e), senesced_area.get(e)
+                total = area.get(e)
+                if None not in (green, sen, total) and green + sen > total:
+                    green_area[e] = 0
+                    senesced_area[e] = total
 
 
 def adel_label(g, vid):
     label = "undef"
     if g.scale(vid) == 5:
-        organ = g.complex(vid)
-        metamer = g.complex(organ)
-        axe = g.complex(metamer)
-        plant = g.complex(axe)
+        plant, axe, metamer, organ = map(int, adel_index(g).element_ancestors(vid))
         label = "_".join(
             [
                 g.label(plant),
@@ -923,34 +1315,72 @@ def adel_label(g, vid):
 
 def adel_labels(g, scale=5):
     """return a dict vid:adel_id"""
-    return {vid: adel_label(g, vid) for vid in g.vertices_iter(scale=scale)}
+    vids = list(g.vertices_iter(scale=scale))
+    if scale != 5:
+        return {vid: "undef" for vid in vids}
+    labels = g.property("label")
+    ancestors = adel_index(g).element_ancestors(numpy.array(vids, dtype=int))
+    columns = [[labels.get(v) for v in a.tolist()] for a in ancestors]
+    columns.append([labels.get(v) for v in vids])
+    return {vid: "_".join(names) for vid, names in zip(vids, zip(*columns))}
 
 
 def adel_ids(g, scale=5):
     """return a dict adel_id:vid"""
-    return {adel_label(g, vid): vid for vid in g.vertices_iter(scale=scale)}
+    return {label: vid for vid, label in adel_labels(g, scale).items()}
+
+
+def _element_labels(g):
+    """return the vids of the elements of g and the list of the label arrays of their plant, axe, metamer and organ and of their own labels"""
+    vids = numpy.fromiter(g.vertices_iter(scale=5), dtype=int)
+    columns = adel_index(g).element_ancestors(vids) + [vids]
+    return vids, [_lookup(g, "label", column) for column in columns]
+
+
+def _last_unique(keys):
+    """positions of the last occurrence of each distinct key"""
+    _, first = numpy.unique(keys[::-1], return_index=True)
+    return len(keys) - 1 - first
+
+
+def match_elements(g, other):
+    """return the aligned vid arrays of the elements of g and of other sharing the same adel label (see adel_ids)
+
+    Labels are encoded as integer keys (plant, axe, metamer, organ and element
+    label codes) shared by the two mtgs, and matched with a sorted join. As in
+    adel_ids, the last element wins when several elements of a mtg share a
+    label.
+    """
+    vids, columns = _element_labels(g)
+    other_vids, other_columns = _element_labels(other)
+    n = len(vids)
+    codes = [
+        pandas.factorize(numpy.concatenate([a, b]))[0] + 1
+        for a, b in zip(columns, other_columns)
+    ]
+    dims = [c.max() + 1 if len(c) > 0 else 1 for c in codes]
+    keys = numpy.ravel_multi_index(codes, dims)
+    first = _last_unique(keys[:n])
+    second = _last_unique(keys[n:])
+    _, i, j = numpy.intersect1d(
+        keys[:n][first], keys[n:][second], assume_unique=True, return_indices=True
+    )
+    return vids[first[i]], other_vids[second[j]]
 
 
 def mtg_update(newg, g, refg):
     """update newg with specific properties found in g only and update by increment compared to refg area-like properties"""
     specific = set(g.property_names()) - set(newg.property_names())
-    ids = adel_ids(g, scale=5)
-    newids = adel_ids(newg, scale=5)
-    common_labs = set(ids) & set(newids)
+    common = list(zip(*(vids.tolist() for vids in match_elements(g, newg))))
 
     for prop in specific:
         newg.add_property(prop)
-        newprop = {
-            newids[lab]: g.property(prop)[ids[lab]]
-            for lab in common_labs
-            if ids[lab] in g.property(prop)
-        }
+        values = g.property(prop)
+        newprop = {newvid: values[vid] for vid, newvid in common if vid in values}
         newg.property(prop).update(newprop)
         # g.remove_property(prop)#helps beeing compatible with ctypes objects
 
-    for lab in common_labs:
-        vid = ids[lab]
-        newvid = newids[lab]
+    for vid, newvid in common:
         if (
             vid in g.property("area")
             and newvid in newg.property("area")
@@ -1020,28 +1450,31 @@ def move_properties(g_source, g_dest, filter_length=True, cleanup_source=True):
     if filter_length is True (default), properties attached to node whose length is zero are not transfered
     """
     specific = set(g_source.property_names()) - set(g_dest.property_names())
-    ids = adel_ids(g_source, scale=5)
-    newids = adel_ids(g_dest, scale=5)
+    common = list(zip(*(vids.tolist() for vids in match_elements(g_source, g_dest))))
     if filter_length:
         length = g_dest.property("length")
-        newids = {lab: vid for lab, vid in newids.items() if length[vid] > 0}
-    common_labs = set(ids) & set(newids)
+        common = [(vid, newvid) for vid, newvid in common if length[newvid] > 0]
 
     for prop in specific:
         g_dest.add_property(prop)
-        newprop = {
-            newids[lab]: g_source.property(prop)[ids[lab]]
-            for lab in common_labs
-            if ids[lab] in g_source.property(prop)
-        }
+        values = g_source.property(prop)
+        newprop = {newvid: values[vid] for vid, newvid in common if vid in values}
         g_dest.property(prop).update(newprop)
         if cleanup_source:
             g_source.remove_property(prop)
 
 
+def _lookup(g, name, vids, default=None):
+    """return the object array of the values of property name for the vertices vids, read once per distinct vertex"""
+    prop = g.property(name)
+    unique, inverse = numpy.unique(vids, return_inverse=True)
+    values = numpy.empty(len(unique), dtype=object)
+    values[:] = [prop.get(vid, default) for vid in unique.tolist()]
+    return values[inverse.reshape(-1)]
+
+
 def exposed_areas(g):
     """returns a Dataframe with all exposed (visible) areas of elements in g"""
-    data = {}
     what = (
         "length",
         "area",
@@ -1050,36 +1483,38 @@ def exposed_areas(g):
         "senesced_length",
         "senesced_area",
     )
-    for vid in g.vertices_iter(scale=g.max_scale()):
-        n = g.node(vid)
-        if n.length > 0 and not n.label.startswith("Hidden"):
-            organ = n.complex()
-            metamer = organ.complex()
-            axe = metamer.complex()
-            plant = axe.complex()
-            numphy = int("".join(list(metamer.label)[7:]))
-            nf = axe.nff
-            node_data = {
-                "plant": plant.label,
-                "axe": axe.label,
-                "metamer": numphy,
-                "organ": organ.label,
-                "vid": vid,
-                "ntop": nf - numphy + 1,
-                "element": n.label,
-                "refplant_id": plant.refplant_id,
-                "nff": nf,
-                "HS_final": axe.HS_final,
-                "L_shape": metamer.L_shape,
-            }
-            properties = n.properties()
-            node_data.update({k: properties[k] for k in what})
-            if "species" in plant.properties():
-                node_data.update({"species": plant.species})
-            else:
-                node_data.update({"species": 0})
-            data[vid] = node_data
-    df = pandas.DataFrame(data).T
+    labels = g.property("label")
+    length = g.property("length")
+    vids = numpy.array(
+        [
+            vid
+            for vid in g.vertices_iter(scale=g.max_scale())
+            if (length.get(vid) or 0) > 0 and not labels[vid].startswith("Hidden")
+        ],
+        dtype=int,
+    )
+    index = adel_index(g)
+    plant, axe, metamer, organ = index.element_ancestors(vids)
+    numphy = index.numbers(g)[metamer]
+    nff = _lookup(g, "nff", axe)
+    data = {
+        "plant": _lookup(g, "label", plant),
+        "axe": _lookup(g, "label", axe),
+        "metamer": numphy,
+        "organ": _lookup(g, "label", organ),
+        "vid": vids,
+        "ntop": nff - numphy + 1,
+        "element": _lookup(g, "label", vids),
+        "refplant_id": _lookup(g, "refplant_id", plant),
+        "nff": nff,
+        "HS_final": _lookup(g, "HS_final", axe),
+        "L_shape": _lookup(g, "L_shape", metamer),
+    }
+    for k in what:
+        prop = g.property(k)
+        data[k] = [prop.get(vid) for vid in vids.tolist()]
+    data["species"] = _lookup(g, "species", plant, 0)
+    df = pandas.DataFrame(data, index=vids).infer_objects()
     # hack
     df["d_basecol"] = 0
     return df
@@ -1089,43 +1524,43 @@ def exposed_areas2canS(exposed_areas):
     """adaptor to convert new adel output to old adel output (canS-like) dataframe"""
     d = exposed_areas
     if len(d) > 0:
-        grouped = d.groupby(["species", "plant", "axe", "metamer"], group_keys=False)
-
-        def _metamer(sub):
-            met = {
-                "species": sub.species.values[0],
-                "plant": sub.plant.values[0],
-                "refplant_id": sub.refplant_id.values[0],
-                "axe_id": sub.axe.values[0],
-                "nff": sub.nff.values[0],
-                "HS_final": sub.HS_final.values[0],
-                "numphy": sub.metamer.values[0],
-                "ntop": sub.ntop.values[0],
-                "L_shape": sub.L_shape.values[0],
-                "Lv": sub[sub.organ == "blade"].length.sum(),
-                "Lvgreen": sub[sub.organ == "blade"].green_length.sum(),
-                "Lvsen": sub[sub.organ == "blade"].senesced_length.sum(),
-                "Slv": sub[sub.organ == "blade"].area.sum(),
-                "Slvgreen": sub[sub.organ == "blade"].green_area.sum(),
-                "Slvsen": sub[sub.organ == "blade"].senesced_area.sum(),
-                "Gv": sub[sub.organ == "sheath"].length.sum(),
-                "Gvgreen": sub[sub.organ == "sheath"].green_length.sum(),
-                "Gvsen": sub[sub.organ == "sheath"].senesced_length.sum(),
-                "SGv": sub[sub.organ == "sheath"].area.sum(),
-                "SGvgreen": sub[sub.organ == "sheath"].green_area.sum(),
-                "SGvsen": sub[sub.organ == "sheath"].senesced_area.sum(),
-                "Ev": sub[sub.organ == "internode"].length.sum(),
-                "Evgreen": sub[sub.organ == "internode"].green_length.sum(),
-                "Evsen": sub[sub.organ == "internode"].senesced_length.sum(),
-                "SEv": sub[sub.organ == "internode"].area.sum(),
-                "SEvgreen": sub[sub.organ == "internode"].green_area.sum(),
-                "SEvsen": sub[sub.organ == "internode"].senesced_area.sum(),
-            }
-            return pandas.DataFrame(met, index=[sub.index[0]])
-        d = grouped[['plant', 'axe', 'metamer', 'organ', 'vid', 'ntop', 'element',
-           'refplant_id', 'nff', 'HS_final', 'L_shape', 'length', 'area',
-           'green_length', 'green_area', 'senesced_length', 'senesced_area',
-           'species', 'd_basecol']].apply(_metamer)
+        group = d.groupby(["species", "plant", "axe", "metamer"]).ngroup().to_numpy()
+        rows = numpy.flatnonzero(group >= 0)
+        group = group[rows]
+        ngroups = group.max() + 1 if len(group) > 0 else 0
+        first = rows[numpy.unique(group, return_index=True)[1]]
+        met = d.iloc[first]
+        data = {
+            "species": met.species.values,
+            "plant": met.plant.values,
+            "refplant_id": met.refplant_id.values,
+            "axe_id": met.axe.values,
+            "nff": met.nff.values,
+            "HS_final": met.HS_final.values,
+            "numphy": met.metamer.values,
+            "ntop": met.ntop.values,
+            "L_shape": met.L_shape.values,
+        }
+        organ = d.organ.to_numpy()[rows]
+        for name, length, area in (
+            ("blade", "Lv", "Slv"),
+            ("sheath", "Gv", "SGv"),
+            ("internode", "Ev", "SEv"),
+        ):
+            mask = organ == name
+            for col, what in (
+                (length, "length"),
+                (length + "green", "green_length"),
+                (length + "sen", "senesced_length"),
+                (area, "area"),
+                (area + "green", "green_area"),
+                (area + "sen", "senesced_area"),
+            ):
+                values = pandas.to_numeric(d[what]).fillna(0).to_numpy(float)[rows]
+                data[col] = numpy.bincount(
+                    group[mask], weights=values[mask], minlength=ngroups
+                )
+        d = pandas.DataFrame(data, index=d.index[first])
         # hack
         d["d_basecol"] = 0
     return d
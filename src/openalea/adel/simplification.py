@@ -1,4 +1,6 @@
-from heapq import heappush, heappop
+from heapq import heapify, heappush, heappop
+
+import numpy
 from openalea.plantgl.all import Vector3
 
 points = [
@@ -20,59 +22,115 @@ def max_distance(pts, line):
     return index, max_dist / d_line
 
 
+def _cross_norm2(u, v):
+    """squared norm of the cross product of u and v ((x, y, z) tuples of floats or of arrays)"""
+    ux, uy, uz = u
+    vx, vy, vz = v
+    cx = uy * vz - uz * vy
+    cy = uz * vx - ux * vz
+    cz = ux * vy - uy * vx
+    return cx * cx + cy * cy + cz * cz
+
+
 def distance(pt, p0, p1):
-    line = p1 - p0
-    length = line.__normSquared__()
-    d = ((pt - p0) ^ line).__normSquared__()
+    """squared distance of pt to the line (p0, p1), points being (x, y, z) sequences"""
+    line = (p1[0] - p0[0], p1[1] - p0[1], p1[2] - p0[2])
+    length = line[0] * line[0] + line[1] * line[1] + line[2] * line[2]
+    d = _cross_norm2((pt[0] - p0[0], pt[1] - p0[1], pt[2] - p0[2]), line)
     d /= length
     return d
 
 
-def cost(polyline, nb_points):
+def distances(coords):
+    """squared distances of the inner points of a polyline to the line joining their neighbours
+
+    Args:
+        coords: a (n, 3) array of point coordinates
+
+    Returns:
+        a (n - 2,) array (distance of point i is at index i - 1)
+    """
+    pt, p0, p1 = coords[1:-1], coords[:-2], coords[2:]
+    line = (p1 - p0).T
+    length = line[0] * line[0] + line[1] * line[1] + line[2] * line[2]
+    if (length == 0).any():
+        raise ZeroDivisionError("float division by zero")
+    return _cross_norm2((pt - p0).T, line) / length
+
+
+def cost(polyline, nb_points, legacy=True):
+    """Simplify a polyline by iteratively removing the point closest to the line joining its neighbours
+
+    Args:
+        polyline: a list of points (pgl.Vector3 or (x, y, z) tuples)
+        nb_points: the number of points kept (end points included)
+        legacy: (bool) if True (default), points are removed as in the
+         historical implementation, that fitted leaf shapes depend on: its heap
+         updates did not maintain the heap invariant (points were not always
+         removed by increasing cost), and the neighbours of the end points are
+         removed after nb_points inner points have been kept. If False, the
+         point of lowest cost is always removed, using a lazy deletion heap
+         (O(n log n)). The legacy order is kept by default, as fitted leaf
+         databases (fitting.fit_leaves) are expected to reproduce the historical
+         shapes; new code should use legacy=False.
+
+    Returns:
+        the list of points of polyline, with None at the place of removed points
+    """
     nb_points += 2
     n = len(polyline)
-    pts = [pt for pt in polyline]
-    _cost = []
+    pts = list(polyline)
+    coords = [tuple(map(float, pt)) for pt in polyline]
 
     sibling = [[i - 1, i + 1] for i in range(n)]
 
     # compute the cost for each points
-    heap_cost = []
     _cost = {}
+    if n > 2:
+        d = distances(numpy.array(coords, dtype=float))
+        _cost = dict(zip(range(1, n - 1), d.tolist()))
 
-    for i in range(1, n - 1):
-        d = distance(polyline[i], polyline[i - 1], polyline[i + 1])
-        _cost[i] = d
-        heappush(heap_cost, [d, i])
-
-    while len(heap_cost) > nb_points - 2:
-        d, i = heappop(heap_cost)
-
-        assert pts[i] is not None
+    def _remove(i):
+        """remove point i and return the new costs of its neighbours"""
         pts[i] = None
-
-        # update i-1 and i+1 distance
         il, ir = sibling[i]
-
+        updated = []
         if il != 0:
             sibling[il][1] = ir
             ill = sibling[il][0]
-            dl = distance(pts[il], pts[ill], pts[ir])
-            old_dl = _cost[il]
-            heap_index = heap_cost.index([old_dl, il])
-            _cost[il] = dl
-            del heap_cost[heap_index]
-            heappush(heap_cost, [dl, il])
+            updated.append((il, distance(coords[il], coords[ill], coords[ir])))
         if ir != n - 1:
             sibling[ir][0] = il
             irr = sibling[ir][1]
-            dr = distance(pts[ir], pts[il], pts[irr])
-            old_dr = _cost[ir]
-            heap_index = heap_cost.index([old_dr, ir])
-            _cost[ir] = dr
-            del heap_cost[heap_index]
-            heappush(heap_cost, [dr, ir])
-    # bug in the algorithm...
-    pts[1] = None
-    pts[-2] = None
+            updated.append((ir, distance(coords[ir], coords[il], coords[irr])))
+        return updated
+
+    if legacy:
+        heap_cost = []
+        for i in range(1, n - 1):
+            heappush(heap_cost, [_cost[i], i])
+        while len(heap_cost) > nb_points - 2:
+            d, i = heappop(heap_cost)
+            for j, dj in _remove(i):
+                heap_index = heap_cost.index([_cost[j], j])
+                _cost[j] = dj
+                del heap_cost[heap_index]
+                heappush(heap_cost, [dj, j])
+        # bug in the algorithm...
+        pts[1] = None
+        pts[-2] = None
+    else:
+        # outdated costs stay in the heap and are skipped when popped
+        heap_cost = [[d, i] for i, d in _cost.items()]
+        heapify(heap_cost)
+        remaining = len(heap_cost)
+        # as in legacy mode, at least the end points are kept
+        while remaining > max(nb_points - 4, 0):
+            d, i = heappop(heap_cost)
+            if pts[i] is None or _cost[i] != d:
+                continue
+            remaining -= 1
+            for j, dj in _remove(i):
+                _cost[j] = dj
+                heappush(heap_cost, [dj, j])
     return pts
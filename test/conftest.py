@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def adel_cache(tmp_path_factory, monkeypatch):
+    """keep the on-disk cache of fitted leaves out of the user cache directory"""
+    path = tmp_path_factory.mktemp("adel_cache")
+    monkeypatch.setenv("OPENALEA_ADEL_CACHE", str(path))
+    return path
@@ -1,7 +1,9 @@
+import numpy
 import pytest
 
 import openalea.adel.data_samples as test_data
 from openalea.adel.adel import Adel
+from openalea.adel.canopy_mesh import instance_arrays, instance_geometry
 import os
 
 
@@ -95,6 +97,41 @@ def test_duplicated(adel, g):
     assert gg.nb_vertices() == 1 + 2 * (g.nb_vertices() - 1)
 
 
+def test_instanced(g):
+    adel = Adel(nplants=2, duplicate=2, instancing=True)
+    gg = adel.duplicated(g)
+    assert gg.nb_vertices() == 1 + 2 * (g.nb_vertices() - 1)
+    # only the prototype holds geometry
+    assert len(gg.property("geometry")) == len(g.property("geometry"))
+    p1, p2 = list(gg.vertices(1))
+    assert gg.property("prototype")[p2] == p1
+    geometry = instance_geometry(gg)
+    assert len(geometry) == 2 * len(g.property("geometry"))
+    assert len(adel.scene(gg)) == len(geometry)
+    assert gg.property("position")[p2] == adel.positions[1]
+
+
+def test_save_instanced(g):
+    adel = Adel(nplants=2, duplicate=2, instancing=True)
+    gg = adel.duplicated(g)
+    geometry = dict(gg.property("geometry"))
+    expanded = instance_arrays(gg)
+    fgeom, fg = adel.save(gg, basename="instanced")
+    try:
+        # geometry is left in prototype coordinates
+        assert gg.property("geometry") == geometry
+        assert len(adel.scene(gg)) == len(instance_geometry(gg))
+        for vid, (pts, ind) in instance_arrays(gg).items():
+            numpy.testing.assert_allclose(pts, expanded[vid][0])
+        loaded = adel.load(basename="instanced")
+        assert loaded.nb_vertices() == gg.nb_vertices()
+        assert len(adel.scene(loaded)) == len(instance_geometry(gg))
+    finally:
+        for f in (fgeom, fg):
+            if os.path.exists(f):
+                os.remove(f)
+
+
 def test_build_mtg(adel, g):
     pars = test_data.canopy_two_metamers()
     gg = adel.build_mtg(pars, stand=None)
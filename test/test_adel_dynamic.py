@@ -50,3 +50,38 @@ def test_update_geometry():
     assert blade.area > 0
     elts = [c.label for c in blade.components()]
     assert len(elts) > 2
+
+
+def test_incremental_update_geometry():
+    adel = AdelDyn()
+    axeT = test_data.axeTable()
+    phytoT = test_data.phytoT()
+    g = adel.build_stand(axeT)
+    vid = adel.add_metamer(g, phytoT)
+    new_metamer = g.node(vid)
+    internode, sheath, blade = new_metamer.components()
+    blade.length = 6
+    blade.visible_length = 3
+    adel.update_geometry(g, incremental=True)
+    geometry = dict(g.property("geometry"))
+    assert len(geometry) > 0
+    # nothing changed: geometries are kept
+    adel.update_geometry(g, incremental=True)
+    for vid in geometry:
+        assert g.property("geometry")[vid] is geometry[vid]
+    # blade grows: only blade elements are updated
+    blade.visible_length = 4
+    adel.update_geometry(g, incremental=True)
+    leaf_elts = [c._vid for c in blade.components()]
+    for vid in geometry:
+        if vid not in leaf_elts:
+            assert g.property("geometry")[vid] is geometry[vid]
+    assert any(
+        g.property("geometry").get(vid) is not geometry.get(vid) for vid in leaf_elts
+    )
+    # plant moves: all its elements are placed again
+    geometry = dict(g.property("geometry"))
+    adel.positions = [(10, 0, 0)]
+    updated = adel.update_geometry(g, incremental=True)
+    for vid in geometry:
+        assert updated.property("geometry")[vid] is not geometry[vid]
@@ -0,0 +1,57 @@
+from openalea.adel.adel_index import adel_index, label_number
+from openalea.adel.data_samples import canopy_two_metamers
+from openalea.adel.mtg_editions import find_label
+from openalea.adel.newmtg import adel_label, adel_labels, mtg_factory
+
+
+def test_label_number():
+    assert label_number("metamer12") == 12
+    assert label_number("plant1") == 1
+    assert label_number("blade") == -1
+    assert label_number(None) == -1
+
+
+def test_adel_index():
+    g = mtg_factory(canopy_two_metamers())
+    index = adel_index(g)
+    assert adel_index(g) is index
+    for vid in g.vertices(scale=5):
+        for scale in range(1, 5):
+            assert index.complex_at_scale(vid, scale) == g.complex_at_scale(vid, scale)
+    number = index.numbers(g)
+    for vid in g.vertices(scale=3):
+        assert number[vid] == int(g.label(vid)[7:])
+    assert list(index.elements) == g.vertices(scale=5)
+    labels = adel_labels(g)
+    assert all(adel_label(g, vid) == label for vid, label in labels.items())
+
+    organ = g.vertices(scale=4)[0]
+    element = g.components(organ)[-1]
+    label = g.label(element)
+    assert find_label(label, g, organ) == [element]
+    vid = g.add_child(element, label=label, edge_type="<")
+    assert not index.is_valid(g)
+    assert adel_index(g, build=False) is None
+    assert find_label(label, g, organ) == [element, vid]
+    assert adel_index(g).complex_at_scale(vid, 4) == organ
+
+
+def test_relabel():
+    g = mtg_factory(canopy_two_metamers())
+    index = adel_index(g)
+    plant = g.vertices(scale=1)[0]
+    assert index.numbers(g)[plant] == 1
+    g.property("label")[plant] = "plant7"
+    assert adel_index(g) is index
+    assert index.numbers(g)[plant] == 7
+    numbers = index.numbers(g)
+    numbers[plant] = 0
+    assert index.numbers(g)[plant] == 7
+
+
+def test_find_label_builds_index():
+    g = mtg_factory(canopy_two_metamers())
+    metamer = g.vertices(scale=3)[0]
+    axe = g.complex(metamer)
+    assert find_label(g.label(metamer), g, axe) == [metamer]
+    assert adel_index(g, build=False) is not None
@@ -0,0 +1,43 @@
+import pickle
+
+from openalea.adel.data_samples import adel_two_metamers
+from openalea.adel.canopy_mesh import (
+    CanopyMesh,
+    get_canopy_mesh,
+    pack_geometry,
+    unpack_geometry,
+)
+from openalea.adel.mtg_interpreter import plot3d
+
+
+def test_pack_unpack():
+    g = adel_two_metamers()
+    geometry = dict(g.property("geometry"))
+    n = len(plot3d(g))
+    canestra = g.to_canestra()
+    g = pack_geometry(g)
+    assert g.to_canestra() == canestra
+    store = get_canopy_mesh(g)
+    assert len(g.property("geometry")) == 0
+    assert set(store) == set(geometry)
+    for vid, geom in geometry.items():
+        pts, ind = store.arrays(vid)
+        assert len(pts) == len(geom.pointList)
+        assert len(ind) == len(geom.indexList)
+    # lazy materialisation
+    assert len(plot3d(g)) == n
+    areas = store.areas()
+    assert all(a > 0 for a in areas.values())
+    triangles = store.caribu_triangles()
+    assert sum(len(t) for t in triangles.values()) == len(store.indices)
+    store2 = pickle.loads(pickle.dumps(store))
+    assert vid in store2
+    g = unpack_geometry(g)
+    assert set(g.property("geometry")) == set(geometry)
+    assert get_canopy_mesh(g) is None
+
+
+def test_empty_store():
+    store = CanopyMesh.from_arrays({})
+    assert len(store) == 0
+    assert store.areas() == {}
@@ -1,9 +1,12 @@
 import openalea.adel.fitting as fitting
 import openalea.adel.mtg as CanMTG
 from openalea.adel.symbol import build_symbols
+import numpy
 from numpy import compress, unique, union1d, interp
 import random
 import openalea.adel.json_numpy as json_np
+from openalea.adel.simplification import cost
+import openalea.plantgl.all as pgl
 
 symbols = {
     "newPlant": 1,
@@ -14,8 +17,7 @@ symbols = {
 }
 
 
-def leaves_db():
-    import openalea.adel.fitting as fitting
+def leaves_json():
     from openalea.adel import data
     from os.path import join
 
@@ -23,7 +25,11 @@ def leaves_db():
     fn = join(pth, "simpleleavesdb.json")
     with open(fn) as f:
         leaves = json_np.load(f)
-    leaves, discard = fitting.fit_leaves(leaves, 9)
+    return leaves
+
+
+def leaves_db():
+    leaves, discard = fitting.fit_leaves(leaves_json(), 9)
     return leaves
 
 
@@ -281,3 +287,75 @@ StemElement(1,3.200001,0.04,0.04)StemElement(1,16.250000,0.04,0.04)[/(180.000000
 
     # Viewer.display(scene)
     # raw_input('enter')
+
+
+def test_mesh4_arrays():
+    leaf = db["1"][0]
+    pts, ind = fitting.mesh4(leaf, 7, 7, 0.5, 0.6, 1)
+    assert pts.shape[1] == 3
+    assert ind.shape[1] == 3
+    assert ind.max() < len(pts)
+    assert (fitting.triangle_areas(pts, ind) > 1e-6).all()
+    shape = fitting.plantgl_shape(pts, ind)
+    assert len(shape.indexList) == len(ind)
+    # degenerated (null length) element
+    pts, ind = fitting.mesh4(leaf, 7, 0, 0.5, 0.6, 1)
+    assert pts.shape == ind.shape == (0, 3)
+    assert ind.dtype.kind == "i"
+
+
+def test_fit_cache(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("OPENALEA_ADEL_CACHE", str(tmp_path))
+    leaves = leaves_json()
+    # a shape that cannot be fitted
+    key = list(leaves)[0]
+    leaves[key] = leaves[key] + [([0.0] * 3, [0.0] * 3, [0.0] * 3, [0.0] * 3)]
+    ref, ref_discard = fitting.fit_leaves(leaves, 9)
+    assert ref_discard == {key: [len(leaves[key])]}
+    capsys.readouterr()
+    fitted, discard = fitting.fit_leaves(leaves, 9, cache=True)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert all(path.suffix == ".npz" for path in tmp_path.iterdir())
+    # discarded shapes are reported on cache hits too
+    warnings = capsys.readouterr().out
+    assert "discarded" in warnings
+    cached, cached_discard = fitting.fit_leaves(leaves, 9, cache=True)
+    assert capsys.readouterr().out == warnings
+    assert cached_discard == ref_discard
+    assert list(cached) == list(ref)
+    for k in ref:
+        for leaf, ref_leaf in zip(cached[k], ref[k]):
+            for a, b in zip(leaf, ref_leaf):
+                numpy.testing.assert_array_equal(a, b)
+    fitting.fit_leaves(leaves, 7, cache=True)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_fit_workers():
+    leaves = {k: v[:3] for k, v in list(leaves_json().items())[:4]}
+    ref, ref_discard = fitting.fit_leaves(leaves, 9)
+    fitted, discard = fitting.fit_leaves(leaves, 9, workers=2)
+    assert discard == ref_discard
+    assert list(fitted) == list(ref)
+    for k in ref:
+        for leaf, ref_leaf in zip(fitted[k], ref[k]):
+            for a, b in zip(leaf, ref_leaf):
+                numpy.testing.assert_array_equal(a, b)
+
+
+def test_cost():
+    pts = [(x, y, 0) for x, y in zip(range(10), [0, 1, 0, 4, 0, 1, 0, 2, 0, 0])]
+
+    def kept(res):
+        return [i for i, p in enumerate(res) if p is not None]
+
+    # historical removal order, whatever the type of points
+    legacy = kept(cost(pts, 5))
+    assert legacy == kept(cost([pgl.Vector3(*p) for p in pts], 5))
+    assert legacy == [0, 2, 3, 4, 6, 7, 9]
+    # lowest cost points removed first
+    assert kept(cost(pts, 5, legacy=False)) == [0, 3, 4, 7, 9]
+    assert kept(cost(pts, 10, legacy=False)) == list(range(10))
+    # only end points are left when less than 2 points are asked for
+    for nb_points in (-1, 0, 1, 2):
+        assert kept(cost(pts, nb_points, legacy=False)) == [0, 9]
@@ -0,0 +1,101 @@
+import numpy
+import pytest
+from scipy.integrate import simpson
+
+from openalea.adel.geometric_elements import Leaves
+
+
+def test_mesh_cache():
+    leaves = Leaves()
+    key = leaves.get_leaf_key(1, 1)
+    m1 = leaves.mesh(key, 10, 1, 10, 0, 1)
+    m2 = leaves.mesh(key, 10, 1, 10, 0, 1)
+    assert m1 is m2
+    info = leaves.mesh_cache_info()
+    assert info["hits"] == 1
+    assert info["misses"] == 1
+    m3 = leaves.mesh(key, 10, 1, 8, 0, 1)
+    assert m3 is not m1
+    assert len(m3.pointList) > 0
+
+    leaves = Leaves(mesh_cache_size=1)
+    leaves.mesh(key, 10, 1, 10, 0, 1)
+    leaves.mesh(key, 10, 1, 8, 0, 1)
+    info = leaves.mesh_cache_info()
+    assert info["evictions"] == 1
+    assert info["size"] == 1
+
+    leaves = Leaves(mesh_cache_size=0)
+    m1 = leaves.mesh(key, 10, 1, 10, 0, 1)
+    m2 = leaves.mesh(key, 10, 1, 10, 0, 1)
+    assert m1 is not m2
+    assert leaves.mesh_cache_info()["size"] == 0
+
+
+def test_mesh_batch():
+    leaves = Leaves()
+    key = leaves.get_leaf_key(1, 1)
+    records = {
+        "shape_key": [key, key, key],
+        "L_shape": [10, 10, 10],
+        "Lw_shape": [1, 1, 1],
+        "length": [10, 8, 0],
+        "srb": [0, 0.5, 0],
+        "srt": [1, 1, 1],
+    }
+    batch = leaves.mesh_batch(records)
+    po, io = batch["point_offsets"], batch["index_offsets"]
+    assert len(po) == len(io) == 4
+    assert po[-1] == len(batch["points"])
+    assert io[-1] == len(batch["indices"])
+    # degenerated element has an empty span
+    assert po[3] == po[2]
+    m = leaves.mesh(key, 10, 1, 8, 0.5, 1)
+    assert len(m.pointList) == po[2] - po[1]
+    assert len(m.indexList) == io[2] - io[1]
+
+    # identical elements are meshed once
+    leaves.clear_mesh_cache()
+    records = {k: v * 3 for k, v in records.items()}
+    batch2 = leaves.mesh_batch(records)
+    assert leaves.mesh_cache_info()["misses"] == 3
+    assert (batch2["points"] == numpy.concatenate([batch["points"]] * 3)).all()
+
+
+def test_blade_elt_area():
+    leaves = Leaves()
+    key = leaves.get_leaf_key(1, 1)
+    s, r = leaves.get_sr(key)
+    s, r = numpy.asarray(s), numpy.asarray(r)
+
+    def _simpson_area(sr_base, sr_top):
+        inside = (s > sr_base) & (s < sr_top)
+        snew = numpy.concatenate(([sr_base], s[inside], [sr_top]))
+        return simpson(numpy.interp(snew, s, r), x=snew) * 10 * 2
+
+    # bounds falling between, on and outside shape abscissa
+    bounds = [
+        (0, 1),
+        (0, 0.3),
+        (0.3, 1),
+        (0.21, 0.22),
+        (0.1, 0.5),
+        (s[3], s[8]),
+        (s[3], s[9]),
+        (0.4, 0.4),
+        (-1, 2),
+    ]
+    for sr_base, sr_top in bounds:
+        expected = _simpson_area(max(0, sr_base), min(1, sr_top))
+        area = leaves.blade_elt_area(key, 10, 2, sr_base, sr_top)
+        assert area == pytest.approx(expected, abs=1e-12)
+    sr_base, sr_top = numpy.array(bounds).T
+    areas = leaves.blade_elt_areas(key, 10, 2, sr_base, sr_top)
+    widths = leaves.blade_elt_widths(key, 10, 2, sr_base, sr_top)
+    for i, (b, t) in enumerate(bounds):
+        area = leaves.blade_elt_area(key, 10, 2, b, t)
+        width = leaves.blade_elt_width(key, 10, 2, b, t)
+        assert areas[i] == pytest.approx(area, abs=1e-12)
+        assert widths[i] == pytest.approx(width, abs=1e-12)
+    width = leaves.blade_elt_width(key, 10, 2, 0.4, 0.4)
+    assert width == pytest.approx(numpy.interp(0.4, s, r) * 2)
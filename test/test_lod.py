@@ -0,0 +1,58 @@
+import pytest
+
+from openalea.adel.astk_interface import AdelWheat
+from openalea.adel.geometric_elements import Leaves
+from openalea.adel.lod import lod_report, set_lod
+from openalea.adel.mtg_interpreter import mtg_interpreter
+import openalea.adel.fitting as fitting
+
+
+def test_lod_pyramid():
+    leaves = Leaves(lod_levels=(6, 4, 12))
+    assert leaves.levels() == (9, 6, 4)
+    assert leaves.lod_level(5) == 6
+    assert leaves.lod_level(9) is None
+    key = leaves.get_leaf_key(1, 1)
+    pts, ind = leaves.mesh_arrays(key, 10, 1, 10, 0, 1)
+    area = fitting.triangle_areas(pts, ind).sum()
+    for level in (6, 4):
+        lpts, lind = leaves.mesh_arrays(key, 10, 1, 10, 0, 1, lod=level)
+        assert len(lind) < len(ind)
+        assert fitting.triangle_areas(lpts, lind).sum() == pytest.approx(area, rel=1e-6)
+
+
+def test_budget_lod():
+    adel = AdelWheat(nplants=2, seed=1, leaves=Leaves(lod_levels=(6, 4)))
+    g = adel.setup_canopy(age=1200)
+    full = lod_report(g, adel.leaves, adel.min_length)
+    assert full["triangles"] == full["full_triangles"]
+    assert list(full["levels"]) == [9]
+
+    budget = int(0.7 * full["triangles"])
+    set_lod(g, adel.leaves, "budget", min_length=adel.min_length, budget=budget)
+    g = mtg_interpreter(g, adel.leaves, min_length=adel.min_length)
+    report = lod_report(g, adel.leaves, adel.min_length)
+    assert report["full_triangles"] == full["triangles"]
+    assert report["triangles"] < full["triangles"]
+    assert abs(report["area_error"]) < 0.05
+
+    set_lod(g, adel.leaves, None)
+    assert "lod" not in g.property_names()
+
+
+def test_cached_pyramid(adel_cache):
+    leaves = Leaves(lod_levels=(6, 4), fit_cache=True)
+    assert len(list(adel_cache.iterdir())) == 1
+    cached = Leaves(lod_levels=(6, 4), fit_cache=True)
+    assert len(list(adel_cache.iterdir())) == 1
+    for level in (6, 4):
+        assert list(cached.lod_leaves[level]) == list(leaves.lod_leaves[level])
+        for k, shapes in leaves.lod_leaves[level].items():
+            for leaf, cached_leaf in zip(shapes, cached.lod_leaves[level][k]):
+                for a, b in zip(leaf, cached_leaf):
+                    assert a.tolist() == b.tolist()
+    # degenerated shapes are kept unchanged, invalid inputs are errors
+    flat = ([0.0] * 12,) * 4
+    assert fitting._simplify_element(flat, 6) is flat
+    with pytest.raises(TypeError):
+        fitting._simplify_element(([None] * 12,) * 4, 6)
@@ -0,0 +1,140 @@
+import numpy
+
+import openalea.plantgl.all as pgl
+from openalea.adel.astk_interface import AdelWheat
+from openalea.adel.mtg_interpreter import (
+    StemElement_mesh,
+    mtg_interpreter,
+    plot3d,
+    slim_cylinder,
+    transform_geom,
+    transform_plant_geometry,
+    triangle_vids,
+    turtle_frames,
+    turtle_sequence,
+)
+from openalea.adel.canopy_mesh import geometry_arrays
+from openalea.adel.fitting import plantgl_shape
+
+
+def _points(g):
+    return {
+        vid: numpy.array([tuple(p) for p in geom.pointList])
+        for vid, geom in g.property("geometry").items()
+    }
+
+
+def test_numpy_engine():
+    adel = AdelWheat(nplants=4, seed=1)
+    g = adel.setup_canopy(age=800)
+    g = mtg_interpreter(g, adel.leaves, min_length=adel.min_length, engine="visitor")
+    ref = _points(g)
+    anchors = dict(g.property("anchor_point"))
+    g = mtg_interpreter(g, adel.leaves, min_length=adel.min_length, engine="numpy")
+    pts = _points(g)
+    assert set(pts) == set(ref)
+    for vid in ref:
+        numpy.testing.assert_allclose(pts[vid], ref[vid], atol=1e-6)
+    for vid, anchor in g.property("anchor_point").items():
+        numpy.testing.assert_allclose(tuple(anchor), tuple(anchors[vid]), atol=1e-6)
+
+
+def test_workers():
+    adel = AdelWheat(nplants=3, seed=1)
+    g = adel.setup_canopy(age=800)
+    for engine in ("visitor", "numpy"):
+        for batch in (False, True):
+            g = mtg_interpreter(
+                g, adel.leaves, min_length=adel.min_length, engine=engine, batch=batch
+            )
+            ref = _points(g)
+            anchors = dict(g.property("anchor_point"))
+            g = mtg_interpreter(
+                g,
+                adel.leaves,
+                min_length=adel.min_length,
+                engine=engine,
+                batch=batch,
+                workers=2,
+            )
+            pts = _points(g)
+            assert set(pts) == set(ref)
+            for vid in ref:
+                numpy.testing.assert_array_equal(pts[vid], ref[vid])
+            for vid, anchor in g.property("anchor_point").items():
+                assert tuple(anchor) == tuple(anchors[vid])
+
+
+def test_plant_frames():
+    adel = AdelWheat(nplants=3, seed=1)
+    g = adel.setup_canopy(age=800)
+    vids, pos, head, up = turtle_frames(g)
+    row = {vid: i for i, vid in enumerate(vids.tolist())}
+    plant = g.vertices(scale=1)[1]
+    pvids, ppos, phead, pup = turtle_frames(g, turtle_sequence(g, [plant]))
+    assert len(pvids) == len(g.components_at_scale(plant, g.max_scale()))
+    rows = [row[vid] for vid in pvids.tolist()]
+    numpy.testing.assert_array_equal(ppos, pos[rows])
+    numpy.testing.assert_array_equal(phead, head[rows])
+    numpy.testing.assert_array_equal(pup, up[rows])
+
+
+def test_cylinder_templates():
+    def _pts(mesh):
+        return numpy.array([tuple(p) for p in mesh.pointList])
+
+    ref = slim_cylinder(3, 0.2, 0.1)
+    mesh = StemElement_mesh(3, 0.4, 0.2)
+    numpy.testing.assert_allclose(_pts(mesh), _pts(ref), atol=1e-12)
+    assert [tuple(i) for i in mesh.indexList] == [tuple(i) for i in ref.indexList]
+
+    tapered = pgl.Tapered(0.2, 0.1, pgl.Cylinder(1.0, 3, True, 6))
+    tessel = pgl.Tesselator()
+    tapered.apply(tessel)
+    ref = tessel.triangulation
+    mesh = StemElement_mesh(3, 0.4, 0.2, classic=True)
+    numpy.testing.assert_allclose(_pts(mesh), _pts(ref), atol=1e-6)
+    assert len(mesh.indexList) == len(ref.indexList)
+
+
+def test_plot3d_merge():
+    adel = AdelWheat(nplants=2, seed=1)
+    g = adel.setup_canopy(age=800)
+    scene = plot3d(g)
+    merged, table = plot3d(g, merge=True)
+    assert len(merged) <= 3
+    assert sorted(table["vid"]) == sorted(sh.id for sh in scene)
+    ntri = {sh.id: len(sh.geometry.indexList) for sh in scene}
+    for sh in merged:
+        vids = triangle_vids(table, sh.id)
+        assert len(vids) == len(sh.geometry.indexList)
+    for vid, start, stop in zip(table["vid"], table["start"], table["stop"]):
+        assert stop - start == ntri[vid]
+
+
+def test_bake_transform():
+    mesh = StemElement_mesh(3, 0.4, 0.2)
+    wrapped = transform_geom(mesh, (1, 2, 3), 0.5)
+    baked = transform_geom(mesh, (1, 2, 3), 0.5, bake=True)
+    assert isinstance(baked, pgl.TriangleSet)
+    pts, ind = geometry_arrays(wrapped)
+    bpts, bind = geometry_arrays(baked)
+    numpy.testing.assert_allclose(bpts, pts, atol=1e-6)
+    numpy.testing.assert_array_equal(bind, ind)
+
+    flat = plantgl_shape([(0, 0, 0), (1, 0, 0)], numpy.zeros((0, 3)))
+    geometry = {
+        1: mesh,
+        2: pgl.Shape(StemElement_mesh(1, 0.2, 0.1)),
+        3: None,
+        5: flat,
+    }
+    transform_plant_geometry(geometry, [1, 2, 3, 4, 5], (1, 2, 3), 0.5, bake=True)
+    numpy.testing.assert_allclose(geometry_arrays(geometry[1])[0], pts, atol=1e-6)
+    # elements without triangles are transformed too
+    fpts, find = geometry_arrays(geometry[5])
+    expected = geometry_arrays(transform_geom(flat, (1, 2, 3), 0.5))[0]
+    numpy.testing.assert_allclose(fpts, expected, atol=1e-6)
+    assert len(find) == 0
+    assert isinstance(geometry[2], pgl.Shape)
+    assert geometry[3] is None and 4 not in geometry
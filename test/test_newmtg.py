@@ -0,0 +1,251 @@
+import numpy
+import pandas
+import pytest
+from openalea.mtg import MTG
+
+import openalea.adel.newmtg as newmtg
+from openalea.adel.data_samples import canopy_two_metamers, leaves
+from openalea.adel.newmtg import (
+    _CallLog,
+    adel_label,
+    blade_elements,
+    blade_elements_lists,
+    blade_elements_table,
+    canopy_columns,
+    exposed_areas,
+    exposed_areas2canS,
+    match_elements,
+    move_properties,
+    mtg_update_from_table,
+    mtg_factory,
+    reduce_aborting_tillers,
+)
+
+
+def test_canopy_columns():
+    params = {
+        "plant": [1, 1],
+        "axe_id": ["MS", "T1"],
+        "HS_final": numpy.array(["NA", "3.5"]),
+        "nff": [4, 4],
+        "label": ["a", "NA"],
+    }
+    for p in (params, pandas.DataFrame(params)):
+        columns = canopy_columns(p)
+        assert columns["HS_final"].tolist() == ["NA", 3.5]
+        assert columns["label"].tolist() == ["a", "NA"]
+        assert columns["axe_id"].tolist() == ["MS", "T1"]
+
+    params = canopy_two_metamers()
+    params["HS_final"] = ["NA", "5"]
+    columns = reduce_aborting_tillers(canopy_columns(params), 0.5)
+    assert columns["Ll"].tolist() == [3, 1.5]
+    assert columns["Gd"].tolist() == [0.1, 0.05]
+
+
+def test_mtg_factory_dataframe():
+    params = canopy_two_metamers()
+    g = mtg_factory(params)
+    df = pandas.DataFrame(params)
+    for p in (df, df.to_records(index=False)):
+        g2 = mtg_factory(p)
+        assert len(g2) == len(g)
+        for name in ("label", "length", "visible_length"):
+            assert g2.property(name) == g.property(name)
+
+
+def tillered_canopy(nplants=3, Ll=lambda plant, numphy: 3 + numphy + plant):
+    """plants with a 3 metamers main stem and two tillers (of 2 and 1 metamers)"""
+    row = pandas.DataFrame(canopy_two_metamers()).iloc[[0]]
+    axes = [("MS", 0, n) for n in (1, 2, 3)] + [("T1", 1, 1), ("T1", 1, 2), ("T2", 2, 1)]
+    rows = [
+        row.assign(plant=p, axe_id=axe, ms_insertion=pos, numphy=n, Ll=Ll(p, n))
+        for p in range(1, nplants + 1)
+        for axe, pos, n in axes
+    ]
+    return pandas.concat(rows, ignore_index=True)
+
+
+def test_bulk_mtg_factory():
+    for params in (canopy_two_metamers(), tillered_canopy()):
+        g = mtg_factory(params)
+        bulk = mtg_factory(params, bulk=True)
+        assert sorted(bulk.vertices()) == sorted(g.vertices())
+        for vid in g.vertices():
+            assert bulk.parent(vid) == g.parent(vid)
+            assert bulk.complex(vid) == g.complex(vid)
+            assert bulk.scale(vid) == g.scale(vid)
+            assert bulk.children(vid) == g.children(vid)
+            assert bulk.components(vid) == g.components(vid)
+        assert sorted(bulk.property_names()) == sorted(g.property_names())
+        for name in g.property_names():
+            assert bulk.property(name) == g.property(name)
+    # tillers are borne by main stem metamers, at all scales
+    assert g.nb_vertices(scale=1) == 3
+    for axe in g.vertices(scale=2):
+        if g.label(axe) != "MS":
+            metamer = g.components(axe)[0]
+            assert g.edge_type(metamer) == "+"
+            assert g.complex(g.parent(metamer)) == g.parent(axe)
+            internode = g.components(metamer)[0]
+            assert g.complex(g.parent(internode)) == g.parent(metamer)
+
+
+def test_clone_plants(monkeypatch):
+    df = pandas.DataFrame(canopy_two_metamers())
+    df = pandas.concat([df, df.assign(plant=2), df.assign(plant=3, Ll=2)])
+    # tillered plants, plant 3 differing from the others
+    tillered = tillered_canopy(4, Ll=lambda plant, numphy: 3 + numphy + (plant == 3))
+    computed = []
+    precompute = newmtg._canopy_blade_elements
+
+    def record(*args, **kwds):
+        computed.append(len(kwds["rows"]))
+        return precompute(*args, **kwds)
+
+    for params, template_rows in ((df, 4), (tillered, 12)):
+        g = mtg_factory(params)
+        with monkeypatch.context() as m:
+            m.setattr(newmtg, "_canopy_blade_elements", record)
+            cloned = mtg_factory(params, clone_plants=True)
+        # blade elements are only computed for the rows of distinct plants
+        assert computed.pop() == template_rows
+        assert len(cloned) == len(g)
+        for vid in g.vertices():
+            assert cloned.parent(vid) == g.parent(vid)
+            assert cloned.complex(vid) == g.complex(vid)
+            assert cloned.children(vid) == g.children(vid)
+            assert cloned.edge_type(vid) == g.edge_type(vid)
+        for name in g.property_names():
+            assert cloned.property(name) == g.property(name)
+
+
+def test_custom_metamer_factory():
+    def metamer(Lsect, shape_key, elongation, leaves, **args):
+        assert "blade_elts" not in args
+        return []
+
+    g = mtg_factory(canopy_two_metamers(), metamer_factory=metamer)
+    assert len(list(g.vertices(scale=3))) == 2
+
+
+def test_replay_copies_values():
+    g = MTG()
+    log = _CallLog(g)
+    vid = log.add_component(g.root, label="plant1", curve={"a": 1}, key=(1, 2))
+    vid_map = log.replay(g, {g.root: g.root})
+    clone = vid_map[vid]
+    assert g.property("curve")[clone] == g.property("curve")[vid]
+    assert g.property("curve")[clone] is not g.property("curve")[vid]
+    assert g.property("key")[clone] is g.property("key")[vid]
+
+
+def test_blade_elements_table():
+    blades = [
+        (10, 8, 2, 3, 12, 1),
+        (10, 10, 0, 0, 10, 1),
+        (10, 0, 0, 0, 10, 1),
+        (None, 5, 0, 1, 10, 1),
+    ]
+    columns = list(zip(*blades))
+    keys = [(0, 0, None)] * len(blades)
+    for split in (False, True):
+        hidden, sectors = blade_elements_table(3, *columns, shape_key=keys, leaves=None)
+        elements = blade_elements_lists(hidden, sectors, split)
+        for blade, elts in zip(blades, elements):
+            expected = blade_elements(
+                3, *blade, shape_key=(0, 0, None), leaves=None, split=split
+            )
+            assert elts == expected
+    assert len(elements[2]) == 1
+    assert sum(e["area"] for e in elements[3]) == 0
+
+
+def test_exposed_areas():
+    g = mtg_factory(canopy_two_metamers())
+    for name in ("green_length", "green_area", "senesced_length", "senesced_area"):
+        g.add_property(name)
+        g.property(name).update(g.property(name.split("_")[1]))
+    df = exposed_areas(g)
+    length = g.property("length")
+    vids = [
+        vid
+        for vid in g.vertices(scale=g.max_scale())
+        if length.get(vid, 0) > 0 and not g.label(vid).startswith("Hidden")
+    ]
+    assert df.index.tolist() == vids
+    for vid in vids:
+        n = g.node(vid)
+        organ = n.complex()
+        metamer = organ.complex()
+        assert df.loc[vid, "element"] == n.label
+        assert df.loc[vid, "organ"] == organ.label
+        assert df.loc[vid, "metamer"] == int(metamer.label[7:])
+        assert df.loc[vid, "plant"] == metamer.complex().complex().label
+        assert df.loc[vid, "area"] == n.area
+
+
+def test_exposed_areas2canS():
+    df = pandas.DataFrame(
+        {
+            "species": 0,
+            "plant": "plant1",
+            "axe": "MS",
+            "metamer": [1, 1, 1, 2, 2],
+            "organ": ["blade", "blade", "sheath", "internode", "blade"],
+            "refplant_id": 1,
+            "nff": 2,
+            "HS_final": "NA",
+            "ntop": [2, 2, 2, 1, 1],
+            "L_shape": [3.0, 3.0, 3.0, 4.0, 4.0],
+            "length": [1.0, 2.0, 3.0, 4.0, 5.0],
+            "area": [0.1, 0.2, 0.3, 0.4, 0.5],
+        },
+        index=[10, 11, 13, 20, 22],
+    )
+    for name in ("length", "area"):
+        df["green_" + name] = df[name]
+        df["senesced_" + name] = 0.0
+    cans = exposed_areas2canS(df)
+    assert cans.index.tolist() == [10, 20]
+    assert cans["numphy"].tolist() == [1, 2]
+    assert cans["Lv"].tolist() == [3.0, 5.0]
+    assert cans["SGv"].tolist() == [0.3, 0]
+    assert cans["Evgreen"].tolist() == [0, 4.0]
+    assert cans["Slvsen"].tolist() == [0, 0]
+    assert cans.columns[-1] == "d_basecol"
+
+
+def test_match_elements():
+    params = canopy_two_metamers()
+    g = mtg_factory(params)
+    other = mtg_factory({k: v[:1] for k, v in params.items()})
+    vids, other_vids = match_elements(g, other)
+    assert len(vids) == other.nb_vertices(scale=5)
+    for vid, other_vid in zip(vids, other_vids):
+        assert adel_label(g, vid) == adel_label(other, other_vid)
+
+    g.add_property("foo")
+    g.property("foo").update({vid: vid for vid in g.vertices(scale=5)})
+    move_properties(g, other, filter_length=False)
+    assert "foo" not in g.property_names()
+    assert other.property("foo") == dict(zip(other_vids.tolist(), vids.tolist()))
+
+
+def test_mtg_update_from_table():
+    old = pandas.DataFrame(canopy_two_metamers()).assign(Lv=1, Ev=0.5, ntop=1)
+    new = old.assign(Lv=[2, 3], Ev=1, Lsen=[0, 1])
+    g = mtg_factory(old)
+    mtg_update_from_table(g, new, old)
+    expected = mtg_factory(new)
+    for name in expected.property_names():
+        assert g.property(name) == expected.property(name)
+
+    # blade widths and areas from leaf shapes
+    ls = leaves()
+    g = mtg_factory(old, leaves=ls)
+    mtg_update_from_table(g, new, old, leaves=ls)
+    expected = mtg_factory(new, leaves=ls)
+    assert any(expected.property("width").values())
+    for name in ("width", "area", "green_area", "senesced_area"):
+        assert g.property(name) == pytest.approx(expected.property(name))